@@ -1,11 +1,20 @@
 from django.http import JsonResponse
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from clients.bigquery_client import BigQueryClient
-from .etl_service import EtlService
+from clients.bigquery_client import PRIORIDADE_BATCH, QueryBudgetExceeded, validar_identificador
+from clients.chunk_loader import ChunkLoadError
+from clients.registry import BIGQUERY, lazy_client
+from .helpers import com_orcamento
 
 
-client = BigQueryClient()  # instância única para todas as rotas
+client = lazy_client(BIGQUERY)  # instância única (criada no primeiro uso) para todas as rotas
+
+# a rota de lote responde de forma síncrona dentro do worker do gunicorn (timeout
+# padrão de 30 s): processa poucos arquivos por chamada; lotes maiores vão pelo
+# comando `python manage.py etl_prefix`
+LIMITE_PADRAO_LOTE = 2
+LIMITE_MAXIMO_LOTE = 10
 
 @csrf_exempt
 def processar_arquivo_raw(request):
@@ -15,8 +24,14 @@ def processar_arquivo_raw(request):
 
     Exemplo de JSON:
     {
-        "blob_name": "raw/nome_do_arquivo.csv"
+        "blob_name": "raw/nome_do_arquivo.csv",
+        "force": false
     }
+
+    Se a versão atual do arquivo já foi processada (manifesto do ETL), a resposta
+    vem com status "skipped" e nada é carregado; "force": true reprocessa. Se outra
+    chamada está carregando a mesma versão agora, a resposta é 409 (status
+    "in_progress").
     """
     if request.method != "POST":
         return JsonResponse({"erro": "Método não permitido"}, status=405)
@@ -27,19 +42,93 @@ def processar_arquivo_raw(request):
 
         if not blob_name:
             return JsonResponse({"erro": "O campo 'blob_name' é obrigatório."}, status=400)
+        force = _flag_force(data)
+
+        # import tardio: o ETL traz o pandas, que não precisa pesar no startup do servidor
+        from .etl_service import EtlService
 
         etl_service = EtlService()
-        resultado = etl_service.process_raw_file(blob_name)
+        resultado = etl_service.process_raw_file(blob_name, force=force)
 
         if resultado["status"] == "error":
             return JsonResponse(resultado, status=500)
+        if resultado["status"] == "in_progress":
+            return JsonResponse(resultado, status=409)
 
         return JsonResponse(resultado)
 
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+    except ChunkLoadError as e:
+        # carga parcial: informa as faixas de linhas que não entraram
+        return JsonResponse(e.to_dict(), status=500)
     except Exception as e:
         return JsonResponse({"erro": f"Erro inesperado na view: {e}"}, status=500)
 
 
+@csrf_exempt
+def processar_prefixo_raw(request):
+    """
+    Essa rota processa, num pool de processos, todos os CSVs ainda não processados
+    sob um prefixo do bucket (padrão: RAW_LAYER_PREFIX).
+
+    Exemplo de JSON Para essa rota (todos os campos são opcionais):
+    {
+        "prefix": "raw/2025-10-28/",
+        "workers": 4,
+        "limit": 5,
+        "force": false
+    }
+
+    A resposta só sai quando o lote termina e o worker do gunicorn tem timeout,
+    então cada chamada processa no máximo `limit` arquivos (padrão
+    LIMITE_PADRAO_LOTE, até LIMITE_MAXIMO_LOTE); os que sobrarem ficam pendentes
+    para a próxima chamada. Lotes grandes devem usar `python manage.py etl_prefix`.
+    """
+    if request.method != "POST":
+        return JsonResponse({"erro": "Método não permitido"}, status=405)
+
+    try:
+        data = json.loads(request.body or b"{}")
+        workers = data.get("workers")
+        limit = _limite_do_lote(data.get("limit"))
+
+        # import tardio: o ETL traz o pandas, que não precisa pesar no startup do servidor
+        from .etl_service import EtlService
+
+        resumo = EtlService().process_prefix(
+            data.get("prefix"),
+            int(workers) if workers is not None else None,
+            limit=limit,
+            force=_flag_force(data),
+        )
+        return JsonResponse(resumo, status=500 if resumo["files_failed"] else 200)
+
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"erro": f"Erro inesperado na view: {e}"}, status=500)
+
+
+def _limite_do_lote(valor) -> int:
+    """`limit` da rota de lote: LIMITE_PADRAO_LOTE se ausente, ValueError acima do máximo."""
+    limite = int(valor) if valor is not None else LIMITE_PADRAO_LOTE
+    if limite > LIMITE_MAXIMO_LOTE:
+        raise ValueError(
+            f"'limit' deve ser no máximo {LIMITE_MAXIMO_LOTE} nesta rota; "
+            "para lotes maiores use `python manage.py etl_prefix`."
+        )
+    return limite
+
+
+def _flag_force(data: dict) -> bool:
+    """`force` do JSON: só aceita booleano (a string "false" viraria True com bool())."""
+    force = data.get("force", False)
+    if not isinstance(force, bool):
+        raise ValueError("O campo 'force' deve ser true ou false.")
+    return force
+
+
 @csrf_exempt
 def inserir_registro(request):
     """
@@ -112,6 +201,92 @@ def remover_registro(request):
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
+@csrf_exempt
+def atualizar_lote(request):
+    """
+    Essa rota atualiza vários registros de uma tabela com um único MERGE no BigQuery
+
+    Exemplo de JSON Para essa rota:
+    {
+        "table_id": "unit",
+        "updates": [
+            {"id": "1", "name": "Unidade Norte"},
+            {"id": "2", "name": "Unidade Sul", "active": false}
+        ]
+    }
+
+    """
+    if request.method != "POST":
+        return JsonResponse({"erro": "Método não permitido"}, status=405)
+    try:
+        data = json.loads(request.body)
+        table_id = data.get("table_id")
+        updates = data.get("updates")
+        if not table_id or not isinstance(updates, list) or not updates:
+            return JsonResponse({"erro": "Os campos 'table_id' e 'updates' (lista) são obrigatórios."}, status=400)
+        validar_identificador(table_id)
+        resultado = client.atualizar_lote(updates, table_id, types=data.get("types"))
+        return JsonResponse(resultado)
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"erro": str(e)}, status=500)
+
+@csrf_exempt
+def remover_lote(request):
+    """
+    Essa rota remove vários registros de uma tabela com um único DELETE no BigQuery
+
+    Exemplo de JSON Para essa rota:
+    {
+        "table_id": "unit",
+        "ids": ["1", "2", "3"]
+    }
+
+    """
+    if request.method != "POST":
+        return JsonResponse({"erro": "Método não permitido"}, status=405)
+    try:
+        data = json.loads(request.body)
+        table_id = data.get("table_id")
+        ids = data.get("ids")
+        if not table_id or not isinstance(ids, list) or not ids:
+            return JsonResponse({"erro": "Os campos 'table_id' e 'ids' (lista) são obrigatórios."}, status=400)
+        validar_identificador(table_id)
+        resultado = client.remover_lote(ids, table_id)
+        return JsonResponse(resultado)
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"erro": str(e)}, status=500)
+
+def _resposta_job(job, mensagem):
+    """200 se o job já terminou; senão 202 com o `job_id` para acompanhar em `status_job`."""
+    if job.done():
+        job.result()  # levanta o erro do job, se houver
+        return JsonResponse({"mensagem": mensagem})
+    return JsonResponse(
+        {
+            "mensagem": "Job submetido; acompanhe pelo status_url",
+            "job_id": job.job_id,
+            "status_url": reverse("status_job", args=[job.job_id]),
+        },
+        status=202,
+    )
+
+@csrf_exempt
+def status_job(request, job_id):
+    """
+    Estado de um job submetido pelas rotas de view (PENDING, RUNNING ou DONE)
+    """
+    if request.method != "GET":
+        return JsonResponse({"erro": "Método não permitido"}, status=405)
+
+    try:
+        return JsonResponse(client.status_job(job_id))
+    except Exception as e:
+        return JsonResponse({"erro": str(e)}, status=500)
+
 @csrf_exempt
 def criar_view_diaria(request):
     """
@@ -135,8 +310,9 @@ def criar_view_diaria(request):
         GROUP BY ds, veiculo_id
         """
         
-        resultado = client.execute_query(sql_view)
-        return JsonResponse({"mensagem": "View diária criada/atualizada com sucesso"})
+        # BATCH: DDL de manutenção não disputa slots com os dashboards (e pode esperar na fila)
+        job = client.submeter_query(sql_view, priority=PRIORIDADE_BATCH)
+        return _resposta_job(job, "View diária criada/atualizada com sucesso")
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
@@ -164,12 +340,13 @@ def criar_view_mensal(request):
         GROUP BY ano_mes, veiculo_id
         """
         
-        resultado = client.execute_query(sql_view)
-        return JsonResponse({"mensagem": "View mensal criada/atualizada com sucesso"})
+        job = client.submeter_query(sql_view, priority=PRIORIDADE_BATCH)
+        return _resposta_job(job, "View mensal criada/atualizada com sucesso")
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
 @csrf_exempt
+@com_orcamento(client, "exportar_view", dry_run=True)
 def exportar_view(request):
     """
     Exporta uma view específica do BigQuery para CSV
@@ -187,9 +364,12 @@ def exportar_view(request):
         data = json.loads(request.body)
         view_name = data.get("view_name")
         format_type = data.get("format", "CSV")
+        if not view_name:
+            return JsonResponse({"erro": "O campo 'view_name' é obrigatório."}, status=400)
+        validar_identificador(view_name)
         
-        # Executa query na view
-        sql = f"SELECT * FROM `{client.project}.{client.dataset}.{view_name}`"
+        # Executa query na view (com dry-run contra o orçamento do endpoint)
+        sql = f"SELECT * FROM `{client.table_ref(view_name)}`"
         df = client.query_to_dataframe(sql)
         
         # Gera arquivo temporário
@@ -205,5 +385,9 @@ def exportar_view(request):
             "mensagem": f"Dados exportados para {format_type}",
             "arquivo": file_path
         })
+    except QueryBudgetExceeded as e:
+        return JsonResponse(e.to_dict(), status=400)
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
@@ -5,27 +5,55 @@ from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from google.api_core import exceptions as gcloud_exceptions
 
-from clients.bigquery_client import BigQueryClient
-from .helpers import build_datetime_filters, parse_iso_datetime
+from clients.bigquery_client import QueryBuilder, QueryTimeout, keyset_condition
+from clients.registry import BIGQUERY, lazy_client
+from .helpers import (
+    KeysetPage,
+    build_datetime_filters,
+    parse_iso_datetime,
+    parse_limit,
+    streaming_json_response,
+)
 
-client = BigQueryClient()
+client = lazy_client(BIGQUERY)
 
 BILL_TABLE = "bill"
 TRAVEL_TABLE = "travel"
 
 
+def _bill_ausente():
+    return JsonResponse(
+        {
+            "status": "ok",
+            "data": [],
+            "count": 0,
+            "warning": "Tabela BILL não encontrada no BigQuery",
+        }
+    )
+
+
 @csrf_exempt
 def listar_bills(request):
-    """GET /api/bills - Retorna faturas associadas às viagens."""
+    """GET /api/bills - Retorna faturas associadas às viagens.
+
+    Aceita `limit` e paginação por cursor (`?cursor=` com o `next_cursor` anterior).
+    """
     if request.method != "GET":
         return JsonResponse({"erro": "Método não permitido"}, status=405)
 
     try:
         start_dt = parse_iso_datetime(request.GET.get("start_date"))
         end_dt = parse_iso_datetime(request.GET.get("end_date"))
-        filters = build_datetime_filters("t.datetime", start_dt, end_dt)
+        limit_value = parse_limit(request.GET.get("limit"))
+        cursor = request.GET.get("cursor")
+
+        builder = QueryBuilder()
+        filters = build_datetime_filters("t.datetime", start_dt, end_dt, builder)
+        if cursor:
+            filters.append(keyset_condition(builder, cursor, "b.datetime", "b.id", descending=True))
 
-        where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
+        where_clause = builder.where(filters)
+        limit_clause = f"LIMIT {builder.param('limit', limit_value, 'INT64')}" if limit_value else ""
 
         query = f"""
         SELECT
@@ -39,29 +67,30 @@ def listar_bills(request):
         FROM `{client.table_ref(BILL_TABLE)}` b
         INNER JOIN `{client.table_ref(TRAVEL_TABLE)}` t ON t.id = b.travel_id
         {where_clause}
-        ORDER BY b.datetime DESC
+        ORDER BY b.datetime DESC, b.id DESC
+        {limit_clause}
         """
 
+        if not client.tabela_existe(BILL_TABLE):
+            return _bill_ausente()
+
         try:
-            results = client.executar_query(query)
-        except gcloud_exceptions.NotFound:
-            return JsonResponse(
-                {
-                    "status": "ok",
-                    "data": [],
-                    "count": 0,
-                    "warning": "Tabela BILL não encontrada no BigQuery",
-                }
+            batches = client.query_arrow_iter(
+                query, builder, float_columns=("fix_cost", "variable_km", "total_cost")
             )
-        for row in results:
-            if row.get("fix_cost") is not None:
-                row["fix_cost"] = float(row["fix_cost"])
-            if row.get("variable_km") is not None:
-                row["variable_km"] = float(row["variable_km"])
-            if row.get("total_cost") is not None:
-                row["total_cost"] = float(row["total_cost"])
-
-        return JsonResponse({"status": "ok", "data": results, "count": len(results)})
+        except gcloud_exceptions.NotFound:
+            client.tabela_ausente(BILL_TABLE)
+            return _bill_ausente()
+        page = KeysetPage(
+            (row for batch in batches for row in batch.to_pylist()),
+            limit_value,
+            order_key="datetime",
+        )
+        return streaming_json_response(page, extra=lambda: {"next_cursor": page.next_cursor()})
+    except QueryTimeout as e:
+        return JsonResponse({"erro": str(e)}, status=504)
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
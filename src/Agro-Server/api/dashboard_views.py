@@ -1,34 +1,80 @@
 """
 Views para rotas de dashboard (métricas agregadas)
 """
+import logging
 from typing import List
 
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from google.api_core import exceptions as gcloud_exceptions
 
-from clients.bigquery_client import BigQueryClient
-from .helpers import build_datetime_filters, parse_iso_datetime
+from clients.bigquery_client import QueryBudgetExceeded, QueryBuilder, QueryTimeout
+from clients.registry import BIGQUERY, lazy_client
+from .helpers import build_datetime_filters, com_orcamento, parse_iso_datetime
 
-client = BigQueryClient()
+logger = logging.getLogger(__name__)
+
+client = lazy_client(BIGQUERY)
 
 _COST_EXPRESSION = (
     "COALESCE(b.fix_cost + COALESCE(b.variable_km, 0) * COALESCE(t.full_distance, 0), 0)"
 )
 
+_COST_EVOLUTION_FLOATS = ("total_distance_km", "total_cost")
+
+BILL_TABLE = "bill"
 
-def _build_common_filters(request) -> List[str]:
+
+def _build_common_filters(request, builder: QueryBuilder) -> List[str]:
     start_dt = parse_iso_datetime(request.GET.get("start_date"))
     end_dt = parse_iso_datetime(request.GET.get("end_date"))
-    filters = build_datetime_filters("t.datetime", start_dt, end_dt)
+    filters = build_datetime_filters("t.datetime", start_dt, end_dt, builder)
 
     unit_id = request.GET.get("unit_id")
     if unit_id:
-        filters.append(f"t.unit_id = '{unit_id}'")
+        filters.append(f"t.unit_id = {builder.param('unit_id', unit_id, 'STRING')}")
     return filters
 
 
+def _build_travel_summary_query(where_clause: str, include_bill: bool = True) -> str:
+    cost_select = f"COALESCE(SUM({_COST_EXPRESSION}), 0)" if include_bill else "0"
+    bill_join = (
+        f"LEFT JOIN `{client.table_ref(BILL_TABLE)}` b ON b.travel_id = t.id" if include_bill else ""
+    )
+    return f"""
+        SELECT
+            COUNT(t.id) AS total_travels,
+            COALESCE(SUM(t.full_distance), 0) AS total_distance_km,
+            {cost_select} AS total_cost
+        FROM `{client.table_ref("travel")}` t
+        {bill_join}
+        {where_clause}
+    """
+
+
+def _build_cost_evolution_query(period_label: str, where_clause: str, limit_clause: str, include_bill: bool = True) -> str:
+    cost_select = f"COALESCE(SUM({_COST_EXPRESSION}), 0)" if include_bill else "0"
+    bill_join = (
+        f"LEFT JOIN `{client.table_ref(BILL_TABLE)}` b ON b.travel_id = t.id" if include_bill else ""
+    )
+    return f"""
+        SELECT
+            {period_label} AS period_label,
+            DATE(MIN(t.datetime)) AS period_start,
+            COUNT(t.id) AS total_travels,
+            COALESCE(SUM(t.full_distance), 0) AS total_distance_km,
+            {cost_select} AS total_cost
+        FROM `{client.table_ref("travel")}` t
+        {bill_join}
+        {where_clause}
+        GROUP BY period_label
+        ORDER BY period_start
+        {limit_clause}
+    """
+
+
 @csrf_exempt
+@com_orcamento(client, "unit_summary")
 def unit_summary(request):
     """GET /api/dashboard/unit-summary - KM por unidade"""
     if request.method != "GET":
@@ -47,23 +93,20 @@ def unit_summary(request):
         ORDER BY u.name
         """
 
-        results = client.executar_query(query)
-        data = [
-            {
-                "unit_id": row.get("unit_id"),
-                "unit_name": row.get("unit_name", ""),
-                "total_viagens": row.get("total_viagens", 0),
-                "total_km": float(row.get("total_km", 0.0)),
-            }
-            for row in results
-        ]
+        table = client.query_arrow(query, float_columns=("total_km",))
+        data = table.select(["unit_id", "unit_name", "total_viagens", "total_km"]).to_pylist()
 
         return JsonResponse({"status": "ok", "data": data})
+    except QueryBudgetExceeded as e:
+        return JsonResponse(e.to_dict(), status=400)
+    except QueryTimeout as e:
+        return JsonResponse({"erro": str(e)}, status=504)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
 
 @csrf_exempt
+@com_orcamento(client, "occurrence_summary")
 def occurrence_summary(request):
     """GET /api/dashboard/occurrence-summary - Número e categorias de ocorrências"""
     if request.method != "GET":
@@ -86,8 +129,9 @@ def occurrence_summary(request):
         FROM `{client.table_ref("occurrence")}`
         """
 
-        categorias = client.executar_query(query_categoria)
-        total_result = client.executar_query(query_total)
+        results = client.run_many({"categorias": query_categoria, "total": query_total})
+        categorias = results["categorias"]
+        total_result = results["total"]
 
         data = {
             "total_ocorrencias": total_result[0].get("total_ocorrencias", 0)
@@ -104,78 +148,69 @@ def occurrence_summary(request):
         }
 
         return JsonResponse({"status": "ok", "data": data})
+    except QueryBudgetExceeded as e:
+        return JsonResponse(e.to_dict(), status=400)
+    except QueryTimeout as e:
+        return JsonResponse({"erro": str(e)}, status=504)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
 
 @csrf_exempt
+@com_orcamento(client, "travel_summary")
 def travel_summary(request):
     """GET /api/dashboard/travel-summary - KPIs principais"""
     if request.method != "GET":
         return JsonResponse({"erro": "Método não permitido"}, status=405)
 
     try:
-        print("\nSEGUE AQUI O REQUEST DE TRAVEL SUMMARY: ", request)
+        logger.debug("travel_summary: %s", request.GET.dict())
 
         # =======================================================
-        # 1) MONTA OS FILTROS (AGORA ANTES DA DEBUG QUERY)
+        # 1) MONTA OS FILTROS
         # =======================================================
-        filters = _build_common_filters(request)
-        where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
+        builder = QueryBuilder()
+        filters = _build_common_filters(request, builder)
+        where_clause = builder.where(filters)
 
         # =======================================================
-        # 2) QUERY DE DEBUG — COM OS MESMOS FILTROS
+        # 2) QUERY PRINCIPAL
         # =======================================================
-        debug_query = f"""
-        SELECT
-            t.id AS travel_id_from_travel,
-            b.travel_id AS travel_id_from_bill,
-            t.datetime
-        FROM `{client.table_ref("travel")}` t
-        LEFT JOIN `{client.table_ref("bill")}` b ON b.travel_id = t.id
-        {where_clause}
-        LIMIT 20
-        """
-
-        print("\n🔎 Rodando QUERY DE DEBUG para verificar JOIN:")
-        print(debug_query)
-
-        try:
-            debug_results = client.executar_query(debug_query)
-        except Exception as e:
-            print("⚠️ Erro na query de debug:", e)
-            debug_results = []
-
-        print("\n🔥 RESULTADOS DA QUERY DE DEBUG (t.id e b.travel_id):")
-        for r in debug_results:
-            print("   ➤", r)
+        # registro de tabelas decide antes: sem `bill`, nem tenta o JOIN
+        include_bill = client.tabela_existe(BILL_TABLE)
+        queries = {"main": (_build_travel_summary_query(where_clause, include_bill), builder)}
 
         # =======================================================
-        # 3) QUERY PRINCIPAL
+        # 3) QUERY DE DEBUG DO JOIN (só com o logger em DEBUG; roda em paralelo)
         # =======================================================
-
-        query = f"""
-        SELECT
-            COUNT(t.id) AS total_travels,
-            COALESCE(SUM(t.full_distance), 0) AS total_distance_km,
-            COALESCE(SUM({_COST_EXPRESSION}), 0) AS total_cost
-        FROM `{client.table_ref("travel")}` t
-        LEFT JOIN `{client.table_ref("bill")}` b ON b.travel_id = t.id
-        {where_clause}
-        """
-
-        try:
-            results = client.executar_query(query)
-        except gcloud_exceptions.NotFound:
-            fallback_query = f"""
+        if include_bill and logger.isEnabledFor(logging.DEBUG):
+            debug_query = f"""
             SELECT
-                COUNT(t.id) AS total_travels,
-                COALESCE(SUM(t.full_distance), 0) AS total_distance_km,
-                0 AS total_cost
+                t.id AS travel_id_from_travel,
+                b.travel_id AS travel_id_from_bill,
+                t.datetime
             FROM `{client.table_ref("travel")}` t
+            LEFT JOIN `{client.table_ref(BILL_TABLE)}` b ON b.travel_id = t.id
             {where_clause}
+            LIMIT 20
             """
-            results = client.executar_query(fallback_query)
+            queries["debug"] = (debug_query, builder)
+
+        outcomes = client.run_many(queries, return_exceptions=True)
+
+        if "debug" in outcomes:
+            if isinstance(outcomes["debug"], Exception):
+                logger.debug("travel_summary: erro na query de debug: %s", outcomes["debug"])
+            else:
+                logger.debug("travel_summary: amostra do JOIN travel/bill: %s", outcomes["debug"])
+
+        results = outcomes["main"]
+        if isinstance(results, gcloud_exceptions.NotFound) and include_bill:
+            # rede de segurança: o registro ainda não sabia que `bill` sumiu
+            client.tabela_ausente(BILL_TABLE)
+            results = client.executar_query(_build_travel_summary_query(where_clause, include_bill=False), builder)
+        elif isinstance(results, Exception):
+            raise results
 
         row = results[0] if results else {}
 
@@ -193,12 +228,17 @@ def travel_summary(request):
 
         return JsonResponse({"status": "ok", "data": data})
 
+    except QueryBudgetExceeded as e:
+        return JsonResponse(e.to_dict(), status=400)
+    except QueryTimeout as e:
+        return JsonResponse({"erro": str(e)}, status=504)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
 
 
 @csrf_exempt
+@com_orcamento(client, "cost_evolution")
 def cost_evolution(request):
     """GET /api/dashboard/cost-evolution - Série temporal de custos"""
     if request.method != "GET":
@@ -219,55 +259,35 @@ def cost_evolution(request):
         period_label = "FORMAT_TIMESTAMP('%Y-%m', t.datetime)"
 
     try:
-        filters = _build_common_filters(request)
-        where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
+        builder = QueryBuilder()
+        filters = _build_common_filters(request, builder)
+        where_clause = builder.where(filters)
+        limit_clause = (
+            f"LIMIT {builder.param('limit', limit_value, 'INT64')}" if limit_value else ""
+        )
 
-        query = f"""
-        SELECT
-            {period_label} AS period_label,
-            DATE(MIN(t.datetime)) AS period_start,
-            COUNT(t.id) AS total_travels,
-            COALESCE(SUM(t.full_distance), 0) AS total_distance_km,
-            COALESCE(SUM({_COST_EXPRESSION}), 0) AS total_cost
-        FROM `{client.table_ref("travel")}` t
-        LEFT JOIN `{client.table_ref("bill")}` b ON b.travel_id = t.id
-        {where_clause}
-        GROUP BY period_label
-        ORDER BY period_start
-        """
-
-        if limit_value:
-            query += f" LIMIT {limit_value}"
+        include_bill = client.tabela_existe(BILL_TABLE)
+        query = _build_cost_evolution_query(period_label, where_clause, limit_clause, include_bill)
 
         try:
-            results = client.executar_query(query)
+            table = client.query_arrow(query, builder, float_columns=_COST_EVOLUTION_FLOATS)
         except gcloud_exceptions.NotFound:
-            fallback_query = f"""
-            SELECT
-                {period_label} AS period_label,
-                DATE(MIN(t.datetime)) AS period_start,
-                COUNT(t.id) AS total_travels,
-                COALESCE(SUM(t.full_distance), 0) AS total_distance_km,
-                0 AS total_cost
-            FROM `{client.table_ref("travel")}` t
-            {where_clause}
-            GROUP BY period_label
-            ORDER BY period_start
-            """
-            if limit_value:
-                fallback_query += f" LIMIT {limit_value}"
-            results = client.executar_query(fallback_query)
-        data = [
-            {
-                "period": row.get("period_label"),
-                "period_start": row.get("period_start"),
-                "total_travels": int(row.get("total_travels", 0) or 0),
-                "total_distance_km": float(row.get("total_distance_km", 0.0) or 0.0),
-                "total_cost": float(row.get("total_cost", 0.0) or 0.0),
-            }
-            for row in results
-        ]
+            if not include_bill:
+                raise
+            # rede de segurança: o registro ainda não sabia que `bill` sumiu
+            client.tabela_ausente(BILL_TABLE)
+            fallback_query = _build_cost_evolution_query(period_label, where_clause, limit_clause, include_bill=False)
+            table = client.query_arrow(fallback_query, builder, float_columns=_COST_EVOLUTION_FLOATS)
+
+        table = table.select(
+            ["period_label", "period_start", "total_travels", "total_distance_km", "total_cost"]
+        ).rename_columns(["period", "period_start", "total_travels", "total_distance_km", "total_cost"])
+        data = table.to_pylist()
 
         return JsonResponse({"status": "ok", "data": data})
+    except QueryBudgetExceeded as e:
+        return JsonResponse(e.to_dict(), status=400)
+    except QueryTimeout as e:
+        return JsonResponse({"erro": str(e)}, status=504)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
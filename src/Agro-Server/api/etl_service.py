@@ -8,18 +8,33 @@ projeto.
 """
 from __future__ import annotations
 
+import hashlib
 import io
+import itertools
+import logging
+import multiprocessing
 import os
 import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from dataclasses import dataclass
 from datetime import datetime, timezone
-from typing import Iterable, List, Optional
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from clients.bigquery_client import BigQueryClient
+from clients.bigquery_client import BigQueryClient, parse_bytes
+from clients.chunk_loader import DEFAULT_MAX_ATTEMPTS, DEFAULT_WORKERS, ChunkLoadError, ChunkLoader
+from clients.etl_manifest import FileFingerprint, manifesto_padrao
+from clients.registry import get_bigquery_client, get_storage_client
 from clients.storage_client import CloudStorageClient
 
+logger = logging.getLogger(__name__)
+
 
 @dataclass(slots=True)
 class EtlResult:
@@ -33,6 +48,8 @@ class EtlResult:
     rows_read: int
     rows_loaded: int
     processed_at: str
+    load_strategy: Optional[str] = None
+    generation: Optional[int] = None
 
     def as_dict(self) -> dict:
         return {
@@ -44,6 +61,8 @@ class EtlResult:
             "rows_read": self.rows_read,
             "rows_loaded": self.rows_loaded,
             "processed_at": self.processed_at,
+            "load_strategy": self.load_strategy,
+            "generation": self.generation,
         }
 
 
@@ -51,17 +70,48 @@ class EtlService:
     """Serviço de ETL que consome arquivos CSV no bucket *raw* e carrega no BigQuery.
 
     Fluxo básico:
-    1. Baixa o arquivo indicado pelo *blob* no bucket configurado.
+    1. Lê o arquivo indicado pelo *blob* no bucket configurado, em blocos.
     2. Aplica transformações simples (drop de duplicados, normalização de nomes de
        colunas e remoção de linhas vazias).
     3. Carrega os dados tratados para uma tabela do BigQuery.
     4. Persiste uma cópia tratada no bucket na camada *staging*.
+
+    As etapas rodam bloco a bloco: o tamanho do bloco sai de `memory_budget`
+    (ETL_MEMORY_BUDGET), então o pico de memória não depende do tamanho do
+    arquivo. Duplicados são removidos também entre blocos (digest de cada linha bruta) e a
+    cópia de *staging* vai sendo gravada num arquivo temporário.
+
+    A cópia de *staging* é Parquet com zstd (um row group por bloco, schema do
+    primeiro bloco), então quem a lê depois recebe os tipos prontos. Se um bloco
+    seguinte trouxer outro tipo numa coluna, o schema é alargado (inteiro para
+    float, o resto para texto) e o que já foi gravado é convertido.
+    `staging_format="csv"` (ETL_STAGING_FORMAT) mantém o CSV no caminho de
+    streaming insert; o job de carga sempre parte do Parquet.
+
+    A carga depende do tamanho: até `load_job_min_rows` linhas os registros vão
+    por *streaming insert* (`insert_rows_json`); acima disso o DataFrame é gravado
+    em Parquet no *staging* e carregado com um único job de carga, que é gratuito
+    e evita milhares de chamadas HTTP em série.
+
+    Cada arquivo processado fica registrado no manifesto (`clients.etl_manifest`)
+    com a geração e os checksums do blob; a mesma versão não é processada de novo
+    (resultado "skipped"), a menos que `force` seja pedido.
     """
 
     DEFAULT_TARGET_TABLE = "raw_layer"
     DEFAULT_STAGING_PREFIX = "staging/"
     DEFAULT_RAW_PREFIX = "raw/"
     DEFAULT_CHUNK_SIZE = 500
+    DEFAULT_LOAD_JOB_MIN_ROWS = 50_000
+    DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+    DEFAULT_STAGING_FORMAT = "parquet"
+    STAGING_FORMATS = ("parquet", "csv")
+    STAGING_COMPRESSION = "zstd"
+    MAX_PREFIX_WORKERS = 16
+    # linhas convertidas em dicts por vez no caminho de streaming insert
+    PREPARE_ROWS = 10_000
+    STREAMING = "streaming"
+    LOAD_JOB = "load_job"
 
     def __init__(
         self,
@@ -69,19 +119,45 @@ class EtlService:
         bigquery_client: Optional[BigQueryClient] = None,
         *,
         chunk_size: Optional[int] = None,
+        load_job_min_rows: Optional[int] = None,
+        memory_budget: Optional[int] = None,
+        load_workers: Optional[int] = None,
+        manifest: Optional[Any] = None,
+        staging_format: Optional[str] = None,
     ) -> None:
-        self.storage_client = storage_client or CloudStorageClient()
-        self.bigquery_client = bigquery_client or BigQueryClient()
+        self.storage_client = storage_client or get_storage_client()
+        self.bigquery_client = bigquery_client or get_bigquery_client()
         self.chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
+        if load_job_min_rows is None:
+            load_job_min_rows = int(os.getenv("ETL_LOAD_JOB_MIN_ROWS", self.DEFAULT_LOAD_JOB_MIN_ROWS))
+        self.load_job_min_rows = load_job_min_rows
+        self.load_workers = load_workers or int(os.getenv("ETL_LOAD_WORKERS", DEFAULT_WORKERS))
+        self.load_max_attempts = int(os.getenv("ETL_LOAD_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+        self.memory_budget = (
+            memory_budget or parse_bytes(os.getenv("ETL_MEMORY_BUDGET")) or self.DEFAULT_MEMORY_BUDGET
+        )
         self.target_table = os.getenv("BIGQUERY_ETL_TABLE", self.DEFAULT_TARGET_TABLE)
         self.raw_prefix = os.getenv("RAW_LAYER_PREFIX", self.DEFAULT_RAW_PREFIX)
         self.staging_prefix = os.getenv("STAGING_LAYER_PREFIX", self.DEFAULT_STAGING_PREFIX)
+        self.staging_format = (
+            staging_format or os.getenv("ETL_STAGING_FORMAT") or self.DEFAULT_STAGING_FORMAT
+        ).lower()
+        if self.staging_format not in self.STAGING_FORMATS:
+            raise ValueError(f"Formato de staging inválido: {self.staging_format!r} (use parquet ou csv).")
+        # None com ETL_MANIFEST=off: sem controle de reprocessamento
+        self.manifest = manifest if manifest is not None else manifesto_padrao(self.bigquery_client)
 
     # ==============================
     # API pública
     # ==============================
-    def process_raw_file(self, blob_name: str) -> dict:
-        """Executa o pipeline ETL para um blob do bucket Cloud Storage."""
+    def process_raw_file(self, blob_name: str, force: bool = False) -> dict:
+        """Executa o pipeline ETL para um blob do bucket Cloud Storage.
+
+        Antes de baixar qualquer coisa, consulta o manifesto: se esta versão do blob
+        já foi processada, devolve um resultado "skipped" (salvo `force=True`). Em
+        seguida reserva a versão no manifesto; se outra chamada já a reservou (carga
+        em andamento), devolve status "in_progress" sem carregar nada.
+        """
         if not blob_name:
             raise ValueError("O parâmetro 'blob_name' é obrigatório.")
 
@@ -89,27 +165,79 @@ class EtlService:
         if not normalized_blob.lower().endswith(".csv"):
             raise ValueError("Apenas arquivos no formato CSV são suportados nesta versão.")
 
-        raw_bytes = self.storage_client.download_buffer(normalized_blob)
-        dataframe = self._read_csv(raw_bytes)
-        rows_read = len(dataframe)
+        fingerprint = FileFingerprint.from_stat(self.storage_client.stat(normalized_blob))
+        claim_id = None
+        if self.manifest is not None:
+            entry = None if force else self.manifest.buscar(fingerprint)
+            if entry is None:
+                claim_id = self.manifest.reservar(fingerprint, force=force)
+                if claim_id is None:
+                    # perdeu a reserva: a outra chamada pode até já ter terminado
+                    entry = None if force else self.manifest.buscar(fingerprint)
+                    if entry is None:
+                        return self._resultado_em_andamento(fingerprint).as_dict()
+            if entry is not None:
+                return self._resultado_pulado(fingerprint, entry).as_dict()
 
-        if dataframe.empty:
-            result = self._build_result(
-                status="ok",
-                message="Arquivo processado, mas não foram encontrados registros.",
-                raw_blob=normalized_blob,
-                staging_blob=None,
-                table=None,
-                rows_read=0,
-                rows_loaded=0,
-            )
-            return result.as_dict()
-
-        dataframe = self._transform_dataframe(dataframe)
-        records = self._prepare_records(dataframe)
-
-        rows_loaded = self._load_to_bigquery(records)
-        staging_blob = self._persist_staging_artifact(dataframe, normalized_blob)
+        try:
+            result = self._processar(normalized_blob, fingerprint)
+        except BaseException:
+            if claim_id is not None:
+                self._liberar_reserva(fingerprint, claim_id)
+            raise
+        if self.manifest is not None:
+            try:
+                self.manifest.registrar(fingerprint, result, claim_id)
+            except Exception:
+                # os dados já entraram: falhar aqui faria o cliente repetir a carga inteira
+                logger.exception("falha ao registrar %s no manifesto do ETL", normalized_blob)
+        return result
+
+    def _liberar_reserva(self, fingerprint: FileFingerprint, claim_id: str) -> None:
+        try:
+            self.manifest.liberar(fingerprint, claim_id)
+        except Exception:
+            # a reserva expira sozinha depois do claim_ttl do manifesto
+            logger.exception("falha ao liberar a reserva de %s no manifesto do ETL", fingerprint.blob_name)
+
+    def _processar(self, normalized_blob: str, fingerprint: FileFingerprint) -> dict:
+        """Lê, transforma e carrega a versão `fingerprint` do blob."""
+        reader = _LeitorCsv(
+            self.storage_client.open_reader(normalized_blob, generation=fingerprint.generation),
+            self.memory_budget,
+        )
+        try:
+            frames = self._ler_blocos(reader)
+            first = next(frames, None)
+
+            if first is None:
+                result = self._build_result(
+                    status="ok",
+                    message="Arquivo processado, mas não foram encontrados registros.",
+                    raw_blob=normalized_blob,
+                    staging_blob=None,
+                    table=None,
+                    rows_read=0,
+                    rows_loaded=0,
+                    generation=fingerprint.generation,
+                )
+                return result.as_dict()
+
+            strategy = self._escolher_estrategia(self._estimar_linhas(reader, first, fingerprint.size))
+            if strategy == self.LOAD_JOB or self.staging_format == "parquet":
+                # os próximos blocos são lidos com os tipos do primeiro (uma coluna inteira
+                # continua inteira mesmo com lacunas); onde o tipo não servir, vale o inferido
+                reader.dtypes = reader.tipos_do_primeiro_bloco
+            if strategy == self.LOAD_JOB:
+                staging_blob = self._persist_parquet_staging(itertools.chain([first], frames), normalized_blob)
+                rows_loaded = self._load_from_staging(staging_blob)
+            else:
+                rows_loaded, staging_blob = self._load_streaming(
+                    itertools.chain([first], frames), normalized_blob, fingerprint.namespace
+                )
+        finally:
+            reader.close()
+        rows_read = reader.rows_read
 
         result = self._build_result(
             status="ok",
@@ -119,19 +247,205 @@ class EtlService:
             table=self.bigquery_client.table_ref(self.target_table) if rows_loaded else None,
             rows_read=rows_read,
             rows_loaded=rows_loaded,
+            load_strategy=strategy,
+            generation=fingerprint.generation,
         )
         return result.as_dict()
 
+    def _resultado_pulado(self, fingerprint: FileFingerprint, entry: dict) -> EtlResult:
+        return self._build_result(
+            status="skipped",
+            message=(
+                f"Arquivo já processado em {entry.get('processed_at')} (geração {entry.get('generation')}); "
+                "use 'force' para reprocessar."
+            ),
+            raw_blob=fingerprint.blob_name,
+            staging_blob=entry.get("staging_blob"),
+            table=entry.get("target_table"),
+            rows_read=0,
+            rows_loaded=0,
+            load_strategy=entry.get("load_strategy"),
+            generation=fingerprint.generation,
+        )
+
+    def _resultado_em_andamento(self, fingerprint: FileFingerprint) -> EtlResult:
+        return self._build_result(
+            status="in_progress",
+            message="Esta versão do arquivo já está sendo processada por outra chamada.",
+            raw_blob=fingerprint.blob_name,
+            staging_blob=None,
+            table=None,
+            rows_read=0,
+            rows_loaded=0,
+            generation=fingerprint.generation,
+        )
+
+    def process_prefix(
+        self,
+        prefix: Optional[str] = None,
+        workers: Optional[int] = None,
+        *,
+        limit: Optional[int] = None,
+        force: bool = False,
+        service_factory: Optional[Callable[[dict], "EtlService"]] = None,
+    ) -> dict:
+        """Processa os CSVs ainda não processados sob `prefix` num pool de processos.
+
+        Cada arquivo roda num processo próprio (o parsing é CPU e segura o GIL); o
+        orçamento de memória é dividido entre os `workers`, então o lote inteiro
+        respeita `memory_budget`. Os processos são criados com *spawn*: o processo
+        pai pode ter threads (gunicorn, clientes gRPC) que não sobrevivem a um fork.
+        `service_factory(config)` monta o serviço em cada processo (precisa ser
+        picklável); o padrão usa os clientes do registro. Com `workers=1` tudo roda
+        aqui mesmo, sem pool. `force` reprocessa também os arquivos já registrados
+        no manifesto.
+        """
+        if workers is None:
+            workers = min(os.cpu_count() or 1, self.MAX_PREFIX_WORKERS)
+        if not 1 <= workers <= self.MAX_PREFIX_WORKERS:
+            raise ValueError(f"'workers' deve estar entre 1 e {self.MAX_PREFIX_WORKERS}.")
+        if limit is not None and limit < 1:
+            raise ValueError("'limit' deve ser maior que zero.")
+
+        prefix = prefix if prefix is not None else self.raw_prefix
+        listing = self.listar_pendentes(prefix, force=force)
+        pending = listing["pending"][:limit] if limit else listing["pending"]
+
+        started = time.perf_counter()
+        if workers == 1 or len(pending) <= 1:
+            results = [_processar_medindo(self, blob, force) for blob in pending]
+        else:
+            results = self._processar_em_pool(pending, min(workers, len(pending)), force, service_factory)
+        elapsed = time.perf_counter() - started
+
+        order = {blob: i for i, blob in enumerate(pending)}
+        results.sort(key=lambda item: order[item["raw_blob"]])
+        rows_read = sum(item["rows_read"] for item in results)
+        rows_loaded = sum(item["rows_loaded"] for item in results)
+        return {
+            "prefix": prefix,
+            "workers": workers,
+            "files_found": len(listing["found"]),
+            "files_already_processed": len(listing["found"]) - len(listing["pending"]),
+            "files_pending": len(listing["pending"]),
+            "files_processed": sum(1 for item in results if item["status"] == "ok"),
+            "files_skipped": sum(1 for item in results if item["status"] in ("skipped", "in_progress")),
+            "files_failed": sum(1 for item in results if item["status"] == "error"),
+            "rows_read": rows_read,
+            "rows_loaded": rows_loaded,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(rows_read / elapsed) if elapsed and rows_read else 0,
+            "files_per_min": round(len(results) * 60 / elapsed, 2) if elapsed and results else 0.0,
+            "results": results,
+        }
+
+    def listar_pendentes(self, prefix: Optional[str] = None, force: bool = False) -> Dict[str, List[str]]:
+        """CSVs sob `prefix` e os que ainda não foram processados na versão atual.
+
+        Vale o manifesto. Blobs que nunca passaram por ele (processados antes de o
+        manifesto existir) contam como processados se já têm artefato no *staging*.
+        """
+        prefix = prefix if prefix is not None else self.raw_prefix
+        stats = sorted(
+            (item for item in self.storage_client.list_stats(prefix) if item["name"].lower().endswith(".csv")),
+            key=lambda item: item["name"],
+        )
+        found = [item["name"] for item in stats]
+        if force:
+            return {"found": found, "pending": found}
+
+        entries = self.manifest.entradas(found) if self.manifest is not None else {}
+        legacy = self._processados() if any(name not in entries for name in found) else set()
+        pending = []
+        for item in stats:
+            fingerprint = FileFingerprint.from_stat(item)
+            if fingerprint.blob_name in entries:
+                processed = any(fingerprint.corresponde(entry) for entry in entries[fingerprint.blob_name])
+            else:
+                processed = _nome_base(fingerprint.blob_name) in legacy
+            if not processed:
+                pending.append(fingerprint.blob_name)
+        return {"found": found, "pending": pending}
+
+    def _processados(self) -> set:
+        """Nomes base dos arquivos que já geraram `<nome>_processed_<timestamp>.<ext>` no *staging*."""
+        names = set()
+        for blob in self.storage_client.list_blobs(self.staging_prefix):
+            match = _STAGING_RE.match(os.path.basename(blob))
+            if match:
+                names.add(match.group(1))
+        return names
+
+    def _processar_em_pool(
+        self,
+        blobs: List[str],
+        workers: int,
+        force: bool,
+        service_factory: Optional[Callable[[dict], "EtlService"]],
+    ) -> List[dict]:
+        config = {
+            "chunk_size": self.chunk_size,
+            "load_job_min_rows": self.load_job_min_rows,
+            "memory_budget": max(1, self.memory_budget // workers),
+            "load_workers": self.load_workers,
+        }
+        results = []
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_iniciar_processo,
+            initargs=(service_factory or _servico_padrao, config),
+        ) as pool:
+            futures = {pool.submit(_processar_no_processo, blob, force): blob for blob in blobs}
+            for future in as_completed(futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    # processo morto (ex: OOM) ou resultado que não voltou
+                    results.append({**self._resultado_com_erro(futures[future], e), "elapsed_s": 0.0})
+        return results
+
+    def _resultado_com_erro(self, blob_name: str, error: BaseException) -> dict:
+        result = self._build_result(
+            status="error",
+            message=str(error),
+            raw_blob=blob_name,
+            staging_blob=None,
+            table=None,
+            rows_read=0,
+            rows_loaded=getattr(getattr(error, "ledger", None), "rows_loaded", 0),
+        ).as_dict()
+        if isinstance(error, ChunkLoadError):
+            result["missing_ranges"] = [list(r) for r in error.ledger.missing_ranges()]
+        return result
+
     # ==============================
     # Etapas do pipeline
     # ==============================
-    def _read_csv(self, file_bytes: bytes) -> pd.DataFrame:
+    def _read_csv(self, file_bytes: bytes, dtype: Optional[Dict[str, str]] = None) -> pd.DataFrame:
         """Converte os bytes do arquivo CSV em um DataFrame pandas."""
         try:
-            return pd.read_csv(io.BytesIO(file_bytes))
+            return pd.read_csv(io.BytesIO(file_bytes), dtype=dtype)
         except UnicodeDecodeError:
             # fallback para arquivos com acentuação em latin-1
-            return pd.read_csv(io.BytesIO(file_bytes), encoding="latin-1")
+            return pd.read_csv(io.BytesIO(file_bytes), encoding="latin-1", dtype=dtype)
+
+    def _ler_blocos(self, reader: "_LeitorCsv") -> Iterator[pd.DataFrame]:
+        """Lê, converte e transforma o CSV bloco a bloco."""
+        for records in reader.blocos():
+            raw = reader.header + b"\n" + b"\n".join(records)
+            del records
+            try:
+                frame = self._read_csv(raw, dtype=reader.dtypes)
+            except (TypeError, ValueError) as e:
+                if reader.dtypes is None:
+                    raise
+                # o tipo de alguma coluna mudou ao longo do arquivo: o staging alarga o schema
+                logger.info("tipos do primeiro bloco não servem a partir da linha %s: %s", reader.rows_read, e)
+                frame = _aplicar_tipos(self._read_csv(raw), reader.dtypes)
+            reader.medir(len(raw), frame)
+            del raw
+            yield self._transform_dataframe(frame)
 
     def _transform_dataframe(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """Aplica transformações básicas no DataFrame."""
@@ -141,57 +455,177 @@ class EtlService:
         return dataframe
 
     def _prepare_records(self, dataframe: pd.DataFrame) -> List[dict]:
-        """Prepara os registros para inserção no BigQuery."""
-        prepared = []
-        for row in dataframe.to_dict(orient="records"):
-            cleaned_row = {}
-            for key, value in row.items():
-                if pd.isna(value):
-                    cleaned_row[key] = None
-                elif isinstance(value, (pd.Timestamp, datetime)):
-                    cleaned_row[key] = value.isoformat()
-                else:
-                    cleaned_row[key] = value
-            prepared.append(cleaned_row)
-        return prepared
-
-    def _load_to_bigquery(self, records: List[dict]) -> int:
-        """Insere os registros em uma tabela do BigQuery."""
-        if not records:
-            return 0
-
-        table_ref = self.bigquery_client.table_ref(self.target_table)
-        total_inserted = 0
-        errors: List[dict] = []
-
-        for chunk in self._chunk(records, self.chunk_size):
-            response = self.bigquery_client.client.insert_rows_json(table_ref, chunk)
-            if response:
-                errors.extend(response)
-            else:
-                total_inserted += len(chunk)
+        """Prepara os registros para inserção no BigQuery.
+
+        A conversão é feita por coluna (NaN -> None, timestamps -> ISO 8601,
+        escalares numpy -> tipos nativos); o único laço por linha que sobra é a
+        montagem dos dicts exigidos pelo `insert_rows_json`.
+        """
+        columns = [str(col) for col in dataframe.columns]
+        values = [_coluna_nativa(dataframe.iloc[:, i]) for i in range(dataframe.shape[1])]
+        return [dict(zip(columns, row)) for row in zip(*values)]
+
+    def _prepare_ndjson(self, dataframe: pd.DataFrame) -> bytes:
+        """Serializa o DataFrame como JSON delimitado por linha (formato NEWLINE_DELIMITED_JSON)."""
+        if dataframe.empty:
+            return b""
+        return dataframe.to_json(orient="records", lines=True, date_format="iso", date_unit="us").encode("utf-8")
 
-        if errors:
-            raise RuntimeError(f"Falha ao inserir registros no BigQuery: {errors}")
+    def _load_to_bigquery(self, records: Iterable[dict], namespace: str) -> int:
+        """Insere os registros em uma tabela do BigQuery (blocos paralelos, com retentativa).
 
-        return total_inserted
+        O `insertId` de cada linha vem de `namespace` (blob e geração) e da posição da
+        linha, então reprocessar o mesmo arquivo logo em seguida não duplica o que já entrou. Se algum bloco
+        falhar, `ChunkLoadError` lista as faixas de linhas que ficaram de fora.
+        """
+        table_ref = self.bigquery_client.table_ref(self.target_table)
+        loader = ChunkLoader(
+            lambda rows, row_ids: self.bigquery_client.client.insert_rows_json(table_ref, rows, row_ids=row_ids),
+            namespace=namespace,
+            chunk_size=self.chunk_size,
+            workers=self.load_workers,
+            max_attempts=self.load_max_attempts,
+        )
+        try:
+            ledger = loader.load(records)
+        except ChunkLoadError as e:
+            if e.ledger.rows_loaded:
+                self.bigquery_client.invalidar_cache(self.target_table)
+            raise
+
+        if ledger.rows_loaded:
+            self.bigquery_client.invalidar_cache(self.target_table)
+        return ledger.rows_loaded
+
+    def _escolher_estrategia(self, rows: int) -> str:
+        """Streaming insert para arquivos pequenos; job de carga a partir de `load_job_min_rows`."""
+        if self.load_job_min_rows > 0 and rows >= self.load_job_min_rows:
+            return self.LOAD_JOB
+        return self.STREAMING
+
+    def _estimar_linhas(self, reader: "_LeitorCsv", first: pd.DataFrame, size: Optional[int]) -> int:
+        """Linhas do arquivo: exatas se ele coube no primeiro bloco, senão pela proporção de bytes.
+
+        `size` é o tamanho do blob, já lido junto com os metadados do manifesto.
+        """
+        if reader.eof:
+            return len(first)
+        if not size or not reader.bytes_read:
+            return max(self.load_job_min_rows, len(first))
+        return int(reader.rows_read * size / reader.bytes_read)
+
+    def _load_streaming(self, frames: Iterable[pd.DataFrame], raw_blob: str, namespace: Optional[str] = None) -> tuple:
+        """Streaming insert bloco a bloco, gravando a cópia do *staging* no caminho."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, f"staging.{self.staging_format}")
+            gravando = self._gravar_staging(frames, path, self.staging_format)
+            try:
+                rows_loaded = self._load_to_bigquery(self._registros(gravando), namespace or raw_blob)
+            finally:
+                gravando.close()
+            staging_blob = self._upload_staging(path, raw_blob, self.staging_format)
+        return rows_loaded, staging_blob
+
+    def _registros(self, frames: Iterable[pd.DataFrame]) -> Iterator[dict]:
+        """Registros prontos para o `insert_rows_json`, convertidos `PREPARE_ROWS` linhas por vez."""
+        for frame in frames:
+            for start in range(0, len(frame), self.PREPARE_ROWS):
+                yield from self._prepare_records(frame.iloc[start:start + self.PREPARE_ROWS])
+
+    def _load_from_staging(self, staging_blob: str) -> int:
+        """Carrega o Parquet do *staging* na tabela de destino com um único job (WRITE_APPEND)."""
+        load_job = self.bigquery_client.load_from_gcs(
+            self.storage_client.gcs_uri(staging_blob),
+            self.target_table,
+            source_format="PARQUET",
+            write_disposition="WRITE_APPEND",
+        )
+        return int(getattr(load_job, "output_rows", None) or 0)
+
+    def _persist_parquet_staging(self, frames: Iterable[pd.DataFrame], raw_blob: str) -> str:
+        """Grava os blocos tratados em Parquet na camada *staging* (origem do job de carga)."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "staging.parquet")
+            for _ in self._gravar_staging(frames, path, "parquet"):
+                pass
+            return self._upload_staging(path, raw_blob, "parquet")
+
+    def _gravar_staging(self, frames: Iterable[pd.DataFrame], path: str, formato: str) -> Iterator[pd.DataFrame]:
+        """Grava cada bloco em `path` (Parquet: um row group por bloco) e o repassa adiante.
+
+        O arquivo só fica completo depois que o gerador termina (ou é fechado).
+        """
+        if formato == "csv":
+            with open(path, "wb") as staging:
+                for i, frame in enumerate(frames):
+                    frame.to_csv(staging, index=False, header=i == 0)
+                    yield frame
+            return
+
+        writer = None
+        try:
+            for frame in frames:
+                table = _tabela_arrow(frame)
+                if writer is None:
+                    writer = self._abrir_parquet(path, _esquema_gravavel(table.schema))
+                elif not table.schema.equals(writer.schema):
+                    schema = _unificar_esquemas(writer.schema, table.schema)
+                    if not schema.equals(writer.schema):
+                        writer.close()
+                        writer = self._regravar_parquet(path, schema)
+                writer.write_table(table.cast(writer.schema, safe=False))
+                yield frame
+        finally:
+            if writer is not None:
+                writer.close()
+
+    def _abrir_parquet(self, path: str, schema: pa.Schema) -> pq.ParquetWriter:
+        # BigQuery não aceita timestamps em nanossegundos
+        return pq.ParquetWriter(
+            path,
+            schema,
+            compression=self.STAGING_COMPRESSION,
+            coerce_timestamps="us",
+            allow_truncated_timestamps=True,
+        )
 
-    def _persist_staging_artifact(self, dataframe: pd.DataFrame, raw_blob: str) -> str:
-        """Gera um artefato tratado e envia para a camada *staging* no bucket."""
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
-        base_name = os.path.basename(raw_blob)
-        sanitized_name = os.path.splitext(base_name)[0]
-        staging_blob_name = f"{self.staging_prefix}{sanitized_name}_processed_{timestamp}.csv"
+    def _regravar_parquet(self, path: str, schema: pa.Schema) -> pq.ParquetWriter:
+        """Converte os row groups já gravados em `path` para `schema` e devolve o writer aberto.
 
-        buffer = io.BytesIO()
-        dataframe.to_csv(buffer, index=False)
-        staging_bytes = buffer.getvalue()
-        self.storage_client.upload_buffer(staging_bytes, staging_blob_name)
+        Só acontece quando o tipo de uma coluna muda no meio do arquivo; lê e
+        regrava um row group (bloco) por vez.
+        """
+        previous = path + ".anterior"
+        os.replace(path, previous)
+        writer = self._abrir_parquet(path, schema)
+        try:
+            source = pq.ParquetFile(previous)
+            try:
+                for i in range(source.num_row_groups):
+                    writer.write_table(source.read_row_group(i).cast(schema, safe=False))
+            finally:
+                source.close()
+        except Exception:
+            writer.close()
+            raise
+        os.remove(previous)
+        return writer
+
+    def _upload_staging(self, path: str, raw_blob: str, extension: str) -> str:
+        """Envia o arquivo temporário para a camada *staging* no bucket."""
+        staging_blob_name = self._staging_blob_name(raw_blob, extension)
+        self.storage_client.upload_file(path, staging_blob_name)
         return staging_blob_name
 
     # ==============================
     # Utilidades
     # ==============================
+    def _staging_blob_name(self, raw_blob: str, extension: str) -> str:
+        timestamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        base_name = os.path.basename(raw_blob)
+        sanitized_name = os.path.splitext(base_name)[0]
+        return f"{self.staging_prefix}{sanitized_name}_processed_{timestamp}.{extension}"
+
     def _build_result(
         self,
         *,
@@ -202,6 +636,8 @@ class EtlService:
         table: Optional[str],
         rows_read: int,
         rows_loaded: int,
+        load_strategy: Optional[str] = None,
+        generation: Optional[int] = None,
     ) -> EtlResult:
         processed_at = datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
         return EtlResult(
@@ -213,6 +649,8 @@ class EtlService:
             rows_read=rows_read,
             rows_loaded=rows_loaded,
             processed_at=processed_at,
+            load_strategy=load_strategy,
+            generation=generation,
         )
 
     def _normalize_column(self, column_name: str) -> str:
@@ -220,13 +658,296 @@ class EtlService:
         normalized = re.sub(r"[^0-9a-zA-Z]+", "_", column_name.strip().lower())
         return normalized.strip("_")
 
-    def _chunk(self, iterable: Iterable[dict], size: int) -> Iterable[List[dict]]:
-        """Agrupa os itens do iterável em blocos de `size` itens."""
-        chunk: List[dict] = []
-        for item in iterable:
-            chunk.append(item)
-            if len(chunk) == size:
-                yield chunk
-                chunk = []
-        if chunk:
-            yield chunk
\ No newline at end of file
+
+_STAGING_RE = re.compile(r"^(.*)_processed_\d{8}T\d{6}Z\.[A-Za-z0-9.]+$")
+
+
+def _nome_base(blob_name: str) -> str:
+    return os.path.splitext(os.path.basename(blob_name))[0]
+
+
+def _processar_medindo(service: EtlService, blob_name: str, force: bool = False) -> dict:
+    """`process_raw_file` com o tempo gasto; erros viram um resultado com status "error"."""
+    started = time.perf_counter()
+    try:
+        result = service.process_raw_file(blob_name, force=force)
+    except Exception as e:
+        result = service._resultado_com_erro(blob_name, e)
+    result["elapsed_s"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _servico_padrao(config: dict) -> EtlService:
+    return EtlService(**config)
+
+
+# serviço de cada processo do pool (criado uma vez, no initializer)
+_servico_do_processo: Optional[EtlService] = None
+
+
+def _iniciar_processo(factory: Callable[[dict], EtlService], config: Dict[str, Any]) -> None:
+    global _servico_do_processo
+    _servico_do_processo = factory(config)
+
+
+def _processar_no_processo(blob_name: str, force: bool) -> dict:
+    return _processar_medindo(_servico_do_processo, blob_name, force)
+
+
+# Tipos que `infer_dtype` reporta em colunas object que dispensam conversão célula a célula
+_OBJETOS_NATIVOS = {"string", "empty", "integer", "floating", "mixed-integer-float", "boolean", "bytes"}
+
+
+def _coluna_nativa(series: pd.Series) -> list:
+    """Converte uma coluna inteira em valores serializáveis em JSON (None no lugar de NaN/NaT)."""
+    if isinstance(series.dtype, pd.DatetimeTZDtype):
+        utc = series.dt.tz_convert("UTC").dt.tz_localize(None)
+        return _datas_iso(utc, sufixo="Z")
+    if pd.api.types.is_datetime64_dtype(series.dtype):
+        return _datas_iso(series)
+    if series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in _OBJETOS_NATIVOS:
+        # coluna mista (ex: datetime do Python no meio de strings): mantém a regra célula a célula
+        return [_valor_nativo(value) for value in series.tolist()]
+    # dtype=object faz o numpy devolver int/float/bool nativos do Python
+    return series.to_numpy(dtype=object, na_value=None).tolist()
+
+
+def _tabela_arrow(dataframe: pd.DataFrame) -> pa.Table:
+    """DataFrame -> Arrow; colunas object mistas viram texto (o Parquet exige um tipo por coluna).
+
+    Colunas só com nulos ficam com o tipo nulo: o tipo delas vem dos outros blocos
+    (ver `_unificar_esquemas`).
+    """
+    arrays = []
+    for i in range(dataframe.shape[1]):
+        series = dataframe.iloc[:, i]
+        if series.isna().all():
+            arrays.append(pa.nulls(len(series)))
+        elif series.dtype == object and pd.api.types.infer_dtype(series, skipna=True) not in _OBJETOS_NATIVOS:
+            texts = [None if value is None else str(value) for value in _coluna_nativa(series)]
+            arrays.append(pa.array(texts, type=pa.string()))
+        else:
+            arrays.append(pa.array(series, from_pandas=True))
+    return pa.Table.from_arrays(arrays, names=[str(col) for col in dataframe.columns])
+
+
+def _esquema_gravavel(schema: pa.Schema) -> pa.Schema:
+    """Schema do primeiro row group: coluna ainda sem tipo (só nulos) vira texto."""
+    return pa.schema([
+        field.with_type(pa.string()) if pa.types.is_null(field.type) else field for field in schema
+    ])
+
+
+def _unificar_esquemas(atual: pa.Schema, novo: pa.Schema) -> pa.Schema:
+    """Schema que comporta os dois: mesmo tipo, inteiro com float -> float64, o resto -> texto."""
+    return pa.schema([
+        field.with_type(_tipo_comum(field.type, novo.field(i).type)) for i, field in enumerate(atual)
+    ])
+
+
+def _tipo_comum(atual: pa.DataType, novo: pa.DataType) -> pa.DataType:
+    if atual.equals(novo) or pa.types.is_null(novo):
+        return atual
+    if pa.types.is_integer(atual) and pa.types.is_integer(novo):
+        return pa.int64()
+    if all(pa.types.is_integer(t) or pa.types.is_floating(t) for t in (atual, novo)):
+        return pa.float64()
+    return pa.string()
+
+
+def _aplicar_tipos(frame: pd.DataFrame, dtypes: Dict[str, str]) -> pd.DataFrame:
+    """Converte cada coluna para o tipo do primeiro bloco quando possível; as outras ficam com o tipo inferido."""
+    for column, dtype in dtypes.items():
+        if column not in frame.columns:
+            continue
+        try:
+            frame[column] = frame[column].astype(dtype)
+        except (TypeError, ValueError):
+            pass
+    return frame
+
+
+def _datas_iso(series: pd.Series, sufixo: str = "") -> list:
+    texts = np.datetime_as_string(series.to_numpy(dtype="datetime64[us]"), unit="us")
+    mask = series.isna().to_numpy()
+    return [None if missing else text + sufixo for text, missing in zip(texts.tolist(), mask.tolist())]
+
+
+def _valor_nativo(value):
+    if value is None or value is pd.NA:
+        return None
+    if isinstance(value, (pd.Timestamp, datetime)):
+        return None if pd.isna(value) else value.isoformat()
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def _tipo_fixo(series: pd.Series) -> str:
+    """dtype usado para ler os blocos seguintes (nullable, para aceitar lacunas que o 1º bloco não teve)."""
+    if series.isna().all():
+        return "object"
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return "boolean"
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return "Int64"
+    if pd.api.types.is_float_dtype(series.dtype):
+        return "float64"
+    return "object"
+
+
+class _HashesVistos:
+    """Digests (blake2b, 128 bits) das linhas já lidas em arrays numpy ordenados (~16 bytes por linha única).
+
+    O digest é estável entre processos e execuções (ao contrário do `hash()`, que
+    tem semente por processo), então o mesmo arquivo sempre gera o mesmo
+    resultado, inclusive nos workers do pool. Uma colisão descartaria uma linha
+    distinta sem aviso; com 128 bits a chance é da ordem de n²/2¹²⁹ (menos de
+    1e-20 para um bilhão de linhas). A comparação é dos bytes brutos: `1,a` e
+    `1.0,a` em blocos diferentes não são duplicados (dentro do bloco, o
+    `drop_duplicates` ainda compara as linhas já convertidas).
+    """
+
+    def __init__(self):
+        # metades do digest, ordenadas por `_hi`
+        self._hi = np.empty(0, dtype=np.uint64)
+        self._lo = np.empty(0, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self._hi)
+
+    def filtrar(self, records: List[bytes]) -> List[bytes]:
+        """Mantém a primeira ocorrência de cada registro que ainda não apareceu."""
+        words = np.frombuffer(
+            b"".join(hashlib.blake2b(record, digest_size=16).digest() for record in records), dtype="<u8"
+        ).reshape(-1, 2)
+        hi, lo = words[:, 0], words[:, 1]
+        # lexsort é estável: em cada grupo de digests iguais, o primeiro é a primeira ocorrência
+        order = np.lexsort((lo, hi))
+        sorted_hi, sorted_lo = hi[order], lo[order]
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = (sorted_hi[1:] != sorted_hi[:-1]) | (sorted_lo[1:] != sorted_lo[:-1])
+        cand_hi, cand_lo, cand_idx = sorted_hi[first], sorted_lo[first], order[first]
+
+        left = np.searchsorted(self._hi, cand_hi, side="left")
+        right = np.searchsorted(self._hi, cand_hi, side="right")
+        seen = np.zeros(len(cand_hi), dtype=bool)
+        single = right - left == 1
+        seen[single] = self._lo[left[single]] == cand_lo[single]
+        for i in np.flatnonzero(right - left > 1).tolist():
+            # mesma metade alta para digests diferentes (raríssimo): confere a faixa toda
+            seen[i] = bool((self._lo[left[i]:right[i]] == cand_lo[i]).any())
+
+        fresh = ~seen
+        self._hi = np.insert(self._hi, left[fresh], cand_hi[fresh])
+        self._lo = np.insert(self._lo, left[fresh], cand_lo[fresh])
+        return [records[i] for i in np.sort(cand_idx[fresh]).tolist()]
+
+
+class _LeitorCsv:
+    """Lê um CSV de um stream em blocos de registros completos.
+
+    O corte dos blocos respeita campos entre aspas com quebra de linha, então
+    cada bloco é um CSV válido com o cabeçalho do arquivo. O tamanho do bloco
+    começa em 1/16 do orçamento e é recalculado pelo primeiro DataFrame lido
+    (`RAW_COST`/`FRAME_COST`). Fora do orçamento ficam só os digests das linhas
+    já vistas (~16 bytes por linha única, o dobro durante a inserção).
+    """
+
+    MIN_BLOCK_BYTES = 64 * 1024
+    # texto bruto + lista de registros (bytes) + o CSV remontado, por byte lido
+    RAW_COST = 3
+    # DataFrame lido + cópia transformada + Arrow/dicts + buffers de escrita, por byte do DataFrame
+    FRAME_COST = 4
+
+    def __init__(self, stream, memory_budget: int):
+        self.stream = stream
+        self.memory_budget = memory_budget
+        self.block_bytes = max(self.MIN_BLOCK_BYTES, memory_budget // 16)
+        self.header: Optional[bytes] = None
+        self.dtypes: Optional[Dict[str, str]] = None
+        self.tipos_do_primeiro_bloco: Optional[Dict[str, str]] = None
+        self.rows_read = 0
+        self.bytes_read = 0
+        self.duplicates = 0
+        self.eof = False
+        self._pending = b""
+        self._seen = _HashesVistos()
+
+    def blocos(self) -> Iterator[List[bytes]]:
+        """Registros (sem o fim de linha) ainda não vistos, bloco a bloco; o cabeçalho fica em `header`."""
+        while not self.eof:
+            records = _separar_registros(self._ler())
+            if self.header is None:
+                if not records:
+                    continue
+                self.header = records.pop(0)
+            records = [record for record in records if record.strip()]
+            self.rows_read += len(records)
+            unique = self._seen.filtrar(records) if records else []
+            self.duplicates += len(records) - len(unique)
+            if unique:
+                yield unique
+
+    def medir(self, raw_bytes: int, frame: pd.DataFrame) -> None:
+        """Ajusta o tamanho dos próximos blocos ao custo real em memória do primeiro."""
+        if self.tipos_do_primeiro_bloco is not None:
+            return
+        self.tipos_do_primeiro_bloco = {str(col): _tipo_fixo(frame[col]) for col in frame.columns}
+        if raw_bytes and len(frame):
+            ratio = frame.memory_usage(deep=True).sum() / raw_bytes
+            self.block_bytes = max(self.MIN_BLOCK_BYTES, int(self.memory_budget / (self.RAW_COST + self.FRAME_COST * ratio)))
+
+    def close(self) -> None:
+        close = getattr(self.stream, "close", None)
+        if close is not None:
+            close()
+
+    def _ler(self) -> bytes:
+        chunk = self.stream.read(self.block_bytes)
+        self.bytes_read += len(chunk)
+        data = self._pending + chunk
+        if len(chunk) < self.block_bytes:
+            self.eof = True
+            self._pending = b""
+            return data
+        cut = _fim_do_ultimo_registro(data)
+        if cut < 0:
+            # nenhum registro completo ainda (linha maior que o bloco): lê mais
+            self._pending = data
+            return b""
+        self._pending = data[cut + 1:]
+        return data[:cut]
+
+
+def _fim_do_ultimo_registro(data: bytes) -> int:
+    """Posição do último `\n` fora de aspas (-1 se não houver)."""
+    cut = data.rfind(b"\n")
+    if b'"' not in data:
+        return cut
+    while cut >= 0 and data.count(b'"', 0, cut) % 2:
+        cut = data.rfind(b"\n", 0, cut)
+    return cut
+
+
+def _separar_registros(data: bytes) -> List[bytes]:
+    """Quebra o bloco em registros, juntando as linhas de um campo entre aspas."""
+    if not data:
+        return []
+    lines = data.split(b"\n")
+    if b'"' not in data:
+        return lines
+    records: List[bytes] = []
+    parts: List[bytes] = []
+    quotes = 0
+    for line in lines:
+        parts.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            records.append(b"\n".join(parts))
+            parts, quotes = [], 0
+    if parts:
+        records.append(b"\n".join(parts))
+    return records
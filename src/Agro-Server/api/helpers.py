@@ -1,5 +1,14 @@
+import json
+from functools import wraps
 from datetime import datetime, timezone
-from typing import List, Optional
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+from clients.bigquery_client import QueryBuilder, encode_cursor
+
+_STREAM_FLUSH_BYTES = 64 * 1024
 
 
 def parse_iso_datetime(value: Optional[str]) -> Optional[datetime]:
@@ -36,21 +45,104 @@ def build_datetime_filters(
     column: str,
     start: Optional[datetime],
     end: Optional[datetime],
+    builder: QueryBuilder,
 ) -> List[str]:
     """
-    Retorna uma lista de filtros SQL prontos para aplicar em queries.
+    Retorna uma lista de filtros SQL parametrizados prontos para aplicar em queries.
+    Os valores são registrados no `builder` como parâmetros TIMESTAMP.
     """
     filters: List[str] = []
 
     if start:
-        filters.append(
-            f"{column} >= TIMESTAMP('{format_datetime_for_bigquery(start)}')"
-        )
+        filters.append(f"{column} >= {builder.param('start_date', start, 'TIMESTAMP')}")
 
     if end:
-        filters.append(
-            f"{column} <= TIMESTAMP('{format_datetime_for_bigquery(end)}')"
-        )
+        filters.append(f"{column} <= {builder.param('end_date', end, 'TIMESTAMP')}")
 
     return filters
 
+
+def streaming_json_response(
+    rows: Iterable[dict],
+    extra: Union[dict, Callable[[], dict], None] = None,
+) -> StreamingHttpResponse:
+    """
+    Serializa `rows` em JSON conforme os registros chegam, sem montar a lista inteira.
+
+    O corpo tem o mesmo formato de `JsonResponse({"status": "ok", "data": [...], "count": n})`.
+    `count` e os campos de `extra` vêm depois de `data`; `extra` pode ser uma função,
+    chamada só ao final, para incluir valores calculados durante a iteração.
+    """
+
+    def gerar():
+        encoder = DjangoJSONEncoder()
+        buffer: List[str] = ['{"status": "ok", "data": [']
+        size = 0
+        count = 0
+        for row in rows:
+            chunk = ("" if count == 0 else ", ") + encoder.encode(row)
+            buffer.append(chunk)
+            size += len(chunk)
+            count += 1
+            if size >= _STREAM_FLUSH_BYTES:
+                yield "".join(buffer)
+                buffer, size = [], 0
+
+        tail = {"count": count}
+        tail.update(extra() if callable(extra) else (extra or {}))
+        buffer.append("], " + encoder.encode(tail)[1:])
+        yield "".join(buffer)
+
+    return StreamingHttpResponse(gerar(), content_type="application/json")
+
+
+def parse_limit(value: Optional[str], default: Optional[int] = None) -> Optional[int]:
+    """Converte o parâmetro `limit` da query string, caindo no padrão se inválido."""
+    try:
+        return int(value) if value else default
+    except ValueError:
+        return default
+
+
+class KeysetPage:
+    """
+    Acompanha os registros emitidos em uma listagem para gerar o `next_cursor`.
+
+    Pensado para respostas em streaming: o cursor só é conhecido depois que o
+    último registro da página foi serializado.
+    """
+
+    def __init__(self, rows: Iterable[dict], limit: Optional[int], order_key: str, id_key: str = "id"):
+        self._rows = rows
+        self.limit = limit
+        self.order_key = order_key
+        self.id_key = id_key
+        self.count = 0
+        self._last: Optional[dict] = None
+
+    def __iter__(self) -> Iterator[dict]:
+        for row in self._rows:
+            self.count += 1
+            self._last = row
+            yield row
+
+    def next_cursor(self) -> Optional[str]:
+        if not self.limit or self.count < self.limit or self._last is None:
+            return None
+        return encode_cursor(self._last.get(self.order_key), self._last.get(self.id_key))
+
+
+def com_orcamento(client, endpoint: str, dry_run: bool = False):
+    """Decorator: roda a view dentro de `client.orcamento(endpoint, dry_run=dry_run)`.
+
+    As queries da view vão com o limite de bytes do endpoint e levantam
+    `QueryBudgetExceeded` se passarem dele; a view decide a resposta. O dry-run
+    antes de cada job é opcional (uma ida a mais ao BigQuery por query).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with client.orcamento(endpoint, dry_run=dry_run):
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,88 @@
+import io
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from api.etl_service import EtlService
+
+
+def _csv_sintetico(rows, seed=42):
+    """CSV no formato da telemetria bruta: ids, unidade, data em texto, medidas com lacunas."""
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("2024-01-01T00:00:00")
+    frame = pd.DataFrame({
+        "ID": np.arange(1, rows + 1),
+        "Unit ID": rng.integers(1, 200, rows),
+        "Datetime": (start + rng.integers(0, 365 * 86400, rows).astype("timedelta64[s]")).astype(str),
+        "Fuel Level": np.where(rng.random(rows) < 0.1, np.nan, rng.random(rows) * 100),
+        "Speed": rng.random(rows) * 120,
+        "Driver": np.where(rng.random(rows) < 0.05, None, rng.choice(["ana", "bia", "caio", "davi"], rows)),
+    })
+    buffer = io.BytesIO()
+    frame.to_csv(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _prepare_records_por_celula(dataframe):
+    """Implementação anterior de `_prepare_records` (referência do "antes")."""
+    prepared = []
+    for row in dataframe.to_dict(orient="records"):
+        cleaned_row = {}
+        for key, value in row.items():
+            if pd.isna(value):
+                cleaned_row[key] = None
+            elif isinstance(value, (pd.Timestamp, datetime)):
+                cleaned_row[key] = value.isoformat()
+            else:
+                cleaned_row[key] = value
+        prepared.append(cleaned_row)
+    return prepared
+
+
+class Command(BaseCommand):
+    help = 'Mede linhas/s da preparação de registros do ETL (por célula vs. por coluna) num CSV sintético'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Linhas do CSV sintético')
+        parser.add_argument('--runs', type=int, default=3, help='Execuções por variante (usa a melhor)')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        # só as etapas em memória: nenhum cliente de nuvem é usado
+        service = EtlService(storage_client=object(), bigquery_client=object())
+        dataframe = service._transform_dataframe(service._read_csv(_csv_sintetico(rows)))
+
+        variants = {
+            "por_celula": lambda: _prepare_records_por_celula(dataframe),
+            "por_coluna": lambda: service._prepare_records(dataframe),
+            "ndjson": lambda: service._prepare_ndjson(dataframe),
+        }
+        report = {"rows": len(dataframe), "columns": dataframe.shape[1], "variants": {}}
+        for name, fn in variants.items():
+            elapsed = min(self._medir(fn) for _ in range(max(1, options['runs'])))
+            report["variants"][name] = {
+                "seconds": round(elapsed, 3),
+                "rows_per_s": round(len(dataframe) / elapsed) if elapsed else None,
+            }
+        base = report["variants"]["por_celula"]["seconds"]
+        for item in report["variants"].values():
+            item["speedup"] = round(base / item["seconds"], 1) if item["seconds"] else None
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        self.stdout.write(f"{report['rows']} linhas x {report['columns']} colunas")
+        for name, item in report["variants"].items():
+            self.stdout.write(
+                f"  {name:<11} {item['seconds']:>8.3f} s  {item['rows_per_s']:>12,} linhas/s  {item['speedup']:>5}x"
+            )
+
+    def _medir(self, fn):
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
@@ -0,0 +1,47 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Processa num pool de processos os CSVs ainda não processados sob um prefixo do bucket raw'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prefix', help='Prefixo no bucket (padrão: RAW_LAYER_PREFIX)')
+        parser.add_argument('--workers', type=int, help='Processos em paralelo (padrão: CPUs)')
+        parser.add_argument('--limit', type=int, help='Máximo de arquivos nesta execução')
+        parser.add_argument('--force', action='store_true', help='Reprocessa também os arquivos já registrados no manifesto')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        from api.etl_service import EtlService
+
+        try:
+            summary = EtlService().process_prefix(
+                options['prefix'], options['workers'], limit=options['limit'], force=options['force']
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(summary, indent=2))
+        else:
+            self.stdout.write(
+                f"{summary['prefix']}: {summary['files_found']} arquivos, "
+                f"{summary['files_already_processed']} já processados, {summary['files_pending']} pendentes"
+            )
+            for item in summary["results"]:
+                line = (
+                    f"  {item['status']:<7} {item['raw_blob']}  lidas={item['rows_read']} "
+                    f"carregadas={item['rows_loaded']} {item['elapsed_s']:.1f}s"
+                )
+                self.stdout.write(line if item["status"] == "ok" else f"{line}  {item['mensagem']}")
+            self.stdout.write(
+                f"{summary['files_processed']} ok, {summary['files_skipped']} pulados, "
+                f"{summary['files_failed']} com erro em {summary['elapsed_s']:.1f}s "
+                f"({summary['rows_per_s']} linhas/s, {summary['files_per_min']} arquivos/min, "
+                f"{summary['workers']} processos)"
+            )
+
+        if summary["files_failed"]:
+            raise CommandError(f"{summary['files_failed']} arquivo(s) falharam")
@@ -0,0 +1,82 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from clients.duckdb_backend import DuckDBBigQueryClient
+
+# Tabelas com o mesmo schema das do BigQuery, geradas direto no DuckDB (range())
+_SEED_SQL = {
+    "unit": """
+        SELECT CAST(i AS VARCHAR) AS id, 'Unidade ' || i AS name, 'Unidade sintética ' || i AS description
+        FROM range(1, {units} + 1) r(i)
+    """,
+    "occurrence_category": """
+        SELECT CAST(i AS VARCHAR) AS id, 'Categoria ' || i AS name
+        FROM range(1, {categories} + 1) r(i)
+    """,
+    "travel": """
+        SELECT
+            CAST(i AS VARCHAR) AS id,
+            TIMESTAMP '2023-01-01' + to_seconds(CAST(hash(i) % (2 * 365 * 86400) AS BIGINT)) AS datetime,
+            'Caminhão ' || (i % 500) AS asset_description,
+            'REG-' || (i % 5000) AS register_number,
+            'Garagem ' || (i % 40) AS garage_name,
+            round(20 + (hash(i * 7) % 80000) / 100.0, 2) AS full_distance,
+            CAST(1 + hash(i * 13) % {units} AS VARCHAR) AS unit_id
+        FROM range(1, {travels} + 1) r(i)
+    """,
+    "bill": """
+        SELECT
+            CAST(i AS VARCHAR) AS id,
+            CAST(i AS VARCHAR) AS travel_id,
+            TIMESTAMP '2023-01-01' + to_seconds(CAST(hash(i) % (2 * 365 * 86400) AS BIGINT)) AS datetime,
+            CAST(round(100 + (hash(i * 3) % 200000) / 100.0, 2) AS DECIMAL(38, 9)) AS fix_cost,
+            CAST(round(1 + (hash(i * 5) % 500) / 100.0, 2) AS DECIMAL(38, 9)) AS variable_km
+        FROM range(1, {travels} + 1) r(i)
+        WHERE i % 10 <> 0
+    """,
+    "occurrence": """
+        SELECT
+            CAST(i AS VARCHAR) AS id,
+            CAST(1 + hash(i * 17) % {travels} AS VARCHAR) AS travel_id,
+            CAST(1 + hash(i * 19) % {units} AS VARCHAR) AS unit_id,
+            CAST(1 + hash(i * 23) % {categories} AS VARCHAR) AS category_id,
+            TIMESTAMP '2023-01-01' + to_seconds(CAST(hash(i) % (2 * 365 * 86400) AS BIGINT)) AS datetime,
+            'Transportadora ' || (i % 30) AS carrier_name,
+            'Causa ' || (i % 12) AS root_cause,
+            'Ocorrência sintética ' || i AS description
+        FROM range(1, {occurrences} + 1) r(i)
+    """,
+}
+
+
+class Command(BaseCommand):
+    help = 'Gera dados sintéticos no backend local DuckDB (BIGQUERY_BACKEND=duckdb) com volumes realistas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Arquivo DuckDB (padrão: DUCKDB_PATH)')
+        parser.add_argument('--units', type=int, default=200)
+        parser.add_argument('--categories', type=int, default=15)
+        parser.add_argument('--travels', type=int, default=1_000_000)
+        parser.add_argument('--occurrences', type=int, default=100_000)
+
+    def handle(self, *args, **options):
+        if min(options['units'], options['categories'], options['travels']) < 1:
+            raise CommandError('--units, --categories e --travels precisam ser >= 1')
+
+        client = DuckDBBigQueryClient(path=options['path'])
+        connection = client.client
+        connection._garantir_schema(client.dataset_id)
+
+        for table_id, sql in _SEED_SQL.items():
+            started = time.perf_counter()
+            connection.query(
+                f"CREATE OR REPLACE TABLE `{client.table_ref(table_id)}` AS {sql.format(**options)}"
+            )
+            count = connection.query(f"SELECT COUNT(*) AS n FROM `{client.table_ref(table_id)}`").result()
+            self.stdout.write(
+                f"{table_id}: {next(iter(count))['n']} linhas em {time.perf_counter() - started:.2f}s"
+            )
+
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(f'Banco local pronto em {connection.path}'))
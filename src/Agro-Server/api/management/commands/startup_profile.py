@@ -0,0 +1,88 @@
+import json
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Roda num processo novo: mede o cold start real (nada já importado)
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+import api.urls
+t2 = time.perf_counter()
+print(json.dumps({
+    "setup_ms": (t1 - t0) * 1000,
+    "urls_ms": (t2 - t1) * 1000,
+    "heavy": sorted(m for m in ("google.cloud.bigquery", "google.cloud.storage", "pandas", "pyarrow") if m in sys.modules),
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo de import do projeto (django.setup + api.urls) num processo novo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=3, help='Quantidade de execuções (usa a mediana)')
+        parser.add_argument('--top', type=int, default=10, help='Módulos mais caros a listar (python -X importtime)')
+        parser.add_argument('--max-ms', type=float, help='Falha se o tempo total (mediana) passar deste limite')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "api.settings")}
+
+        runs = [self._probe(env) for _ in range(max(1, options['runs']))]
+        runs.sort(key=lambda r: r["setup_ms"] + r["urls_ms"])
+        median = runs[len(runs) // 2]
+        total_ms = median["setup_ms"] + median["urls_ms"]
+
+        report = {
+            "total_ms": round(total_ms, 1),
+            "setup_ms": round(median["setup_ms"], 1),
+            "urls_ms": round(median["urls_ms"], 1),
+            "heavy_modules_loaded": median["heavy"],
+            "top_imports": self._top_imports(env, options['top']),
+        }
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.stdout.write(f"Startup: {report['total_ms']} ms (setup {report['setup_ms']} ms + urls {report['urls_ms']} ms)")
+            self.stdout.write(f"Módulos pesados carregados: {', '.join(report['heavy_modules_loaded']) or 'nenhum'}")
+            self.stdout.write("Imports mais caros (cumulativo):")
+            for item in report["top_imports"]:
+                self.stdout.write(f"  {item['cumulative_ms']:>8.1f} ms  {item['module']}")
+
+        if options['max_ms'] is not None and total_ms > options['max_ms']:
+            raise CommandError(f"Startup de {total_ms:.1f} ms passou do limite de {options['max_ms']:.1f} ms")
+
+    def _probe(self, env):
+        result = subprocess.run(
+            [sys.executable, "-c", _PROBE], env=env, capture_output=True, text=True, check=False
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Falha ao medir o startup: {result.stderr.strip()}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def _top_imports(self, env, top):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import django; django.setup(); import api.urls"],
+            env=env, capture_output=True, text=True, check=False,
+        )
+        entries = []
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            _, cumulative, module = line.split("|")
+            depth = len(module) - len(module.lstrip()) - 1
+            entries.append({"module": module.strip(), "cumulative_ms": int(cumulative) / 1000, "depth": depth})
+        # módulos de topo (sem indentação no importtime) e os do projeto, para não repetir a árvore
+        roots = [
+            {"module": e["module"], "cumulative_ms": e["cumulative_ms"]}
+            for e in entries
+            if e["depth"] == 0 or e["module"].startswith(("api.", "clients."))
+        ]
+        return sorted(roots, key=lambda e: e["cumulative_ms"], reverse=True)[:top]
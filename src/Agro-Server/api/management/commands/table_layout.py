@@ -0,0 +1,105 @@
+import json
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+
+from clients.bigquery_client import QueryBuilder
+from clients.registry import get_bigquery_client
+from clients.table_layout import LAYOUTS, TableLayoutManager, medir_poda
+
+
+def _queries_das_views(params):
+    """Queries reais das views, com os filtros de `params` e sem filtro nenhum."""
+    from api import dashboard_views, travels_views
+
+    def travel_summary(request):
+        builder = QueryBuilder()
+        where_clause = builder.where(dashboard_views._build_common_filters(request, builder))
+        return dashboard_views._build_travel_summary_query(where_clause), builder
+
+    def listar_travels(request):
+        builder = QueryBuilder()
+        where_clause = builder.where(travels_views._build_travel_filters(request, builder))
+        return travels_views._build_travel_query(where_clause, include_bill=True) + " LIMIT 100", builder
+
+    factory = RequestFactory()
+    filtered, unfiltered = factory.get("/", params), factory.get("/")
+    return [
+        (name, *build(filtered), *build(unfiltered))
+        for name, build in (
+            ("dashboard.travel_summary", travel_summary),
+            ("travels.listar_travels", listar_travels),
+        )
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        'Verifica/aplica o particionamento diário (datetime) e o clustering (unit_id/travel_id) '
+        'das tabelas travel, bill e occurrence e mede os bytes lidos pelas queries das views'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', nargs='+', choices=sorted(LAYOUTS), help='Tabelas (padrão: todas)')
+        parser.add_argument('--apply', action='store_true', help='Cria/migra as tabelas fora do layout')
+        parser.add_argument('--print-ddl', action='store_true', help='Só mostra o DDL, sem executar')
+        parser.add_argument('--start-date', help='Início do período da verificação (padrão: 30 dias atrás)')
+        parser.add_argument('--end-date', help='Fim do período da verificação (padrão: agora)')
+        parser.add_argument('--unit-id', help='Unidade usada na verificação (opcional)')
+        parser.add_argument('--json', action='store_true', help='Saída em JSON')
+
+    def handle(self, *args, **options):
+        manager = TableLayoutManager(get_bigquery_client())
+        end = options['end_date'] or datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S')
+        start = options['start_date'] or (datetime.utcnow() - timedelta(days=30)).strftime('%Y-%m-%dT%H:%M:%S')
+        params = {"start_date": start, "end_date": end}
+        if options['unit_id']:
+            params["unit_id"] = options['unit_id']
+
+        try:
+            report = {"plan": [status.as_dict() for status in manager.plano(options['tables'])]}
+            report["bytes_before"] = self._medir(manager.bigquery, params)
+            if options['apply'] or options['print_ddl']:
+                report["applied"] = manager.aplicar(options['tables'], dry_run=options['print_ddl'])
+                if options['apply'] and not options['print_ddl']:
+                    report["bytes_after"] = self._medir(manager.bigquery, params)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, default=str))
+            return
+
+        for status in report["plan"]:
+            self.stdout.write(
+                f"{status['table_id']:<12} {status['action']:<7} partição={status['partition'] or '-'} "
+                f"cluster={','.join(status['clustering_fields']) or '-'}"
+            )
+        for item in report.get("applied", []):
+            if item["statements"]:
+                self.stdout.write(f"-- {item['table_id']}")
+            for statement in item["statements"]:
+                self.stdout.write(f"{statement};")
+        self._escrever_bytes("Antes", report["bytes_before"])
+        if "bytes_after" in report:
+            self._escrever_bytes("Depois", report["bytes_after"])
+
+    def _medir(self, bigquery_client, params):
+        from google.api_core import exceptions as gcloud_exceptions
+
+        try:
+            return medir_poda(bigquery_client, _queries_das_views(params))
+        except gcloud_exceptions.NotFound as e:
+            return {"erro": str(e)}
+
+    def _escrever_bytes(self, label, measurements):
+        self.stdout.write(f"{label} (dry-run):")
+        if isinstance(measurements, dict):
+            self.stdout.write(f"  não medido: {measurements['erro']}")
+            return
+        for item in measurements:
+            self.stdout.write(
+                f"  {item['query']:<28} filtrada={item['bytes_filtered']:>14} "
+                f"sem filtro={item['bytes_full_scan']:>14} poda={'sim' if item['pruned'] else 'não'}"
+            )
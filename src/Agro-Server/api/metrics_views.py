@@ -0,0 +1,50 @@
+"""
+Views para rotas internas de métricas (cache, consultas)
+"""
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from clients.query_cache import get_result_cache
+from clients.query_metrics import get_query_recorder
+from clients.single_flight import get_single_flight
+
+
+@csrf_exempt
+def cache_metrics(request):
+    """GET /api/_metrics/cache - Hits/misses do cache de resultados do BigQuery"""
+    if request.method != "GET":
+        return JsonResponse({"erro": "Método não permitido"}, status=405)
+
+    cache = get_result_cache()
+    if cache is None:
+        return JsonResponse({"status": "ok", "data": {"enabled": False}})
+
+    return JsonResponse({"status": "ok", "data": {"enabled": True, **cache.stats()}})
+
+
+@csrf_exempt
+def query_metrics(request):
+    """GET /api/_metrics/queries - Latência (p50/p95/p99), bytes e slot-ms por impressão digital de SQL
+
+    Inclui os contadores da coalescência de queries idênticas em andamento (`single_flight`).
+
+    Parâmetros opcionais:
+    - recent: quantidade de jobs mais recentes a incluir na resposta (padrão 0)
+    """
+    if request.method != "GET":
+        return JsonResponse({"erro": "Método não permitido"}, status=405)
+
+    try:
+        recent = int(request.GET.get("recent", 0))
+    except ValueError:
+        return JsonResponse({"erro": "Parâmetro 'recent' inválido"}, status=400)
+
+    recorder = get_query_recorder()
+    single_flight = get_single_flight()
+    data = {
+        "por_fingerprint": recorder.summary(),
+        "single_flight": single_flight.stats() if single_flight is not None else {"enabled": False},
+    }
+    if recent > 0:
+        data["recentes"] = [record.as_dict() for record in recorder.records(recent)]
+    return JsonResponse({"status": "ok", "data": data})
@@ -0,0 +1,26 @@
+"""
+Middlewares do projeto
+"""
+from clients.query_metrics import view_atual
+
+
+class QueryContextMiddleware:
+    """Marca as queries do BigQuery com o nome da view que está atendendo o request.
+
+    O nome vai para os `QueryRecord` (ver `/api/_metrics/queries/`), o que permite
+    saber qual endpoint está consumindo mais bytes/slots.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = view_atual.set(None)
+        try:
+            return self.get_response(request)
+        finally:
+            view_atual.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_atual.set(f"{view_func.__module__}.{view_func.__name__}")
+        return None
@@ -4,11 +4,14 @@ Views para rotas de Ocorrências
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from clients.bigquery_client import BigQueryClient
+from clients.registry import BIGQUERY, lazy_client
+from clients.id_allocator import get_id_allocator
 from utils.validators import validar_occurrence, validar_id
 
-client = BigQueryClient()
+client = lazy_client(BIGQUERY)
 TABLE_NAME = "occurrence"
+TRAVEL_TABLE = "travel"
+UNIT_TABLE = "unit"
 CATEGORY_TABLE = "occurrence_category"
 
 @csrf_exempt
@@ -22,28 +25,37 @@ def occurrences_view(request, occurrence_id=None):
         return JsonResponse({"erro": "Método não permitido"}, status=405)
 
 def listar_occurrences(request):
-    """GET /api/occurrences - Lista todas as ocorrências (com suporte a filtro unit_id)"""
+    """GET /api/occurrences - Lista todas as ocorrências (com suporte a filtro unit_id)
+
+    Paginação por cursor: envie o `next_cursor` da resposta anterior em `?cursor=`.
+    `offset` continua aceito por compatibilidade, mas fica mais caro a cada página.
+    """
     
     try:
         limit = request.GET.get("limit")
         offset = request.GET.get("offset", 0)
         unit_id = request.GET.get("unit_id")
+        cursor = request.GET.get("cursor")
         
         limit = int(limit) if limit else None
         offset = int(offset) if offset else 0
         
-        # Se tiver filtro unit_id, usa filtrar, senão usa listar
-        if unit_id:
-            filters = {"unit_id": unit_id}
+        # Se tiver filtro unit_id, filtra por ele; sem filtro lista tudo
+        filters = {"unit_id": unit_id} if unit_id else {}
+        next_cursor = None
+        if offset:
             occurrences = client.filtrar(TABLE_NAME, filters, limit=limit, offset=offset)
         else:
-            occurrences = client.listar(TABLE_NAME, limit=limit, offset=offset)
+            occurrences, next_cursor = client.filtrar_cursor(TABLE_NAME, filters, limit=limit, cursor=cursor)
         
         return JsonResponse({
             "status": "ok",
             "data": occurrences,
-            "count": len(occurrences)
+            "count": len(occurrences),
+            "next_cursor": next_cursor
         })
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
@@ -79,6 +91,34 @@ def buscar_occurrence(request, occurrence_id):
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
+# (campo, tabela, mensagem) das chaves estrangeiras de uma ocorrência; os nomes são
+# os mesmos de BIGQUERY_KNOWN_ID_TABLES, senão o KnownIds não atende a checagem
+_CHAVES_ESTRANGEIRAS = (
+    ("travel_id", TRAVEL_TABLE, "Viagem (travel_id) não encontrada"),
+    ("unit_id", UNIT_TABLE, "Unidade (unit_id) não encontrada"),
+    ("category_id", CATEGORY_TABLE, "Categoria (category_id) não encontrada"),
+)
+
+
+def _referencias(data):
+    """Monta {tabela: [id]} com as chaves estrangeiras presentes no payload."""
+    return {
+        tabela: [str(data[campo])]
+        for campo, tabela, _ in _CHAVES_ESTRANGEIRAS
+        if campo in data
+    }
+
+
+def _verificar_referencias(data, existentes=None):
+    """Retorna a mensagem de erro da primeira referência inexistente (ou None)."""
+    if existentes is None:
+        existentes = client.exists_many(_referencias(data))
+    for campo, tabela, mensagem in _CHAVES_ESTRANGEIRAS:
+        if campo in data and str(data[campo]) not in existentes[tabela]:
+            return mensagem
+    return None
+
+
 @csrf_exempt
 def criar_occurrence(request):
     """POST /api/occurrences - Registra nova ocorrência"""
@@ -93,18 +133,10 @@ def criar_occurrence(request):
         if not valido:
             return JsonResponse({"erro": msg}, status=400)
         
-        # Verifica se travel_id, unit_id e category_id existem
-        travel = client.buscar_por_id("TRAVEL", str(data["travel_id"]))
-        if not travel:
-            return JsonResponse({"erro": "Viagem (travel_id) não encontrada"}, status=400)
-        
-        unit = client.buscar_por_id("UNIT", str(data["unit_id"]))
-        if not unit:
-            return JsonResponse({"erro": "Unidade (unit_id) não encontrada"}, status=400)
-        
-        category = client.buscar_por_id(CATEGORY_TABLE, str(data["category_id"]))
-        if not category:
-            return JsonResponse({"erro": "Categoria (category_id) não encontrada"}, status=400)
+        # Verifica se travel_id, unit_id e category_id existem (uma única query)
+        erro = _verificar_referencias(data)
+        if erro:
+            return JsonResponse({"erro": erro}, status=400)
         
         # Prepara dados para inserção
         row = {
@@ -117,14 +149,9 @@ def criar_occurrence(request):
             "description": data.get("description", "")
         }
         
-        # Gera ID se não fornecido
+        # Gera ID se não fornecido (bloco reservado pelo alocador de sequência)
         if "id" not in data:
-            existing = client.listar(TABLE_NAME, limit=1000)
-            if existing:
-                max_id = max([int(o.get("id", 0)) for o in existing if o.get("id")], default=0)
-                row["id"] = str(max_id + 1)
-            else:
-                row["id"] = "1"
+            row["id"] = str(get_id_allocator(client).next_id(TABLE_NAME))
         else:
             row["id"] = str(data["id"])
         
@@ -148,28 +175,16 @@ def atualizar_occurrence(request, occurrence_id):
         if not valido:
             return JsonResponse({"erro": msg}, status=400)
         
-        # Verifica se existe
-        occurrence = client.buscar_por_id(TABLE_NAME, str(occurrence_id))
-        if not occurrence:
-            return JsonResponse({"erro": "Ocorrência não encontrada"}, status=404)
-        
         data = json.loads(request.body)
         
-        # Valida campos opcionais se presentes
-        if "travel_id" in data:
-            travel = client.buscar_por_id("TRAVEL", str(data["travel_id"]))
-            if not travel:
-                return JsonResponse({"erro": "Viagem (travel_id) não encontrada"}, status=400)
-        
-        if "unit_id" in data:
-            unit = client.buscar_por_id("UNIT", str(data["unit_id"]))
-            if not unit:
-                return JsonResponse({"erro": "Unidade (unit_id) não encontrada"}, status=400)
+        # Verifica se existe e valida os campos opcionais presentes (uma única query)
+        existentes = client.exists_many({TABLE_NAME: [str(occurrence_id)], **_referencias(data)})
+        if str(occurrence_id) not in existentes[TABLE_NAME]:
+            return JsonResponse({"erro": "Ocorrência não encontrada"}, status=404)
         
-        if "category_id" in data:
-            category = client.buscar_por_id(CATEGORY_TABLE, str(data["category_id"]))
-            if not category:
-                return JsonResponse({"erro": "Categoria (category_id) não encontrada"}, status=400)
+        erro = _verificar_referencias(data, existentes)
+        if erro:
+            return JsonResponse({"erro": erro}, status=400)
         
         # Prepara atualizações
         updates = {}
@@ -274,9 +289,14 @@ def stats_occurrences(request):
         FROM `{client.table_ref(TABLE_NAME)}`
         """
         
-        stats_categoria = client.executar_query(query_categoria)
-        stats_unidade = client.executar_query(query_unidade)
-        stats_total = client.executar_query(query_total)
+        results = client.run_many({
+            "categoria": query_categoria,
+            "unidade": query_unidade,
+            "total": query_total,
+        })
+        stats_categoria = results["categoria"]
+        stats_unidade = results["unidade"]
+        stats_total = results["total"]
         
         stats = {
             "total_geral": stats_total[0].get("total_geral", 0) if stats_total else 0,
@@ -18,10 +18,14 @@ def api_root(request):
                     "/api/bigquery/inserir/",
                     "/api/bigquery/atualizar/",
                     "/api/bigquery/remover/",
+                    "/api/bigquery/atualizar-lote/",
+                    "/api/bigquery/remover-lote/",
                     "/api/bigquery/processar-raw/",
+                    "/api/bigquery/processar-raw-lote/",
                     "/api/bigquery/view-diaria/",
                     "/api/bigquery/view-mensal/",
                     "/api/bigquery/exportar-view/",
+                    "/api/bigquery/jobs/<job_id>/",
                 ],
                 "storage": [
                     "/api/storage/inserir/",
@@ -45,6 +49,7 @@ def api_root(request):
                     "/api/occurrences/stats/",
                 ],
                 "bills": ["/api/bills/"],
+                "metrics": ["/api/_metrics/cache/", "/api/_metrics/queries/"],
             },
         }
     )
@@ -66,10 +71,14 @@ def api_root(request):
                 "inserir": "/bigquery/inserir/",
                 "atualizar": "/bigquery/atualizar/",
                 "remover": "/bigquery/remover/",
+                "atualizar_lote": "/bigquery/atualizar-lote/",
+                "remover_lote": "/bigquery/remover-lote/",
                 "processar_raw": "/bigquery/processar-raw/",
+                "processar_raw_lote": "/bigquery/processar-raw-lote/",
                 "view_diaria": "/bigquery/view-diaria/",
                 "view_mensal": "/bigquery/view-mensal/",
-                "exportar_view": "/bigquery/exportar-view/"
+                "exportar_view": "/bigquery/exportar-view/",
+                "status_job": "/bigquery/jobs/<job_id>/"
             },
             "storage": {
                 "upload": "/storage/inserir/",
@@ -1,7 +1,6 @@
 import os
 from pathlib import Path
 from dotenv import load_dotenv
-from google.cloud import bigquery
 
 # ===========================
 # Caminho base e .env
@@ -22,7 +21,9 @@ INSTALLED_APPS = [
     'api',  # nosso app
 ]
 
-MIDDLEWARE = []
+MIDDLEWARE = [
+    'api.middleware.QueryContextMiddleware',
+]
 
 ROOT_URLCONF = 'api.urls'
 TEMPLATES = []
@@ -115,12 +116,11 @@ LOGS_DIR.mkdir(exist_ok=True)
 def get_bigquery_client():
     """
     Retorna um client do BigQuery usando o arquivo JSON da service account.
+
+    O import do google.cloud é feito aqui dentro para que carregar as settings
+    (manage.py, testes, workers) não pague esse custo; as views usam os clients
+    compartilhados de `clients.registry`, criados só no primeiro uso.
     """
-    return bigquery.Client(project=BIGQUERY_PROJECT_ID)
+    from google.cloud import bigquery
 
-# ===========================
-# Teste rápido (opcional)
-# ===========================
-if DEBUG:
-    client = get_bigquery_client()
-    print("BigQuery client inicializado para projeto:", BIGQUERY_PROJECT_ID)
+    return bigquery.Client(project=BIGQUERY_PROJECT_ID)
@@ -2,9 +2,9 @@
 import json
 from django.http import JsonResponse, HttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from clients.storage_client import CloudStorageClient
+from clients.registry import STORAGE, lazy_client
 
-client = CloudStorageClient()
+client = lazy_client(STORAGE)
 
 
 @csrf_exempt
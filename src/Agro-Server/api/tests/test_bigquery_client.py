@@ -0,0 +1,593 @@
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import List
+
+import pyarrow as pa
+from google.api_core.exceptions import BadRequest
+
+from clients.bigquery_client import (
+    PRIORIDADE_BATCH,
+    BigQueryClient,
+    KnownIds,
+    QueryBudgetExceeded,
+    QueryBuilder,
+    QueryTimeout,
+    decode_cursor,
+    encode_cursor,
+    keyset_condition,
+)
+from clients.insert_buffer import InsertBuffer
+from clients.query_cache import MemoryQueryCache, ResultCache
+from clients.query_metrics import QueryRecorder, contexto_view
+
+
+class FakeRowIterator:
+    def __init__(self, rows: List[dict], page_size=None):
+        self._rows = rows
+        self._page_size = page_size or len(rows) or 1
+        self.pages_fetched = 0
+
+    def __iter__(self):
+        return iter(self._rows)
+
+    def to_arrow(self, **kwargs):
+        return pa.Table.from_pylist(self._rows)
+
+    def to_arrow_iterable(self, **kwargs):
+        for page in self.pages:
+            yield pa.RecordBatch.from_pylist(page)
+
+    @property
+    def pages(self):
+        for start in range(0, len(self._rows), self._page_size):
+            self.pages_fetched += 1
+            yield self._rows[start:start + self._page_size]
+
+
+class FakeQueryJob:
+    def __init__(self, rows: List[dict]):
+        self._rows = rows
+        self.result_kwargs: dict = {}
+        self.iterator = None
+        self.num_dml_affected_rows = None
+        self.total_bytes_processed = None
+        self.error = None
+
+    def result(self, **kwargs):
+        self.result_kwargs = kwargs
+        if self.error is not None:
+            raise self.error
+        self.iterator = FakeRowIterator(list(self._rows), kwargs.get("page_size"))
+        return self.iterator
+
+    def done(self, *args, **kwargs):
+        return True
+
+
+class FakeGoogleClient:
+    project = "mock-project"
+
+    def __init__(self, rows: List[dict] = None):
+        self.rows = rows or []
+        self.queries: List[tuple] = []
+        self.inserts: List[tuple] = []
+        self.insert_errors: List[dict] = []
+        self.bytes_processed = 0
+
+    def insert_rows_json(self, table, rows, row_ids=None, **kwargs):
+        self.inserts.append((table, list(rows), row_ids))
+        return [e for e in self.insert_errors if e["index"] < len(rows)]
+
+    def query(self, sql, job_config=None, **kwargs):
+        self.queries.append((sql, job_config))
+        self.last_job = FakeQueryJob(self.rows)
+        self.last_job.total_bytes_processed = self.bytes_processed
+        limit = getattr(job_config, "maximum_bytes_billed", None)
+        if limit and not job_config.dry_run and self.bytes_processed > limit:
+            self.last_job.error = BadRequest(
+                "Query exceeded limit for bytes billed", errors=[{"reason": "bytesBilledLimitExceeded"}]
+            )
+        return self.last_job
+
+
+def _params(job_config) -> dict:
+    return {p.name: (p.type_, p.value) for p in job_config.query_parameters}
+
+
+class QueryBuilderTests(unittest.TestCase):
+    def test_param_returns_placeholder_and_infers_type(self):
+        builder = QueryBuilder()
+
+        self.assertEqual(builder.param("unit_id", "7"), "@unit_id")
+        self.assertEqual(builder.param("limit", 10), "@limit")
+        self.assertEqual(builder.param("ativo", True), "@ativo")
+
+        params = _params(builder.job_config())
+        self.assertEqual(params["unit_id"], ("STRING", "7"))
+        self.assertEqual(params["limit"], ("INT64", 10))
+        self.assertEqual(params["ativo"], ("BOOL", True))
+
+    def test_duplicate_and_invalid_names_are_rejected(self):
+        builder = QueryBuilder()
+        builder.param("id", "1")
+
+        with self.assertRaises(ValueError):
+            builder.param("id", "2")
+        with self.assertRaises(ValueError):
+            builder.param("id; DROP", "2")
+
+
+class CursorTests(unittest.TestCase):
+    def test_cursor_round_trip_keeps_types(self):
+        moment = datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+        token = encode_cursor(moment, "42")
+
+        self.assertEqual(decode_cursor(token), (moment, "TIMESTAMP", "42", "STRING"))
+
+    def test_invalid_cursor_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            decode_cursor("nao-e-um-cursor")
+
+    def test_keyset_condition_descending(self):
+        builder = QueryBuilder()
+        token = encode_cursor(datetime(2025, 1, 1, tzinfo=timezone.utc), "9")
+
+        condition = keyset_condition(builder, token, "t.datetime", "t.id", descending=True)
+
+        self.assertEqual(
+            condition,
+            "(t.datetime < @cursor_value OR (t.datetime = @cursor_value AND t.id < @cursor_id)"
+            " OR t.datetime IS NULL)",
+        )
+
+
+class BigQueryClientSqlTests(unittest.TestCase):
+    def setUp(self):
+        self.google_client = FakeGoogleClient(rows=[{"id": "1", "name": "Ana"}])
+        self.cache = ResultCache(MemoryQueryCache())
+        self.client = BigQueryClient(
+            client=self.google_client,
+            cache=self.cache,
+            known_ids=KnownIds(["unit", "occurrence_category"]),
+        )
+        self.client.dataset_id = "dataset"
+        self.client.recorder = QueryRecorder()
+
+    def test_filtrar_generates_stable_sql_text(self):
+        self.client.filtrar("unit", {"name": "Ana"}, limit=10, offset=20)
+        self.client.filtrar("unit", {"name": "Bia"}, limit=50, offset=40)
+
+        (sql_a, config_a), (sql_b, config_b) = self.google_client.queries
+        self.assertEqual(sql_a, sql_b)
+        self.assertNotIn("Ana", sql_a)
+        self.assertEqual(_params(config_a)["f_name"], ("STRING", "Ana"))
+        self.assertEqual(_params(config_b)["limit"], ("INT64", 50))
+
+    def test_buscar_por_id_binds_id(self):
+        row = self.client.buscar_por_id("unit", "1")
+
+        sql, config = self.google_client.queries[0]
+        self.assertIn("WHERE id = @id", sql)
+        self.assertEqual(_params(config)["id"], ("STRING", "1"))
+        self.assertEqual(row, {"id": "1", "name": "Ana"})
+
+    def test_atualizar_binds_values_and_keeps_null_literal(self):
+        self.client.atualizar("1", {"name": "O'Neil", "description": None}, "unit")
+
+        sql, config = self.google_client.queries[0]
+        self.assertIn("name = @u_name", sql)
+        self.assertIn("description = NULL", sql)
+        self.assertNotIn("O'Neil", sql)
+        self.assertEqual(_params(config)["u_name"], ("STRING", "O'Neil"))
+
+    def test_iterators_fetch_pages_lazily(self):
+        self.google_client.rows = [{"id": str(i), "valor": i} for i in range(5)]
+
+        rows = self.client.listar_iter("unit", page_size=2)
+        iterator = self.google_client.last_job.iterator
+        self.assertEqual(self.google_client.last_job.result_kwargs, {"page_size": 2})
+        self.assertEqual(iterator.pages_fetched, 0)
+
+        self.assertEqual(next(rows), {"id": "0", "valor": 0})
+        self.assertEqual(iterator.pages_fetched, 1)
+        self.assertEqual(len(list(rows)), 4)
+        self.assertEqual(iterator.pages_fetched, 3)
+
+    def test_executar_query_lotes_yields_columns_per_page(self):
+        self.google_client.rows = [{"id": str(i), "valor": i} for i in range(3)]
+
+        lotes = list(self.client.executar_query_lotes("SELECT 1", page_size=2))
+
+        self.assertEqual(lotes, [
+            {"id": ["0", "1"], "valor": [0, 1]},
+            {"id": ["2"], "valor": [2]},
+        ])
+
+    def test_query_arrow_casts_numeric_columns(self):
+        self.google_client.rows = [
+            {"unit_id": "1", "total_viagens": 2, "total_km": 10, "custo": Decimal("1.50")},
+        ]
+        self.client.use_storage_api = False
+
+        table = self.client.query_arrow("SELECT 1", float_columns=("total_km",))
+
+        self.assertEqual(table.schema.field("custo").type, pa.float64())
+        self.assertEqual(table.schema.field("total_km").type, pa.float64())
+        self.assertEqual(table.schema.field("total_viagens").type, pa.int64())
+        self.assertEqual(table.to_pylist()[0]["custo"], 1.5)
+
+    def test_filtrar_cursor_returns_next_cursor_and_resumes_after_it(self):
+        self.google_client.rows = [{"id": "1", "name": "Ana"}, {"id": "2", "name": "Bia"}]
+
+        rows, next_cursor = self.client.filtrar_cursor("unit", {}, limit=2, order_by="name")
+        self.assertEqual(len(rows), 2)
+        self.assertIsNotNone(next_cursor)
+
+        self.client.filtrar_cursor("unit", {}, limit=2, order_by="name", cursor=next_cursor)
+        first_sql, _ = self.google_client.queries[0]
+        second_sql, config = self.google_client.queries[1]
+        self.assertIn("ORDER BY name ASC, id ASC LIMIT @limit", first_sql)
+        self.assertIn("name > @cursor_value", second_sql)
+        self.assertNotIn("OFFSET", second_sql)
+        params = _params(config)
+        self.assertEqual(params["cursor_value"], ("STRING", "Bia"))
+        self.assertEqual(params["cursor_id"], ("STRING", "2"))
+
+    def test_filtrar_cursor_without_full_page_has_no_next_cursor(self):
+        _, next_cursor = self.client.filtrar_cursor("unit", {}, limit=10)
+
+        self.assertIsNone(next_cursor)
+
+    def test_run_many_executes_queries_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        class BarrierJob(FakeQueryJob):
+            def result(self, **kwargs):
+                barrier.wait()  # só libera quando as três queries estão em andamento
+                return super().result(**kwargs)
+
+        self.google_client.query = lambda sql, job_config=None, **kw: BarrierJob([{"sql": sql}])
+
+        results = self.client.run_many({"a": "SELECT 'a'", "b": "SELECT 'b'", "c": ("SELECT 'c'", None)})
+
+        self.assertEqual(results, {
+            "a": [{"sql": "SELECT 'a'"}],
+            "b": [{"sql": "SELECT 'b'"}],
+            "c": [{"sql": "SELECT 'c'"}],
+        })
+
+    def test_run_many_return_exceptions(self):
+        error = RuntimeError("falhou")
+
+        def query(sql, job_config=None, **kwargs):
+            if "falha" in sql:
+                raise error
+            return FakeQueryJob([{"ok": True}])
+
+        self.google_client.query = query
+
+        results = self.client.run_many(["SELECT ok", "SELECT falha"], return_exceptions=True)
+        self.assertEqual(results, [[{"ok": True}], error])
+
+        with self.assertRaises(RuntimeError):
+            self.client.run_many(["SELECT ok", "SELECT falha"])
+
+    def test_identical_reads_are_served_from_cache(self):
+        first = self.client.filtrar("unit", {"name": "Ana"})
+        first[0]["name"] = "alterado"
+        second = self.client.filtrar("unit", {"name": "Ana"})
+
+        self.assertEqual(len(self.google_client.queries), 1)
+        self.assertEqual(second, [{"id": "1", "name": "Ana"}])
+        self.assertEqual(self.client.cache_stats()["hits"], 1)
+
+    def test_writes_invalidate_cached_reads_of_the_table(self):
+        self.client.buscar_por_id("unit", "1")
+        self.client.atualizar("1", {"name": "Bia"}, "unit")
+        self.client.buscar_por_id("unit", "1")
+
+        selects = [sql for sql, _ in self.google_client.queries if "SELECT" in sql]
+        self.assertEqual(len(selects), 2)
+        self.assertEqual(self.client.cache_stats()["invalidations"], 1)
+
+    def test_atualizar_lote_runs_one_merge_per_column_set(self):
+        resultado = self.client.atualizar_lote(
+            [
+                {"id": "1", "name": "Ana"},
+                {"id": "2", "name": "Bia"},
+                {"id": "1", "name": "Ana Maria"},
+                {"id": "3", "active": False},
+            ],
+            "unit",
+        )
+
+        self.assertEqual(resultado["ids"], ["1", "2", "3"])
+        self.assertEqual(len(self.google_client.queries), 2)
+        sql, job_config = self.google_client.queries[0]
+        self.assertIn("MERGE `mock-project.dataset.unit` T", sql)
+        self.assertIn("USING UNNEST(@updates) S", sql)
+        self.assertIn("UPDATE SET name = S.name", sql)
+
+        (updates,) = job_config.query_parameters
+        self.assertEqual(updates.array_type, "STRUCT")
+        self.assertEqual(
+            [(s.struct_values["id"], s.struct_values["name"]) for s in updates.values],
+            [("1", "Ana Maria"), ("2", "Bia")],
+        )
+        self.assertEqual(self.google_client.queries[1][1].query_parameters[0].values[0].struct_types["active"], "BOOL")
+
+    def test_atualizar_lote_requires_id(self):
+        with self.assertRaises(ValueError):
+            self.client.atualizar_lote([{"name": "Ana"}], "unit")
+
+    def test_bulk_dml_rejects_unsafe_table_names(self):
+        table_id = "unit` T USING (SELECT 1) S ON TRUE WHEN MATCHED THEN DELETE --"
+
+        with self.assertRaises(ValueError):
+            self.client.atualizar_lote([{"id": "1", "name": "Ana"}], table_id)
+        with self.assertRaises(ValueError):
+            self.client.remover_lote(["1"], table_id)
+        self.assertEqual(self.google_client.queries, [])
+
+    def test_remover_lote_deletes_with_unnest_and_invalidates(self):
+        self.client.buscar_por_id("unit", "1")
+        self.client.remover_lote(["1", "2", "1"], "unit")
+
+        sql, job_config = self.google_client.queries[-1]
+        self.assertIn("WHERE id IN UNNEST(@ids)", sql)
+        self.assertEqual(job_config.query_parameters[0].values, ["1", "2"])
+        self.assertEqual(self.client.cache_stats()["invalidations"], 1)
+
+    def test_exists_many_checks_all_tables_in_one_query(self):
+        self.google_client.rows = [{"ref": 0, "id": "7"}, {"ref": 2, "id": "3"}]
+
+        found = self.client.exists_many({"travel": [7], "unit": ["1"], "occurrence_category": ["3"]})
+
+        self.assertEqual(found, {"travel": {"7"}, "unit": set(), "occurrence_category": {"3"}})
+        self.assertEqual(len(self.google_client.queries), 1)
+        sql, job_config = self.google_client.queries[0]
+        self.assertEqual(sql.count("UNION ALL"), 2)
+        ids_0 = job_config.query_parameters[0]
+        self.assertEqual((ids_0.name, ids_0.array_type, ids_0.values), ("ids_0", "STRING", ["7"]))
+
+    def test_exists_many_skips_known_reference_ids(self):
+        self.google_client.rows = [{"ref": 0, "id": "3"}]
+        self.client.exists_many({"occurrence_category": ["3"]})
+
+        found = self.client.exists_many({"occurrence_category": ["3"]})
+        self.assertEqual(found, {"occurrence_category": {"3"}})
+        self.assertEqual(len(self.google_client.queries), 1)
+
+        self.client.remover("3", "occurrence_category")
+        self.google_client.rows = []
+        self.assertEqual(self.client.exists_many({"occurrence_category": ["3"]}), {"occurrence_category": set()})
+        self.assertEqual(self.client.cache_stats()["entries"], 0)
+
+    def test_known_ids_expire_are_bounded_and_keep_exact_table_names(self):
+        known = KnownIds(["unit", "Unit"], ttl=0.2, max_ids=2)
+        known.add("unit", ["1", "2", "3"])
+        known.add("Unit", ["9"])
+
+        self.assertEqual(known.missing("unit", ["1", "2", "3"]), ["1"])
+        self.assertEqual(known.missing("Unit", ["2", "9"]), ["2"])
+        time.sleep(0.25)
+        # removido por outro processo: volta a ser consultado quando a confirmação vence
+        self.assertEqual(known.missing("unit", ["2", "3"]), ["2", "3"])
+
+    def test_write_behind_coalesces_concurrent_inserts(self):
+        self.client.write_behind = True
+        with mock.patch.dict("os.environ", {"BIGQUERY_WRITE_BEHIND_MAX_ROWS": "4", "BIGQUERY_WRITE_BEHIND_MAX_DELAY_MS": "5000"}):
+            threads = [
+                threading.Thread(target=self.client.inserir, args=({"id": str(i)}, "unit"))
+                for i in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+        self.assertEqual(len(self.google_client.inserts), 1)
+        table, rows, row_ids = self.google_client.inserts[0]
+        self.assertEqual(table, "mock-project.dataset.unit")
+        self.assertEqual(sorted(row_ids), ["0", "1", "2", "3"])
+        self.assertEqual([r["id"] for r in rows], row_ids)
+
+    def test_inserir_async_reports_errors_per_row(self):
+        self.google_client.insert_errors = [{"index": 1, "errors": [{"reason": "invalid"}]}]
+
+        ok = self.client.inserir_async({"id": "a"}, "unit")
+        bad = self.client.inserir_async({"id": "b"}, "unit")
+        self.client._insert_buffer.flush(5)
+
+        self.assertEqual(ok.result(), {"id": "a"})
+        with self.assertRaisesRegex(Exception, "Erro ao inserir"):
+            bad.result()
+        self.assertEqual(len(self.google_client.inserts), 1)
+
+    def test_write_behind_requeues_a_batch_whose_send_timed_out(self):
+        sent = []
+
+        def send(table_id, rows, row_ids):
+            sent.append(row_ids)
+            if len(sent) == 1:
+                raise TimeoutError("envio estourou o prazo")
+            return []
+
+        buffer = InsertBuffer(send, max_rows=10, max_delay=0.01, max_attempts=2)
+        future = buffer.submit("unit", {"id": "a"})
+
+        self.assertEqual(future.result(5), {"id": "a"})
+        self.assertEqual(sent, [["a"], ["a"]])  # mesmo insertId: o BigQuery descarta a duplicata
+
+        failing = InsertBuffer(lambda *args: (_ for _ in ()).throw(TimeoutError("lento")), max_delay=0.01, max_attempts=2)
+        with self.assertRaises(TimeoutError):
+            failing.submit("unit", {"id": "b"}).result(5)
+        self.assertEqual(failing.stats()["pending"], 0)
+
+    def test_inserir_waits_for_the_write_behind_batch_with_a_timeout(self):
+        release = threading.Event()
+        self.google_client.insert_rows_json = lambda *args, **kwargs: release.wait(5) and []
+        self.client.write_behind = True
+        self.client.insert_timeout = 0.05
+        self.client.insert_max_attempts = 1
+        self.addCleanup(release.set)
+
+        with self.assertRaisesRegex(TimeoutError, "continua na fila"):
+            self.client.inserir({"id": "a"}, "unit")
+
+        release.set()
+        self.assertTrue(self.client._insert_buffer.flush(5))
+
+    def test_orcamento_dry_run_blocks_queries_above_budget_without_running_them(self):
+        self.google_client.bytes_processed = 5 * 1024 ** 3
+
+        with self.client.orcamento("exportar_view", max_bytes=1024 ** 3, dry_run=True):
+            with self.assertRaises(QueryBudgetExceeded) as ctx:
+                self.client.executar_query("SELECT * FROM `t`")
+
+        self.assertEqual(ctx.exception.to_dict()["estimated_bytes"], 5 * 1024 ** 3)
+        self.assertEqual(len(self.google_client.queries), 1)
+        self.assertTrue(self.google_client.queries[0][1].dry_run)
+
+    def test_orcamento_sets_maximum_bytes_billed_without_dry_run(self):
+        self.google_client.bytes_processed = 1024
+
+        with self.client.orcamento("occurrence_summary", max_bytes=1024 ** 2):
+            self.client.run_many(["SELECT 1", "SELECT 2"])
+        self.client.executar_query("SELECT 3")
+
+        configs = [config for _, config in self.google_client.queries]
+        self.assertFalse(any(c.dry_run for c in configs))
+        self.assertEqual([c.maximum_bytes_billed for c in configs], [1024 ** 2, 1024 ** 2, None])
+
+    def test_orcamento_maps_bytes_billed_limit_to_budget_error(self):
+        self.google_client.bytes_processed = 5 * 1024 ** 3
+
+        with self.client.orcamento("travel_summary", max_bytes=1024 ** 3):
+            with self.assertRaises(QueryBudgetExceeded) as ctx:
+                self.client.executar_query("SELECT * FROM `t`")
+
+        self.assertIsNone(ctx.exception.to_dict()["estimated_bytes"])
+        self.assertEqual(ctx.exception.budget_bytes, 1024 ** 3)
+        self.assertEqual(len(self.google_client.queries), 1)
+
+    def test_orcamento_dry_run_is_skipped_for_cached_results(self):
+        self.google_client.bytes_processed = 1024
+
+        with self.client.orcamento("exportar_view", max_bytes=1024 ** 2, dry_run=True):
+            self.client.executar_query("SELECT * FROM `t`")
+            self.client.executar_query("SELECT * FROM `t`")
+
+        self.assertEqual([bool(c.dry_run) for _, c in self.google_client.queries], [True, False])
+
+    def test_jobs_are_recorded_with_view_and_fingerprint(self):
+        with contexto_view("api.units_views.listar_units"):
+            self.client.run_many([
+                ("SELECT * FROM `t` WHERE id = 1", None),
+                ("SELECT * FROM `t` WHERE id = 2", None),
+            ])
+        self.client.executar_query("SELECT 1", use_cache=False)
+
+        records = self.client.recorder.records()
+        self.assertEqual(len(records), 3)
+        self.assertEqual(records[0].fingerprint, records[1].fingerprint)
+        self.assertEqual({r.view for r in records[:2]}, {"api.units_views.listar_units"})
+        self.assertIsNone(records[2].view)
+
+        summary = {item["fingerprint"]: item for item in self.client.recorder.summary()}
+        self.assertEqual(summary[records[0].fingerprint]["count"], 2)
+        self.assertIsNotNone(summary[records[0].fingerprint]["p95_ms"])
+
+    def test_failed_jobs_are_recorded_with_error(self):
+        with self.client.orcamento("travel_summary", max_bytes=1):
+            self.google_client.bytes_processed = 10
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.executar_query("SELECT 1")
+
+        (record,) = self.client.recorder.records()
+        self.assertIn("excede o limite", record.error)
+
+    def test_rejects_unsafe_column_names(self):
+        with self.assertRaises(ValueError):
+            self.client.filtrar("unit", {"name = '' OR 1=1 --": "x"})
+
+
+class SlowQueryJob(FakeQueryJob):
+    """Job que nunca termina sozinho; registra o cancelamento."""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.job_id = "job-lento"
+        self.cancelled = False
+
+    def done(self, *args, **kwargs):
+        return self.cancelled
+
+    def cancel(self):
+        self.cancelled = True
+        return True
+
+
+class TimeoutAndPriorityTests(unittest.TestCase):
+    def setUp(self):
+        self.google_client = FakeGoogleClient(rows=[{"id": "1"}])
+        self.client = BigQueryClient(client=self.google_client, cache=None)
+        self.client.recorder = QueryRecorder()
+
+    def _slow_jobs(self):
+        jobs = []
+
+        def query(sql, job_config=None, **kwargs):
+            self.google_client.queries.append((sql, job_config))
+            jobs.append(SlowQueryJob([]))
+            return jobs[-1]
+
+        self.google_client.query = query
+        return jobs
+
+    def test_deadline_cancels_the_job(self):
+        jobs = self._slow_jobs()
+        self.client.query_timeout = 0.05
+
+        with self.assertRaises(QueryTimeout):
+            self.client.executar_query("SELECT 1")
+
+        self.assertTrue(jobs[0].cancelled)
+        self.assertIn("prazo", self.client.recorder.records()[0].error)
+
+    def test_prazo_block_shortens_default_timeout(self):
+        jobs = self._slow_jobs()
+
+        with self.client.prazo(0.05):
+            with self.assertRaises(QueryTimeout):
+                self.client.run_many(["SELECT 1"])
+
+        self.assertTrue(jobs[0].cancelled)
+
+    def test_execute_query_runs_batch_priority_with_project_and_dataset(self):
+        self.client.dataset_id = "dataset"
+
+        self.client.execute_query("CREATE OR REPLACE VIEW `{project}.{dataset}.v` AS SELECT 1", priority=PRIORIDADE_BATCH)
+
+        sql, job_config = self.google_client.queries[0]
+        self.assertIn("`mock-project.dataset.v`", sql)
+        self.assertEqual(job_config.priority, "BATCH")
+
+    def test_submeter_query_returns_batch_job_without_waiting(self):
+        jobs = self._slow_jobs()
+        self.client.dataset_id = "dataset"
+
+        job = self.client.submeter_query("CREATE OR REPLACE VIEW `{project}.{dataset}.v` AS SELECT 1", PRIORIDADE_BATCH)
+
+        self.assertIs(job, jobs[0])
+        self.assertFalse(job.cancelled)
+        sql, job_config = self.google_client.queries[0]
+        self.assertIn("`mock-project.dataset.v`", sql)
+        self.assertEqual(job_config.priority, "BATCH")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from api import bigquery_views
+
+
+class LimiteDoLoteTests(unittest.TestCase):
+    def test_missing_limit_uses_the_small_default(self):
+        self.assertEqual(bigquery_views._limite_do_lote(None), bigquery_views.LIMITE_PADRAO_LOTE)
+        self.assertEqual(bigquery_views._limite_do_lote("3"), 3)
+
+    def test_large_limit_is_rejected_and_points_to_the_command(self):
+        with self.assertRaisesRegex(ValueError, "manage.py etl_prefix"):
+            bigquery_views._limite_do_lote(bigquery_views.LIMITE_MAXIMO_LOTE + 1)
+
+
+class FlagForceTests(unittest.TestCase):
+    def test_only_json_booleans_are_accepted(self):
+        self.assertFalse(bigquery_views._flag_force({}))
+        self.assertTrue(bigquery_views._flag_force({"force": True}))
+        for value in ("false", "true", 0, 1, None):
+            with self.assertRaises(ValueError):
+                bigquery_views._flag_force({"force": value})
@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+from clients.chunk_loader import ChunkLoadError, ChunkLoader, insert_id
+
+
+class ServiceUnavailable(Exception):
+    code = 503
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+class ChunkLoaderTests(unittest.TestCase):
+    def _loader(self, send, **kwargs):
+        self.delays = []
+        return ChunkLoader(send, namespace="raw/a.csv", chunk_size=2, sleep=self.delays.append, **kwargs)
+
+    def test_retries_transient_failures_with_the_same_insert_ids(self):
+        calls = []
+
+        def send(rows, row_ids):
+            calls.append(list(row_ids))
+            if len(calls) == 1:
+                raise ServiceUnavailable("backend")
+            if len(calls) == 2:
+                return [{"index": 0, "errors": [{"reason": "backendError"}]}, {"index": 1, "errors": [{"reason": "stopped"}]}]
+            return []
+
+        ledger = self._loader(send, workers=1).load([{"id": 1}, {"id": 2}])
+
+        self.assertEqual(ledger.rows_loaded, 2)
+        self.assertEqual(ledger.chunks[0].attempts, 3)
+        self.assertEqual(calls, [[insert_id("raw/a.csv", 0), insert_id("raw/a.csv", 1)]] * 3)
+        self.assertEqual(len(self.delays), 2)
+        self.assertLess(self.delays[0], self.delays[1] * 2)
+
+    def test_failed_chunks_report_missing_ranges(self):
+        def send(rows, row_ids):
+            if rows[0]["id"] in (2, 4):
+                raise BadRequest("schema inválido")
+            return []
+
+        with self.assertRaises(ChunkLoadError) as ctx:
+            self._loader(send).load([{"id": i} for i in range(8)])
+
+        ledger = ctx.exception.ledger
+        self.assertEqual(ledger.rows_loaded, 4)
+        self.assertEqual(ledger.missing_ranges(), [(2, 5)])
+        self.assertEqual([chunk.attempts for chunk in ledger.failed], [1, 1])
+        self.assertIn("linhas 2-5", str(ctx.exception))
+        self.assertEqual(ctx.exception.to_dict()["missing_ranges"], [[2, 5]])
+
+    def test_sends_chunks_concurrently_up_to_workers(self):
+        lock = threading.Lock()
+        active, peak = [0], [0]
+        release = threading.Event()
+
+        def send(rows, row_ids):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+                if peak[0] == 3:
+                    release.set()
+            release.wait(5)
+            with lock:
+                active[0] -= 1
+            return []
+
+        ledger = self._loader(send, workers=3).load([{"id": i} for i in range(20)])
+
+        self.assertEqual(ledger.rows_loaded, 20)
+        self.assertEqual(peak[0], 3)
@@ -0,0 +1,91 @@
+import os
+import tempfile
+import unittest
+
+from google.api_core import exceptions as gcloud_exceptions
+
+from clients.bigquery_client import KnownIds
+from clients.duckdb_backend import DuckDBBigQueryClient, traduzir_sql
+from clients.query_cache import MemoryQueryCache, ResultCache
+from clients.query_metrics import QueryRecorder
+
+
+class TraduzirSqlTests(unittest.TestCase):
+    def test_table_refs_and_params(self):
+        sql = traduzir_sql("SELECT * FROM `proj.ds.unit` WHERE id = @id AND name = @name")
+        self.assertEqual(sql, 'SELECT * FROM "ds"."unit" WHERE id = $id AND name = $name')
+
+    def test_format_timestamp_nested(self):
+        sql = traduzir_sql("SELECT FORMAT_TIMESTAMP('%Y-%m', TIMESTAMP(CAST(x AS STRING))) FROM t")
+        self.assertEqual(sql, "SELECT strftime(CAST(CAST(x AS VARCHAR) AS TIMESTAMP), '%Y-%m') FROM t")
+
+    def test_date_functions(self):
+        sql = traduzir_sql(
+            "WHERE DATE(p) >= DATE_TRUNC(DATE_SUB(CURRENT_DATE(), INTERVAL 1 MONTH), MONTH)"
+        )
+        self.assertEqual(
+            sql,
+            "WHERE CAST(p AS DATE) >= date_trunc('month', CAST((current_date) - INTERVAL 1 MONTH AS DATE))",
+        )
+
+    def test_unnest_merge_and_casts(self):
+        self.assertIn("IN (SELECT UNNEST($ids))", traduzir_sql("WHERE id IN UNNEST(@ids)"))
+        self.assertTrue(traduzir_sql("MERGE `p.d.t` T USING UNNEST(@u) S").startswith('MERGE INTO "d"."t" T'))
+        self.assertEqual(traduzir_sql("SAFE_CAST(id AS INT64)"), "TRY_CAST(id AS BIGINT)")
+
+
+class DuckDBBigQueryClientTests(unittest.TestCase):
+    def setUp(self):
+        self.client = DuckDBBigQueryClient(
+            path=":memory:",
+            cache=ResultCache(MemoryQueryCache()),
+            known_ids=KnownIds(),
+        )
+        self.client.recorder = QueryRecorder()
+        for row in ({"id": "1", "name": "Ana"}, {"id": "2", "name": "Bia"}, {"id": "3", "name": "Caio"}):
+            self.client.inserir(row, "unit")
+
+    def tearDown(self):
+        self.client.client.close()
+
+    def test_crud_roundtrip(self):
+        self.assertEqual([r["id"] for r in self.client.listar("unit", limit=2)], ["1", "2"])
+        self.assertEqual(self.client.buscar_por_id("unit", "2")["name"], "Bia")
+        self.assertEqual(self.client.filtrar("unit", {"name": "Caio"})[0]["id"], "3")
+
+        self.client.atualizar("2", {"name": "Beatriz"}, "unit")
+        self.assertEqual(self.client.buscar_por_id("unit", "2")["name"], "Beatriz")
+
+        self.client.remover("3", "unit")
+        self.assertIsNone(self.client.buscar_por_id("unit", "3"))
+
+    def test_batch_dml_and_exists_many(self):
+        result = self.client.atualizar_lote([{"id": "1", "name": "A"}, {"id": "2", "name": "B"}], "unit")
+        self.assertEqual(result["updated"], 2)
+        self.assertEqual(self.client.remover_lote(["1", "9"], "unit")["deleted"], 1)
+        self.assertEqual(self.client.exists_many({"unit": ["1", "2", "3"]}), {"unit": {"2", "3"}})
+
+    def test_query_arrow_and_cursor(self):
+        table = self.client.query_arrow(f"SELECT COUNT(*) AS n FROM `{self.client.table_ref('unit')}`")
+        self.assertEqual(table.to_pylist(), [{"n": 3}])
+
+        rows, cursor = self.client.listar_cursor("unit", limit=2)
+        self.assertEqual([r["id"] for r in rows], ["1", "2"])
+        rows, cursor = self.client.listar_cursor("unit", limit=2, cursor=cursor)
+        self.assertEqual([r["id"] for r in rows], ["3"])
+        self.assertIsNone(cursor)
+
+    def test_missing_table_raises_not_found(self):
+        with self.assertRaises(gcloud_exceptions.NotFound):
+            self.client.executar_query(f"SELECT * FROM `{self.client.table_ref('nope')}`")
+
+    def test_load_csv_from_local_gcs_root(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "bucket"))
+            with open(os.path.join(root, "bucket", "units.csv"), "w") as f:
+                f.write("id,name\n10,Xavier\n11,Yara\n")
+            self.client.client.gcs_root = root
+
+            self.client.load_csv_from_gcs("gs://bucket/units.csv", "unit")
+
+        self.assertEqual([r["name"] for r in self.client.listar("unit")], ["Xavier", "Yara"])
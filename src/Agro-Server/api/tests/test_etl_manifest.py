@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from clients.bigquery_client import BigQueryClient
+from clients.etl_manifest import BigQueryManifest, FileFingerprint, SqliteManifest, manifesto_padrao
+
+from .test_bigquery_client import FakeGoogleClient, _params
+
+
+def _resultado(**kwargs):
+    return {
+        "staging_blob": "staging/dia_processed_20250101T000000Z.csv",
+        "table": "p.d.raw_layer",
+        "rows_read": 2,
+        "rows_loaded": 2,
+        "load_strategy": "streaming",
+        "processed_at": "2025-01-01T00:00:00.000000Z",
+        **kwargs,
+    }
+
+
+class FileFingerprintTests(unittest.TestCase):
+    def test_same_generation_or_same_content_matches(self):
+        fingerprint = FileFingerprint("raw/dia.csv", generation=2, crc32c="abc=", md5_hash="md5=")
+
+        self.assertTrue(fingerprint.corresponde({"blob_name": "raw/dia.csv", "generation": 2}))
+        self.assertTrue(fingerprint.corresponde(
+            {"blob_name": "raw/dia.csv", "generation": 1, "crc32c": "abc=", "md5_hash": "md5="}
+        ))
+        # objeto composto (sem MD5): vale o CRC32C
+        self.assertTrue(fingerprint.corresponde(
+            {"blob_name": "raw/dia.csv", "generation": 1, "crc32c": "abc=", "md5_hash": None}
+        ))
+        self.assertFalse(fingerprint.corresponde(
+            {"blob_name": "raw/dia.csv", "generation": 1, "crc32c": "abc=", "md5_hash": "outro="}
+        ))
+        self.assertFalse(fingerprint.corresponde({"blob_name": "raw/outro.csv", "generation": 2}))
+        self.assertEqual(fingerprint.namespace, "raw/dia.csv#2")
+
+
+class SqliteManifestTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.manifest = SqliteManifest(os.path.join(tmp, "manifest.sqlite3"))
+
+    def test_register_and_find_latest_entry(self):
+        fingerprint = FileFingerprint("raw/dia.csv", generation=1, crc32c="abc=", size=10)
+
+        self.assertIsNone(self.manifest.buscar(fingerprint))
+        self.manifest.registrar(fingerprint, _resultado())
+        self.manifest.registrar(fingerprint, _resultado(rows_loaded=5, processed_at="2025-01-02T00:00:00.000000Z"))
+
+        entry = self.manifest.buscar(fingerprint)
+        self.assertEqual(entry["rows_loaded"], 5)
+        self.assertEqual(entry["target_table"], "p.d.raw_layer")
+        self.assertEqual(list(self.manifest.entradas(["raw/dia.csv", "raw/outro.csv"])), ["raw/dia.csv"])
+        self.assertIsNone(self.manifest.buscar(FileFingerprint("raw/dia.csv", generation=2, crc32c="def=")))
+
+    def test_claim_is_exclusive_until_registered_or_released(self):
+        fingerprint = FileFingerprint("raw/dia.csv", generation=1, crc32c="abc=", size=10)
+
+        claim_id = self.manifest.reservar(fingerprint)
+        self.assertIsNotNone(claim_id)
+        self.assertIsNone(self.manifest.reservar(fingerprint))
+        self.assertIsNone(self.manifest.reservar(fingerprint, force=True))
+        self.assertIsNone(self.manifest.buscar(fingerprint))  # reserva não conta como processado
+
+        self.manifest.registrar(fingerprint, _resultado(), claim_id)
+        self.assertEqual(self.manifest.buscar(fingerprint)["status"], "done")
+        self.assertIsNone(self.manifest.reservar(fingerprint))
+
+        forced = self.manifest.reservar(fingerprint, force=True)
+        self.assertIsNotNone(forced)
+        self.manifest.liberar(fingerprint, forced)
+        self.assertEqual(self.manifest.entradas(["raw/dia.csv"]), {})
+
+    def test_stale_claim_and_missing_generation(self):
+        self.manifest.claim_ttl = 0
+        fingerprint = FileFingerprint("raw/dia.csv")
+
+        first = self.manifest.reservar(fingerprint)
+        second = self.manifest.reservar(fingerprint)  # reserva expirada: processo que morreu
+
+        self.assertNotIn(None, (first, second))
+        self.assertNotEqual(first, second)
+        self.manifest.registrar(fingerprint, _resultado(), second)
+        self.assertEqual(len(self.manifest.entradas(["raw/dia.csv"])["raw/dia.csv"]), 1)
+
+
+class BigQueryManifestTests(unittest.TestCase):
+    def test_reads_and_writes_through_parameterized_queries(self):
+        google_client = FakeGoogleClient(rows=[
+            {"blob_name": "raw/dia.csv", "generation": 7, "crc32c": "abc=", "processed_at": "2025-01-01T00:00:00Z"},
+        ])
+        manifest = BigQueryManifest(BigQueryClient(client=google_client, cache=None))
+        fingerprint = FileFingerprint("raw/dia.csv", generation=7, crc32c="abc=")
+
+        entry = manifest.buscar(fingerprint)
+        manifest.registrar(fingerprint, _resultado())
+
+        self.assertEqual(entry["generation"], 7)
+        ddl, select, insert = [sql for sql, _ in google_client.queries]
+        self.assertIn("CREATE TABLE IF NOT EXISTS `mock-project.agro_dataset.etl_manifest`", ddl)
+        self.assertIn("IN UNNEST(@names)", select)
+        self.assertEqual(google_client.queries[1][1].query_parameters[0].values, ["raw/dia.csv"])
+        self.assertIn("TIMESTAMP(@processed_at)", insert)
+        self.assertEqual(_params(google_client.queries[2][1])["generation"], ("INT64", 7))
+
+    def test_claim_is_a_conditional_merge(self):
+        google_client = FakeGoogleClient(rows=[{"claimed": 1}])
+        manifest = BigQueryManifest(BigQueryClient(client=google_client, cache=None))
+        fingerprint = FileFingerprint("raw/dia.csv", generation=7, crc32c="abc=")
+
+        claim_id = manifest.reservar(fingerprint)
+        manifest.registrar(fingerprint, _resultado(), claim_id)
+        google_client.rows = [{"claimed": 0}]
+        lost = manifest.reservar(fingerprint)
+
+        self.assertIsNotNone(claim_id)
+        self.assertIsNone(lost)
+        merge, update = google_client.queries[1][0], google_client.queries[2][0]
+        self.assertIn("MERGE `mock-project.agro_dataset.etl_manifest`", merge)
+        self.assertIn("WHEN NOT MATCHED THEN", merge)
+        self.assertIn("COUNT(*) AS claimed", merge)
+        self.assertEqual(_params(google_client.queries[1][1])["claim_id"], ("STRING", claim_id))
+        self.assertIn("WHERE blob_name = @blob_name AND claim_id = @claim_id", update)
+        self.assertEqual(_params(google_client.queries[2][1])["status"], ("STRING", "done"))
+
+    def test_env_selects_the_store(self):
+        client = BigQueryClient(client=FakeGoogleClient(), cache=None)
+        for mode, expected in (("off", type(None)), ("sqlite", SqliteManifest), ("bigquery", BigQueryManifest)):
+            os.environ["ETL_MANIFEST"] = mode
+            self.addCleanup(os.environ.pop, "ETL_MANIFEST", None)
+            self.assertIsInstance(manifesto_padrao(client), expected)
@@ -1,29 +1,134 @@
+import base64
+import functools
+import hashlib
+import io
+import json
 import os
+import shutil
+import tempfile
 import unittest
+import zlib
+from datetime import datetime
 from typing import List, cast
+from unittest import mock
 
-from api.etl_service import EtlService
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from api.etl_service import EtlService, _HashesVistos
 from clients.bigquery_client import BigQueryClient
+from clients.duckdb_backend import DuckDBBigQueryClient
+from clients.etl_manifest import FileFingerprint, SqliteManifest
 from clients.storage_client import CloudStorageClient
 
 
+def _stat(name: str, payload: bytes, generation: int) -> dict:
+    return {
+        "name": name,
+        "generation": generation,
+        "crc32c": base64.b64encode(zlib.crc32(payload).to_bytes(4, "big")).decode(),
+        "md5_hash": base64.b64encode(hashlib.md5(payload).digest()).decode(),
+        "size": len(payload),
+    }
+
+
 class MockStorageClient:
-    def __init__(self, csv_payload: str):
-        self._payload = csv_payload.encode("utf-8")
+    def __init__(self, csv_payload):
+        self._payload = csv_payload.encode("utf-8") if isinstance(csv_payload, str) else csv_payload
         self.upload_calls: List[tuple[str, bytes]] = []
+        self.generation = 1
+        self.opened: List[tuple] = []
 
     def download_buffer(self, blob_name: str) -> bytes:
         return self._payload
 
+    def stat(self, blob_name: str) -> dict:
+        return _stat(blob_name, self._payload, self.generation)
+
+    def open_reader(self, blob_name: str, generation=None):
+        self.opened.append((blob_name, generation))
+        return io.BytesIO(self._payload)
+
     def upload_buffer(self, file_bytes: bytes, destination_blob: str) -> dict:
         self.upload_calls.append((destination_blob, file_bytes))
         return {"mensagem": "ok"}
 
+    def upload_file(self, source_path: str, destination_blob: str) -> str:
+        with open(source_path, "rb") as f:
+            self.upload_calls.append((destination_blob, f.read()))
+        return self.gcs_uri(destination_blob)
+
+    def gcs_uri(self, blob_name: str) -> str:
+        return f"gs://bucket/{blob_name}"
+
+
+class LocalStorageClient(MockStorageClient):
+    """Grava os uploads em disco, no layout que o backend DuckDB lê como `gs://bucket/...`."""
+
+    def __init__(self, csv_payload: str, root: str):
+        super().__init__(csv_payload)
+        self.root = root
+
+    def upload_file(self, source_path: str, destination_blob: str) -> str:
+        path = os.path.join(self.root, "bucket", destination_blob)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(source_path, path)
+        return super().upload_file(source_path, destination_blob)
+
+
+class DirectoryStorageClient:
+    """Bucket num diretório local (picklável, para os processos do pool)."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, blob_name: str) -> str:
+        return os.path.join(self.root, blob_name)
+
+    def list_blobs(self, prefix: str) -> List[str]:
+        names = []
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                blob = os.path.relpath(os.path.join(folder, name), self.root).replace(os.sep, "/")
+                if blob.startswith(prefix):
+                    names.append(blob)
+        return names
+
+    def stat(self, blob_name: str) -> dict:
+        with open(self._path(blob_name), "rb") as f:
+            return _stat(blob_name, f.read(), os.stat(self._path(blob_name)).st_mtime_ns)
+
+    def list_stats(self, prefix: str) -> List[dict]:
+        return [self.stat(blob) for blob in self.list_blobs(prefix)]
+
+    def open_reader(self, blob_name: str, generation=None):
+        return open(self._path(blob_name), "rb")
+
+    def upload_file(self, source_path: str, destination_blob: str) -> str:
+        os.makedirs(os.path.dirname(self._path(destination_blob)), exist_ok=True)
+        shutil.copyfile(source_path, self._path(destination_blob))
+        return self.gcs_uri(destination_blob)
+
+    def gcs_uri(self, blob_name: str) -> str:
+        return f"gs://bucket/{blob_name}"
+
+
+def _directory_service(root: str, config: dict) -> EtlService:
+    return EtlService(
+        storage_client=cast(CloudStorageClient, DirectoryStorageClient(root)),
+        bigquery_client=cast(BigQueryClient, MockBigQueryClient()),
+        **config,
+    )
+
 
 class MockBigQueryClient:
     def __init__(self):
         self.insert_calls: List[List[dict]] = []
         self.table_ids: List[str] = []
+        self.invalidated: List[str] = []
+        self.load_calls: List[tuple] = []
+        self.row_ids: List[str] = []
         self.client = self
 
     def table_ref(self, table_id: str) -> str:
@@ -31,16 +136,29 @@ class MockBigQueryClient:
         self.table_ids.append(ref)
         return ref
 
-    def insert_rows_json(self, table_ref: str, rows: List[dict]):
+    def insert_rows_json(self, table_ref: str, rows: List[dict], row_ids=None):
         self.insert_calls.append(rows)
+        self.row_ids.extend(row_ids or [])
         return []
 
+    def load_from_gcs(self, gcs_uri: str, table_id: str, **kwargs):
+        self.load_calls.append((gcs_uri, table_id, kwargs))
+        return type("LoadJob", (), {"output_rows": 2})()
+
+    def invalidar_cache(self, *table_ids: str) -> int:
+        self.invalidated.extend(table_ids)
+        return 0
+
 
 class EtlServiceTests(unittest.TestCase):
     def setUp(self):
         os.environ.pop("BIGQUERY_ETL_TABLE", None)
         os.environ.pop("RAW_LAYER_PREFIX", None)
         os.environ.pop("STAGING_LAYER_PREFIX", None)
+        os.environ.pop("ETL_LOAD_JOB_MIN_ROWS", None)
+        # manifesto só nos testes que o passam explicitamente
+        os.environ["ETL_MANIFEST"] = "off"
+        self.addCleanup(os.environ.pop, "ETL_MANIFEST", None)
 
     def test_successful_processing_chunks_and_staging(self):
         csv_payload = "id_col,name,valor\n1,Ana,10\n2,Bia,20\n2,Bia,20\n"
@@ -65,11 +183,63 @@ class EtlServiceTests(unittest.TestCase):
         self.assertEqual(len(storage.upload_calls), 1)
         staging_blob, staging_bytes = storage.upload_calls[0]
         self.assertEqual(staging_blob, result["staging_blob"])
-        self.assertIn("id_col", staging_bytes.decode("utf-8"))
+        self.assertTrue(staging_blob.endswith(".parquet"))
+        staging = pq.ParquetFile(io.BytesIO(staging_bytes))
+        self.assertEqual(staging.metadata.row_group(0).column(0).compression, "ZSTD")
+        self.assertEqual(str(staging.schema_arrow.field("id_col").type), "int64")
+        self.assertEqual(staging.read().column("name").to_pylist(), ["Ana", "Bia"])
 
         self.assertEqual(len(bigquery.insert_calls), 1)
         self.assertEqual(len(bigquery.insert_calls[0]), 2)
         self.assertRegex(result["table"], r"mock-project\.dataset\.raw_layer")
+        self.assertEqual(bigquery.invalidated, ["raw_layer"])
+        self.assertEqual(result["load_strategy"], "streaming")
+        self.assertEqual(bigquery.load_calls, [])
+
+    def test_large_file_uses_parquet_staging_and_single_load_job(self):
+        storage = MockStorageClient("id_col,name,valor\n1,Ana,10\n2,Bia,\n")
+        bigquery = MockBigQueryClient()
+        service = EtlService(
+            storage_client=cast(CloudStorageClient, storage),
+            bigquery_client=cast(BigQueryClient, bigquery),
+            load_job_min_rows=2,
+        )
+
+        result = service.process_raw_file("raw/telemetria.csv")
+
+        self.assertEqual(result["load_strategy"], "load_job")
+        self.assertEqual(result["rows_loaded"], 2)
+        self.assertEqual(bigquery.insert_calls, [])
+        staging_blob, staging_bytes = storage.upload_calls[0]
+        self.assertEqual(result["staging_blob"], staging_blob)
+        self.assertTrue(staging_blob.endswith(".parquet"))
+        self.assertEqual(
+            bigquery.load_calls,
+            [(f"gs://bucket/{staging_blob}", "raw_layer", {"source_format": "PARQUET", "write_disposition": "WRITE_APPEND"})],
+        )
+        table = pq.read_table(io.BytesIO(staging_bytes))
+        self.assertEqual(table.column_names, ["id_col", "name", "valor"])
+        self.assertEqual(table.column("valor").to_pylist(), [10.0, None])
+
+    def test_load_job_path_against_local_backend(self):
+        with tempfile.TemporaryDirectory() as root:
+            bigquery = DuckDBBigQueryClient(path=":memory:", cache=None)
+            bigquery.client.gcs_root = root
+            try:
+                service = EtlService(
+                    storage_client=cast(CloudStorageClient, LocalStorageClient("id,valor\n1,1.5\n2,2.5\n", root)),
+                    bigquery_client=bigquery,
+                    load_job_min_rows=1,
+                )
+                service.process_raw_file("raw/a.csv")
+                result = service.process_raw_file("raw/a.csv")
+
+                rows = bigquery.executar_query(f"SELECT COUNT(*) AS n FROM `{bigquery.table_ref('raw_layer')}`")
+            finally:
+                bigquery.client.close()
+
+        self.assertEqual(result["rows_loaded"], 2)
+        self.assertEqual(rows, [{"n": 4}])
 
     def test_rejects_non_csv_file(self):
         storage = MockStorageClient("col1,col2\n1,2\n")
@@ -100,6 +270,286 @@ class EtlServiceTests(unittest.TestCase):
         self.assertEqual(len(bigquery.insert_calls), 0)
         self.assertEqual(len(storage.upload_calls), 0)
 
+    def _chunked_service(self, payload, **kwargs):
+        storage = MockStorageClient(payload)
+        bigquery = MockBigQueryClient()
+        service = EtlService(
+            storage_client=cast(CloudStorageClient, storage),
+            bigquery_client=cast(BigQueryClient, bigquery),
+            memory_budget=1,  # blocos mínimos (64 KiB)
+            **kwargs,
+        )
+        return service, storage, bigquery
+
+    def test_multi_block_file_dedups_across_blocks(self):
+        body = "".join(f"{i},nome {i},{i * 1.5}\n" for i in range(12000))
+        payload = "id,name,valor\n" + body + "".join(body.splitlines(keepends=True)[:3]) + ',"com\nquebra",1\n'
+        service, storage, bigquery = self._chunked_service(payload, load_job_min_rows=0)
+
+        result = service.process_raw_file("raw/grande.csv")
+
+        inserted = [row for call in bigquery.insert_calls for row in call]
+        self.assertGreater(len(payload), 3 * 64 * 1024)
+        self.assertEqual(result["rows_read"], 12000 + 3 + 1)
+        self.assertEqual(result["rows_loaded"], 12001)
+        self.assertEqual(len({row["id"] for row in inserted if row["id"] is not None}), 12000)
+        self.assertIn("com\nquebra", [row["name"] for row in inserted])
+        staging = pq.ParquetFile(io.BytesIO(storage.upload_calls[0][1]))
+        self.assertEqual(staging.metadata.num_rows, 12001)
+        self.assertGreater(staging.metadata.num_row_groups, 1)  # um por bloco
+        self.assertEqual(staging.schema_arrow.names, ["id", "name", "valor"])
+        self.assertEqual(str(staging.schema_arrow.field("id").type), "int64")
+
+    def test_csv_staging_format_is_kept_as_an_option(self):
+        payload = "id,name,valor\n" + "".join(f"{i},nome {i},{i * 1.5}\n" for i in range(12000))
+        service, storage, _ = self._chunked_service(payload, load_job_min_rows=0, staging_format="csv")
+
+        result = service.process_raw_file("raw/grande.csv")
+
+        self.assertTrue(result["staging_blob"].endswith(".csv"))
+        staging = pd.read_csv(io.BytesIO(storage.upload_calls[0][1]))
+        self.assertEqual(len(staging), 12000)
+        self.assertEqual(list(staging.columns), ["id", "name", "valor"])
+        with self.assertRaises(ValueError):
+            EtlService(
+                storage_client=cast(CloudStorageClient, storage),
+                bigquery_client=cast(BigQueryClient, MockBigQueryClient()),
+                staging_format="xlsx",
+            )
+
+    def test_rerun_sends_the_same_insert_ids(self):
+        payload = "id,valor\n" + "".join(f"{i},{i}\n" for i in range(1200))
+        service, _, bigquery = self._chunked_service(payload, load_job_min_rows=0)
+
+        service.process_raw_file("raw/repetido.csv")
+        first_run = list(bigquery.row_ids)
+        service.process_raw_file("raw/repetido.csv")
+
+        self.assertEqual(len(set(first_run)), 1200)
+        self.assertEqual(sorted(bigquery.row_ids[1200:]), sorted(first_run))
+
+    def test_latin1_block_falls_back_without_restarting(self):
+        payload = "id,cidade\n".encode() + "".join(f"{i},Sao Paulo\n" for i in range(8000)).encode()
+        payload += "9000,São João\n".encode("latin-1")
+        service, _, bigquery = self._chunked_service(payload, load_job_min_rows=0)
+
+        result = service.process_raw_file("raw/latin1.csv")
+
+        inserted = [row for call in bigquery.insert_calls for row in call]
+        self.assertEqual(result["rows_loaded"], 8001)
+        self.assertIn({"id": 9000, "cidade": "São João"}, inserted)
+
+    def test_load_job_blocks_share_the_first_block_schema(self):
+        body = "".join(f"{i},,{i}\n" for i in range(20000)) + "20000,texto,\n"
+        service, storage, bigquery = self._chunked_service("id,obs,valor\n" + body, load_job_min_rows=1)
+
+        result = service.process_raw_file("raw/tipos.csv")
+
+        self.assertEqual(result["load_strategy"], "load_job")
+        table = pq.read_table(io.BytesIO(storage.upload_calls[0][1]))
+        self.assertEqual(table.num_rows, 20001)
+        self.assertEqual(str(table.schema.field("obs").type), "string")
+        self.assertEqual(str(table.schema.field("valor").type), "int64")
+        self.assertEqual(table.column("obs").to_pylist()[-1], "texto")
+        self.assertIsNone(table.column("valor").to_pylist()[-1])
+
+    def test_type_drift_widens_parquet_staging_instead_of_failing(self):
+        body = "".join(f"{i},{i},nome {i}\n" for i in range(20000)) + "20001,1.5,7\n"
+        service, storage, bigquery = self._chunked_service("id,valor,obs\n" + body, load_job_min_rows=0)
+
+        result = service.process_raw_file("raw/deriva.csv")
+
+        inserted = [row for call in bigquery.insert_calls for row in call]
+        self.assertEqual(result["status"], "ok")
+        self.assertEqual(result["rows_loaded"], 20001)
+        self.assertEqual(inserted[-1], {"id": 20001, "valor": 1.5, "obs": "7"})
+        table = pq.read_table(io.BytesIO(storage.upload_calls[0][1]))
+        self.assertEqual(table.num_rows, 20001)
+        self.assertEqual(str(table.schema.field("id").type), "int64")
+        self.assertEqual(str(table.schema.field("valor").type), "double")
+        self.assertEqual(str(table.schema.field("obs").type), "string")
+        self.assertEqual(table.column("valor").to_pylist()[:2], [0.0, 1.0])
+        self.assertEqual(table.column("valor").to_pylist()[-1], 1.5)
+        self.assertEqual(table.column("obs").to_pylist()[-1], "7")
+
+    def test_manifest_skips_processed_version_unless_forced(self):
+        payload = "id,valor\n1,10\n2,20\n"
+        storage, bigquery = MockStorageClient(payload), MockBigQueryClient()
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        service = EtlService(
+            storage_client=cast(CloudStorageClient, storage),
+            bigquery_client=cast(BigQueryClient, bigquery),
+            manifest=SqliteManifest(os.path.join(tmp, "manifest.sqlite3")),
+        )
+
+        first = service.process_raw_file("raw/dia.csv")
+        retry = service.process_raw_file("raw/dia.csv")
+
+        self.assertEqual((first["status"], first["generation"]), ("ok", 1))
+        self.assertEqual(retry["status"], "skipped")
+        self.assertEqual(retry["staging_blob"], first["staging_blob"])
+        self.assertEqual(retry["rows_loaded"], 0)
+        self.assertEqual(storage.opened, [("raw/dia.csv", 1)])
+        self.assertEqual(len(bigquery.insert_calls), 1)
+
+        # reenvio idêntico (nova geração, mesmo conteúdo) também é pulado
+        storage.generation = 2
+        self.assertEqual(service.process_raw_file("raw/dia.csv")["status"], "skipped")
+
+        forced = service.process_raw_file("raw/dia.csv", force=True)
+        storage._payload += b"3,30\n"
+        storage.generation = 3
+        changed = service.process_raw_file("raw/dia.csv")
+
+        self.assertEqual((forced["status"], changed["status"]), ("ok", "ok"))
+        self.assertEqual(changed["rows_loaded"], 3)
+        # o insertId leva a geração: a versão nova não é deduplicada contra a anterior
+        self.assertTrue(set(bigquery.row_ids[4:]).isdisjoint(bigquery.row_ids[:2]))
+
+    def test_claimed_version_is_not_loaded_twice(self):
+        storage, bigquery = MockStorageClient("id,valor\n1,10\n"), MockBigQueryClient()
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        manifest = SqliteManifest(os.path.join(tmp, "manifest.sqlite3"))
+        service = EtlService(
+            storage_client=cast(CloudStorageClient, storage),
+            bigquery_client=cast(BigQueryClient, bigquery),
+            manifest=manifest,
+        )
+        fingerprint = FileFingerprint.from_stat(storage.stat("raw/dia.csv"))
+
+        # outra chamada reservou esta geração e ainda está carregando
+        claim_id = manifest.reservar(fingerprint)
+        concurrent = service.process_raw_file("raw/dia.csv")
+        forced = service.process_raw_file("raw/dia.csv", force=True)
+
+        self.assertEqual((concurrent["status"], forced["status"]), ("in_progress", "in_progress"))
+        self.assertEqual(storage.opened, [])
+        self.assertEqual(bigquery.insert_calls, [])
+
+        # a carga da outra chamada falhou: a reserva some e o arquivo volta a ser processado
+        manifest.liberar(fingerprint, claim_id)
+        with mock.patch.object(EtlService, "_processar", side_effect=RuntimeError("falhou")):
+            with self.assertRaises(RuntimeError):
+                service.process_raw_file("raw/dia.csv")
+        self.assertIsNotNone(manifest.reservar(fingerprint))
+
+    def test_seen_hashes_use_a_stable_128_bit_digest(self):
+        seen = _HashesVistos()
+
+        self.assertEqual(seen.filtrar([b"1,a", b"2,b", b"1,a"]), [b"1,a", b"2,b"])
+        self.assertEqual(seen.filtrar([b"2,b", b"1.0,a", b"3,c"]), [b"1.0,a", b"3,c"])
+        self.assertEqual(len(seen), 4)
+
+        # mesma metade alta com a outra metade diferente não conta como repetida
+        hi, lo = np.frombuffer(hashlib.blake2b(b"x", digest_size=16).digest(), dtype="<u8")
+        seen._hi = np.array([hi, hi], dtype=np.uint64)
+        seen._lo = np.array([lo + np.uint64(1), lo + np.uint64(2)], dtype=np.uint64)
+        self.assertEqual(seen.filtrar([b"x"]), [b"x"])
+        self.assertEqual(seen.filtrar([b"x"]), [])
+
+    def test_prepare_records_converts_columns_to_native_values(self):
+        service = EtlService(
+            storage_client=cast(CloudStorageClient, MockStorageClient("")),
+            bigquery_client=cast(BigQueryClient, MockBigQueryClient()),
+        )
+        dataframe = pd.DataFrame({
+            "id": np.array([1, 2], dtype="int64"),
+            "valor": [1.5, np.nan],
+            "nome": ["Ana", None],
+            "quando": pd.to_datetime(["2024-01-02 03:04:05", None]),
+            "quando_utc": pd.to_datetime(["2024-01-02 03:04:05", None]).tz_localize("America/Sao_Paulo"),
+            "misto": [datetime(2024, 1, 2), "texto"],
+        })
+
+        records = service._prepare_records(dataframe)
+
+        self.assertEqual(records, [
+            {
+                "id": 1, "valor": 1.5, "nome": "Ana", "quando": "2024-01-02T03:04:05.000000",
+                "quando_utc": "2024-01-02T06:04:05.000000Z", "misto": "2024-01-02T00:00:00",
+            },
+            {"id": 2, "valor": None, "nome": None, "quando": None, "quando_utc": None, "misto": "texto"},
+        ])
+        self.assertIs(type(records[0]["id"]), int)
+        self.assertIs(type(records[0]["valor"]), float)
+        self.assertEqual([json.loads(line) for line in service._prepare_ndjson(dataframe[["id", "valor"]]).splitlines()],
+                         [{"id": 1, "valor": 1.5}, {"id": 2, "valor": None}])
+
+
+class ProcessPrefixTests(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        os.environ["ETL_MANIFEST"] = "off"
+        self.addCleanup(os.environ.pop, "ETL_MANIFEST", None)
+        for name, rows in (("a", 3), ("b", 5), ("c", 2)):
+            path = os.path.join(self.root, "raw", f"{name}.csv")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write("id,valor\n" + "".join(f"{i},{i}\n" for i in range(rows)))
+        with open(os.path.join(self.root, "raw", "notas.txt"), "w") as f:
+            f.write("ignorado")
+        os.makedirs(os.path.join(self.root, "staging"))
+        with open(os.path.join(self.root, "staging", "c_processed_20250101T000000Z.csv"), "w") as f:
+            f.write("id,valor\n")
+
+    def test_serial_run_skips_processed_blobs_and_reports_throughput(self):
+        service = _directory_service(self.root, {"load_job_min_rows": 0})
+
+        summary = service.process_prefix("raw/", workers=1)
+
+        self.assertEqual(summary["files_found"], 3)
+        self.assertEqual(summary["files_already_processed"], 1)
+        self.assertEqual([item["raw_blob"] for item in summary["results"]], ["raw/a.csv", "raw/b.csv"])
+        self.assertEqual((summary["files_processed"], summary["files_failed"]), (2, 0))
+        self.assertEqual(summary["rows_loaded"], 8)
+        self.assertGreater(summary["rows_per_s"], 0)
+        self.assertEqual(service.listar_pendentes("raw/")["pending"], [])
+
+    def test_process_pool_fans_out_and_isolates_failures(self):
+        with open(os.path.join(self.root, "raw", "quebrado.csv"), "wb") as f:
+            f.write(b'id,valor\n1,"sem fim\n')
+        service = _directory_service(self.root, {"load_job_min_rows": 0})
+
+        summary = service.process_prefix(
+            "raw/", workers=2, service_factory=functools.partial(_directory_service, self.root)
+        )
+
+        by_blob = {item["raw_blob"]: item for item in summary["results"]}
+        self.assertEqual(sorted(by_blob), ["raw/a.csv", "raw/b.csv", "raw/quebrado.csv"])
+        self.assertEqual(by_blob["raw/b.csv"]["rows_loaded"], 5)
+        self.assertEqual(by_blob["raw/quebrado.csv"]["status"], "error")
+        self.assertEqual((summary["files_processed"], summary["files_failed"]), (2, 1))
+        self.assertEqual(service.listar_pendentes("raw/")["pending"], ["raw/quebrado.csv"])
+
+    def test_manifest_decides_pending_files(self):
+        manifest = SqliteManifest(os.path.join(self.root, "manifest.sqlite3"))
+        service = EtlService(
+            storage_client=cast(CloudStorageClient, DirectoryStorageClient(self.root)),
+            bigquery_client=cast(BigQueryClient, MockBigQueryClient()),
+            load_job_min_rows=0,
+            manifest=manifest,
+        )
+
+        summary = service.process_prefix("raw/", workers=1)
+        self.assertEqual(summary["files_already_processed"], 1)  # c.csv: artefato de staging anterior ao manifesto
+        self.assertEqual(service.listar_pendentes("raw/")["pending"], [])
+
+        with open(os.path.join(self.root, "raw", "a.csv"), "a") as f:
+            f.write("99,99\n")
+        self.assertEqual(service.listar_pendentes("raw/")["pending"], ["raw/a.csv"])
+
+        forced = service.process_prefix("raw/", workers=1, force=True)
+        self.assertEqual(forced["files_pending"], 3)
+        self.assertEqual(forced["files_processed"], 3)
+        self.assertEqual(service.process_raw_file("raw/c.csv")["status"], "skipped")
+
+    def test_rejects_invalid_worker_count(self):
+        with self.assertRaises(ValueError):
+            _directory_service(self.root, {}).process_prefix("raw/", workers=0)
+
 
 if __name__ == "__main__":
     unittest.main()
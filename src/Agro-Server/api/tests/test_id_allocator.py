@@ -0,0 +1,121 @@
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from clients.bigquery_client import BigQueryClient
+from clients.id_allocator import BigQueryIdAllocator, IdAllocator, SqliteIdAllocator, build_id_allocator_from_env
+
+from .test_bigquery_client import FakeGoogleClient
+
+
+class SqliteIdAllocatorTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "seq.sqlite3")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_starts_after_seed_and_reserves_blocks(self):
+        seeds = []
+        allocator = SqliteIdAllocator(self.path, block_size=3, seed=lambda t: seeds.append(t) or 10)
+
+        ids = [allocator.next_id("unit") for _ in range(5)]
+
+        self.assertEqual(ids, [11, 12, 13, 14, 15])
+        self.assertEqual(seeds, ["unit"])
+
+    def test_concurrent_allocators_never_repeat_ids(self):
+        allocators = [SqliteIdAllocator(self.path, block_size=4) for _ in range(3)]
+        ids = []
+        lock = threading.Lock()
+
+        def worker(allocator):
+            for _ in range(20):
+                new_id = allocator.next_id("occurrence")
+                with lock:
+                    ids.append(new_id)
+
+        threads = [threading.Thread(target=worker, args=(a,)) for a in allocators for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(ids), 120)
+        self.assertEqual(len(set(ids)), 120)
+
+
+class SequencedGoogleClient(FakeGoogleClient):
+    """Devolve um conjunto de linhas por query, na ordem."""
+
+    def __init__(self, results):
+        super().__init__()
+        self.results = list(results)
+
+    def query(self, sql, job_config=None, **kwargs):
+        self.rows = self.results.pop(0)
+        return super().query(sql, job_config, **kwargs)
+
+
+class BigQueryIdAllocatorTests(unittest.TestCase):
+    def _allocator(self, google_client):
+        client = BigQueryClient(client=google_client)
+        client.dataset_id = "dataset"
+        client.cache = None
+        return BigQueryIdAllocator(client, block_size=10)
+
+    def test_reserves_block_with_one_transactional_merge(self):
+        google_client = SequencedGoogleClient([[{"next_id": 11}], [{"next_id": 21}]])
+        allocator = self._allocator(google_client)
+
+        ids = [allocator.next_id("unit") for _ in range(10)]
+
+        self.assertEqual(ids, list(range(1, 11)))
+        self.assertEqual(len(google_client.queries), 1)
+        sql, _ = google_client.queries[0]
+        self.assertIn("BEGIN TRANSACTION", sql)
+        self.assertIn("MERGE `mock-project.dataset.id_sequence` S", sql)
+        self.assertIn("WHEN MATCHED THEN UPDATE SET next_id = S.next_id + @size", sql)
+        # a semente (leitura da tabela de destino) fica na mesma transação, só se a linha faltar
+        self.assertLess(sql.index("BEGIN TRANSACTION"), sql.index("IF reserved_end IS NULL THEN"))
+        self.assertLess(sql.index("MAX(SAFE_CAST(id AS INT64))"), sql.index("COMMIT TRANSACTION"))
+
+        self.assertEqual(allocator.next_id("unit"), 11)
+        self.assertEqual(len(google_client.queries), 2)
+        self.assertNotIn("CREATE TABLE", google_client.queries[1][0])
+
+    def test_aborted_concurrent_transaction_is_retried(self):
+        allocator = self._allocator(FakeGoogleClient())
+        calls = []
+
+        def executar_query(query, builder, use_cache=True):
+            calls.append(query)
+            if len(calls) == 1:
+                raise RuntimeError("Transaction is aborted due to concurrent update against table id_sequence")
+            return [{"next_id": 18}]
+
+        allocator.bigquery_client.executar_query = executar_query
+        allocator.MAX_ATTEMPTS = 2
+        with mock.patch("clients.id_allocator.time.sleep"):
+            self.assertEqual(allocator.next_id("unit"), 8)
+        self.assertEqual(len(calls), 2)
+
+    def test_allocator_base_requires_reserve(self):
+        with self.assertRaises(TypeError):
+            IdAllocator()
+
+    def test_sqlite_default_path_is_private(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.dict(
+            os.environ, {"ID_ALLOCATOR_BACKEND": "sqlite", "XDG_CACHE_HOME": tmp}
+        ):
+            os.environ.pop("ID_ALLOCATOR_PATH", None)
+            allocator = build_id_allocator_from_env(BigQueryClient(client=FakeGoogleClient(), cache=None))
+
+            self.assertEqual(os.path.dirname(allocator.path), os.path.join(tmp, "agro-server"))
+            self.assertEqual(os.stat(os.path.dirname(allocator.path)).st_mode & 0o777, 0o700)
+
+if __name__ == "__main__":
+    unittest.main()
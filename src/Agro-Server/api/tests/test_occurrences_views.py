@@ -0,0 +1,41 @@
+import unittest
+from unittest import mock
+
+from api import occurrences_views
+from clients.bigquery_client import BigQueryClient, KnownIds
+
+from .test_bigquery_client import FakeGoogleClient
+
+
+class OccurrenceReferencesTests(unittest.TestCase):
+    def setUp(self):
+        self.google_client = FakeGoogleClient(rows=[{"ref": 0, "id": "10"}])
+        self.client = BigQueryClient(
+            client=self.google_client,
+            cache=None,
+            known_ids=KnownIds(["unit", "occurrence_category"]),
+        )
+        patcher = mock.patch.object(occurrences_views, "client", self.client)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_known_unit_and_category_skip_the_lookup(self):
+        self.client.known_ids.add("unit", ["7"])
+        self.client.known_ids.add("occurrence_category", ["3"])
+
+        erro = occurrences_views._verificar_referencias({"travel_id": 10, "unit_id": 7, "category_id": 3})
+
+        self.assertIsNone(erro)
+        (sql, job_config), = self.google_client.queries
+        self.assertIn("`mock-project.agro_dataset.travel`", sql)
+        self.assertNotIn(".unit`", sql)
+        self.assertEqual(job_config.query_parameters[0].values, ["10"])
+
+    def test_all_known_references_send_no_query(self):
+        self.client.known_ids.add("unit", ["7"])
+        self.client.known_ids.add("occurrence_category", ["3"])
+
+        erro = occurrences_views._verificar_referencias({"unit_id": 7, "category_id": 3})
+
+        self.assertIsNone(erro)
+        self.assertEqual(self.google_client.queries, [])
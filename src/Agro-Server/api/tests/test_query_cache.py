@@ -0,0 +1,169 @@
+import os
+import pickle
+import stat
+import tempfile
+import time
+import unittest
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pyarrow as pa
+
+from clients.query_cache import (
+    MemoryQueryCache,
+    QueryCache,
+    ResultCache,
+    SqliteQueryCache,
+    cache_key,
+    diretorio_privado,
+    parse_table_ttls,
+    tables_in_query,
+)
+
+TRAVEL_SQL = "SELECT * FROM `proj.ds.travel` t LEFT JOIN `proj.ds.bill` b ON b.travel_id = t.id"
+
+
+class QueryCacheHelpersTests(unittest.TestCase):
+    def test_tables_in_query_ignores_project_and_dataset(self):
+        self.assertEqual(tables_in_query(TRAVEL_SQL), {"travel", "bill"})
+
+    def test_cache_key_ignores_whitespace_but_not_kind(self):
+        compact = cache_key("rows", "SELECT  1\n FROM x")
+        self.assertEqual(compact, cache_key("rows", "SELECT 1 FROM x"))
+        self.assertNotEqual(compact, cache_key("arrow:", "SELECT 1 FROM x"))
+
+    def test_parse_table_ttls(self):
+        self.assertEqual(parse_table_ttls("travel=300, Bill=60"), {"travel": 300.0, "bill": 60.0})
+
+
+class ResultCacheTests(unittest.TestCase):
+    def _make_cache(self, **kwargs) -> ResultCache:
+        return ResultCache(MemoryQueryCache(), **kwargs)
+
+    def test_hit_after_miss_and_invalidation_by_table(self):
+        cache = self._make_cache()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return [{"total": len(calls)}]
+
+        cache.get_or_compute("rows", TRAVEL_SQL, [], compute)
+        cache.get_or_compute("rows", TRAVEL_SQL, [], compute)
+        self.assertEqual(len(calls), 1)
+
+        self.assertEqual(cache.invalidate("bill"), 1)
+        self.assertEqual(cache.get_or_compute("rows", TRAVEL_SQL, [], compute), [{"total": 2}])
+
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+        self.assertEqual(stats["tables"]["travel"], {"hits": 1, "misses": 2})
+
+    def test_smallest_table_ttl_wins_and_zero_disables(self):
+        cache = self._make_cache(default_ttl=60, table_ttls={"bill": 0})
+        calls = []
+
+        cache.get_or_compute("rows", TRAVEL_SQL, [], lambda: calls.append(1))
+        cache.get_or_compute("rows", TRAVEL_SQL, [], lambda: calls.append(1))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_writes_are_never_cached(self):
+        cache = self._make_cache()
+        calls = []
+
+        for _ in range(2):
+            cache.get_or_compute("rows", "DELETE FROM `proj.ds.unit` WHERE id = @id", [], lambda: calls.append(1))
+
+        self.assertEqual(len(calls), 2)
+
+    def test_invalidation_during_compute_does_not_store_stale_result(self):
+        for backend in (MemoryQueryCache(), None):
+            with tempfile.TemporaryDirectory() as tmp:
+                cache = ResultCache(backend or SqliteQueryCache(os.path.join(tmp, "cache.sqlite3")))
+
+                def compute():
+                    cache.invalidate("bill")  # escrita concorrente enquanto a query roda
+                    return [{"total": 1}]
+
+                cache.get_or_compute("rows", TRAVEL_SQL, [], compute)
+
+                self.assertEqual(cache.stats()["entries"], 0)
+                cache.get_or_compute("rows", TRAVEL_SQL, [], lambda: [{"total": 2}])
+                self.assertEqual(cache.stats()["entries"], 1)
+
+
+class MemoryQueryCacheTests(unittest.TestCase):
+    def test_lru_eviction_and_expiration(self):
+        backend = MemoryQueryCache(max_entries=2)
+        backend.set("a", 1, 60, {"unit"})
+        backend.set("b", 2, 60, {"unit"})
+        backend.get("a")
+        backend.set("c", 3, 60, {"unit"})
+
+        self.assertEqual(backend.get("b"), (False, None))
+        self.assertEqual(backend.get("a"), (True, 1))
+
+        backend.set("d", 4, 0.01, {"unit"})
+        time.sleep(0.02)
+        self.assertEqual(backend.get("d"), (False, None))
+
+    def test_backend_interface_is_abstract(self):
+        class SemGeracoes(QueryCache):
+            get = set = invalidate_tables = clear = __len__ = lambda self, *args: None
+
+        with self.assertRaises(TypeError):
+            QueryCache()
+        with self.assertRaises(TypeError):
+            SemGeracoes()
+
+
+class SqliteQueryCacheTests(unittest.TestCase):
+    def test_entries_are_shared_through_the_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite3")
+            writer = SqliteQueryCache(path)
+            reader = SqliteQueryCache(path)
+
+            writer.set("k", [{"id": "1"}], 60, {"unit", "travel"})
+            self.assertEqual(reader.get("k"), (True, [{"id": "1"}]))
+
+            self.assertEqual(reader.invalidate_tables({"travel"}), 1)
+            self.assertEqual(writer.get("k"), (False, None))
+            self.assertEqual(len(writer), 0)
+
+    def test_values_round_trip_without_pickle(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = SqliteQueryCache(os.path.join(tmp, "cache.sqlite3"))
+            rows = [{
+                "quando": datetime(2025, 1, 2, 3, 4, 5, tzinfo=timezone.utc), "dia": date(2025, 1, 2),
+                "valor": Decimal("1.50"), "bruto": b"\x00\x01", "tags": ["a"], "n": 1, "x": None,
+            }]
+            table = pa.table({"id": [1, 2], "nome": ["a", None]})
+
+            cache.set("rows", rows, 60, {"travel"})
+            cache.set("arrow", table, 60, {"travel"})
+            self.assertFalse(cache.set("objeto", [object()], 60, {"travel"}))
+
+            self.assertEqual(cache.get("rows"), (True, rows))
+            self.assertTrue(cache.get("arrow")[1].equals(table))
+            self.assertEqual(cache.get("objeto"), (False, None))
+
+            # entrada gravada em pickle (formato antigo ou arquivo adulterado) nunca é desserializada
+            cache._conn.execute("UPDATE cache_entries SET value = ? WHERE key = 'rows'", (pickle.dumps(rows),))
+            self.assertEqual(cache.get("rows"), (False, None))
+
+    def test_private_directory_is_0700(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache")
+            os.makedirs(path, mode=0o777)
+            os.chmod(path, 0o777)
+
+            diretorio_privado(path)
+
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+
+
+if __name__ == "__main__":
+    unittest.main()
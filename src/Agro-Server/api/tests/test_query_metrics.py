@@ -0,0 +1,34 @@
+import unittest
+
+from clients.query_metrics import QueryRecord, QueryRecorder, percentile, sql_fingerprint
+
+
+class QueryMetricsTests(unittest.TestCase):
+    def test_fingerprint_ignores_whitespace_and_literals(self):
+        a = sql_fingerprint("SELECT * FROM `t`\n  WHERE id = 1 AND name = 'Ana'")
+        b = sql_fingerprint("SELECT * FROM `t` WHERE id = 42 AND name = 'Bia'")
+        c = sql_fingerprint("SELECT * FROM `u` WHERE id = 1")
+
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_percentile_nearest_rank(self):
+        values = list(range(1, 101))
+
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertIsNone(percentile([], 50))
+
+    def test_ring_buffer_keeps_latest_records(self):
+        recorder = QueryRecorder(max_records=2)
+        for wall in (1.0, 2.0, 3.0):
+            recorder.record(QueryRecord(fingerprint="f", sql="SELECT 1", view=None, wall_ms=wall, slot_ms=10))
+
+        self.assertEqual([r.wall_ms for r in recorder.records()], [2.0, 3.0])
+        (summary,) = recorder.summary()
+        self.assertEqual((summary["count"], summary["slot_ms"], summary["p50_ms"]), (2, 20, 2.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
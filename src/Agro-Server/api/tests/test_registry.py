@@ -0,0 +1,49 @@
+import threading
+import unittest
+from unittest import mock
+
+from clients.registry import ClientRegistry, LazyClient, LazyModule, http_pool_size
+
+
+class ClientRegistryTests(unittest.TestCase):
+    def test_factory_runs_once_across_threads(self):
+        calls = []
+        registry = ClientRegistry()
+        registry.register("bq", lambda: calls.append(1) or object())
+
+        instances = []
+        threads = [threading.Thread(target=lambda: instances.append(registry.get("bq"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(i) for i in instances}), 1)
+        self.assertEqual(registry.stats()["initialized"], ["bq"])
+
+    def test_lazy_client_resolves_on_first_use_and_forwards_setattr(self):
+        class Dummy:
+            dataset_id = "a"
+
+        registry = ClientRegistry()
+        registry.register("bq", Dummy)
+        proxy = LazyClient("bq", registry)
+        self.assertEqual(registry.stats()["initialized"], [])
+
+        proxy.dataset_id = "b"
+        self.assertEqual(registry.get("bq").dataset_id, "b")
+        self.assertEqual(proxy.dataset_id, "b")
+
+    def test_lazy_module_imports_on_attribute_access(self):
+        self.assertEqual(LazyModule("json").dumps([1]), "[1]")
+
+    def test_pool_size_follows_server_threads(self):
+        with mock.patch.dict("os.environ", {"SERVER_THREADS": "16"}, clear=False):
+            self.assertEqual(http_pool_size(extra_threads=9), 25)
+        with mock.patch.dict("os.environ", {"HTTP_POOL_SIZE": "4", "SERVER_THREADS": "16"}, clear=False):
+            self.assertEqual(http_pool_size(extra_threads=9), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
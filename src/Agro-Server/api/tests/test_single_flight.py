@@ -0,0 +1,137 @@
+import threading
+import time
+import unittest
+
+from clients.bigquery_client import BigQueryClient, QueryBuilder, QueryTimeout
+from clients.query_metrics import QueryRecorder
+from clients.single_flight import EsperaExpirada, SingleFlight
+
+from .test_bigquery_client import FakeGoogleClient
+
+
+def _wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condição não atingida a tempo")
+        time.sleep(0.005)
+
+
+class BlockingGoogleClient(FakeGoogleClient):
+    """Segura cada job até `release` ser sinalizado."""
+
+    def __init__(self, rows):
+        super().__init__(rows)
+        self.release = threading.Event()
+
+    def query(self, sql, job_config=None, **kwargs):
+        job = super().query(sql, job_config, **kwargs)
+        self.release.wait(5)
+        return job
+
+
+class SingleFlightTests(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        calls, results = [], []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return "valor"
+
+        threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        _wait_for(lambda: flight.stats()["waiting"] == 3)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(results), [("valor", False)] + [("valor", True)] * 3)
+        self.assertEqual(flight.stats()["coalesced"], 3)
+        self.assertEqual(flight.stats()["in_flight"], 0)
+
+    def test_error_reaches_waiters_and_key_is_released(self):
+        flight = SingleFlight()
+
+        with self.assertRaises(RuntimeError):
+            flight.do("k", lambda: (_ for _ in ()).throw(RuntimeError("falhou")))
+
+        self.assertEqual(flight.do("k", lambda: 1), (1, False))
+        self.assertEqual(flight.stats()["errors"], 1)
+
+    def test_waiter_gives_up_after_its_own_timeout(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        results = []
+
+        leader = threading.Thread(target=lambda: results.append(flight.do("k", lambda: release.wait(5))))
+        leader.start()
+        _wait_for(lambda: flight.stats()["in_flight"] == 1)
+
+        with self.assertRaises(EsperaExpirada):
+            flight.do("k", lambda: None, timeout=0.05)
+        self.assertEqual(flight.stats()["waiting"], 0)
+
+        release.set()
+        leader.join()
+        self.assertEqual(results, [(True, False)])
+
+
+class BigQueryClientCoalescingTests(unittest.TestCase):
+    def setUp(self):
+        self.google_client = BlockingGoogleClient(rows=[{"id": "1"}])
+        self.client = BigQueryClient(client=self.google_client, cache=None, single_flight=SingleFlight())
+        self.client.recorder = QueryRecorder()
+
+    def _concurrent(self, fn, count=5):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(fn())) for _ in range(count)]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_identical_reads_submit_a_single_job(self):
+        builder = QueryBuilder()
+        builder.param("unit_id", "7")
+        threads, results = self._concurrent(
+            lambda: self.client.executar_query("SELECT * FROM `p.d.travel` WHERE unit_id = @unit_id", builder)
+        )
+        _wait_for(lambda: self.client.single_flight.stats()["waiting"] == 4)
+        self.google_client.release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.google_client.queries), 1)
+        self.assertEqual(results, [[{"id": "1"}]] * 5)
+        self.assertEqual(len(self.client.recorder.records()), 1)
+
+    def test_waiter_times_out_on_its_own_deadline(self):
+        sql = "SELECT * FROM `p.d.travel`"
+        threads, results = self._concurrent(lambda: self.client.executar_query(sql), count=1)
+        _wait_for(lambda: self.client.single_flight.stats()["in_flight"] == 1)
+
+        with self.client.prazo(0.05):
+            with self.assertRaises(QueryTimeout) as raised:
+                self.client.executar_query(sql)
+
+        self.assertIsNone(raised.exception.job_id)
+        self.google_client.release.set()
+        threads[0].join()
+        # o job compartilhado seguiu e serviu quem o submeteu
+        self.assertEqual(results, [[{"id": "1"}]])
+        self.assertEqual(len(self.google_client.queries), 1)
+
+    def test_different_params_and_dml_are_not_coalesced(self):
+        self.google_client.release.set()
+        for unit_id in ("1", "2"):
+            builder = QueryBuilder()
+            builder.param("unit_id", unit_id)
+            self.client.executar_query("SELECT * FROM `p.d.travel` WHERE unit_id = @unit_id", builder)
+
+        self.assertIsNone(self.client._chave_single_flight("DELETE FROM `p.d.travel` WHERE TRUE"))
+        self.assertEqual(len(self.google_client.queries), 2)
+        self.assertEqual(self.client.single_flight.stats()["coalesced"], 0)
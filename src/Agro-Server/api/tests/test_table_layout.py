@@ -0,0 +1,112 @@
+import unittest
+from types import SimpleNamespace
+
+from google.api_core import exceptions as gcloud_exceptions
+
+from clients.bigquery_client import BigQueryClient
+from clients.query_cache import MemoryQueryCache, ResultCache
+from clients.query_metrics import QueryRecorder
+from clients.table_layout import CRIAR, MIGRAR, OK, RETOMAR, TableLayoutManager, medir_poda
+
+from .test_bigquery_client import FakeGoogleClient
+
+
+def _table(field=None, clustering=None, datetime_type="TIMESTAMP"):
+    partitioning = SimpleNamespace(field=field, type_="DAY") if field else None
+    return SimpleNamespace(
+        time_partitioning=partitioning,
+        clustering_fields=clustering,
+        schema=[SimpleNamespace(name="id", field_type="STRING"), SimpleNamespace(name="datetime", field_type=datetime_type)],
+        num_bytes=1024,
+    )
+
+
+class FakeTablesClient(FakeGoogleClient):
+    def __init__(self, tables):
+        super().__init__()
+        self.tables = tables
+
+    def get_table(self, ref):
+        table_id = ref.split(".")[-1]
+        if table_id not in self.tables:
+            raise gcloud_exceptions.NotFound(ref)
+        return self.tables[table_id]
+
+
+class TableLayoutManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.google_client = FakeTablesClient({
+            "travel": _table(),
+            "bill": _table("datetime", ["travel_id"]),
+        })
+        self.client = BigQueryClient(client=self.google_client, cache=ResultCache(MemoryQueryCache()))
+        self.client.dataset_id = "dataset"
+        self.client.recorder = QueryRecorder()
+        self.manager = TableLayoutManager(self.client)
+
+    def test_plan_detects_missing_and_unpartitioned_tables(self):
+        actions = {status.table_id: status.action for status in self.manager.plano()}
+
+        self.assertEqual(actions, {"travel": MIGRAR, "bill": OK, "occurrence": CRIAR})
+
+    def test_migration_copies_renames_and_keeps_backup(self):
+        statements = self.manager.statements(self.manager.inspecionar("travel"), suffix="20250101")
+
+        self.assertEqual(len(statements), 4)
+        self.assertIn("CREATE OR REPLACE TABLE `mock-project.dataset.travel__layout`", statements[0])
+        self.assertIn("PARTITION BY DATE(datetime)\nCLUSTER BY unit_id", statements[0])
+        self.assertIn("AS SELECT * FROM `mock-project.dataset.travel`", statements[0])
+        self.assertIn("INSERT INTO `mock-project.dataset.travel__layout`", statements[1])
+        self.assertIn("WHERE NOT EXISTS (SELECT 1 FROM `mock-project.dataset.travel__layout` AS s WHERE s.id = t.id)", statements[1])
+        self.assertEqual(
+            statements[2:],
+            [
+                "ALTER TABLE `mock-project.dataset.travel` RENAME TO `travel__backup_20250101`",
+                "ALTER TABLE `mock-project.dataset.travel__layout` RENAME TO `travel`",
+            ],
+        )
+
+    def test_string_datetime_is_cast_during_migration(self):
+        self.google_client.tables["travel"] = _table(datetime_type="STRING")
+
+        statements = self.manager.statements(self.manager.inspecionar("travel"), suffix="x")
+
+        self.assertIn("SELECT * REPLACE (TIMESTAMP(datetime) AS datetime)", statements[0])
+        self.assertIn("SELECT * REPLACE (TIMESTAMP(datetime) AS datetime)", statements[1])
+
+    def test_apply_finishes_migration_interrupted_before_last_rename(self):
+        # a original já virou backup; a cópia com o layout novo ainda não tem o nome final
+        self.google_client.tables["occurrence__layout"] = _table("datetime", ["unit_id", "travel_id"])
+
+        status = self.manager.inspecionar("occurrence")
+        results = self.manager.aplicar(["occurrence"])
+
+        self.assertEqual(status.action, RETOMAR)
+        self.assertTrue(results[0]["applied"])
+        self.assertEqual(
+            [sql for sql, _ in self.google_client.queries],
+            ["ALTER TABLE `mock-project.dataset.occurrence__layout` RENAME TO `occurrence`"],
+        )
+
+    def test_apply_runs_ddl_only_for_tables_out_of_layout(self):
+        results = self.manager.aplicar(["bill", "occurrence"])
+
+        self.assertEqual([r["applied"] for r in results], [False, True])
+        self.assertEqual(len(self.google_client.queries), 1)
+        self.assertIn("CREATE TABLE IF NOT EXISTS `mock-project.dataset.occurrence`", self.google_client.queries[0][0])
+        self.assertEqual(self.google_client.queries[0][1].priority, "BATCH")
+        self.assertIn("CLUSTER BY unit_id, travel_id", self.google_client.queries[0][0])
+
+    def test_dry_run_does_not_execute(self):
+        results = self.manager.aplicar(dry_run=True)
+
+        self.assertEqual(self.google_client.queries, [])
+        self.assertTrue(all(not r["applied"] for r in results))
+
+    def test_medir_poda_compares_filtered_and_full_scan(self):
+        estimates = iter([100, 1000])
+        self.client.estimar_bytes = lambda sql, params=None: next(estimates)
+
+        report = medir_poda(self.client, [("q", "SELECT 1 WHERE x", None, "SELECT 1", None)])
+
+        self.assertEqual(report, [{"query": "q", "bytes_filtered": 100, "bytes_full_scan": 1000, "ratio": 0.1, "pruned": True}])
@@ -0,0 +1,94 @@
+import threading
+import time
+import unittest
+
+from clients.bigquery_client import BigQueryClient
+from clients.table_registry import TableRegistry
+
+from .test_bigquery_client import FakeGoogleClient
+
+
+class TableRegistryTests(unittest.TestCase):
+    def test_first_access_does_not_wait_for_the_load(self):
+        release = threading.Event()
+        calls = []
+
+        def loader():
+            calls.append(1)
+            release.wait(2)
+            return {"Travel": {"ID", "datetime"}}
+
+        registry = TableRegistry(loader)
+        self.assertIsNone(registry.existe("travel"))  # carga em andamento: "não sei"
+        release.set()
+        deadline = time.monotonic() + 2
+        while not registry.stats()["loaded"] and time.monotonic() < deadline:
+            time.sleep(0.005)
+
+        self.assertTrue(registry.existe("project.dataset.travel"))
+        self.assertFalse(registry.existe("bill"))
+        self.assertTrue(registry.tem_coluna("travel", "id"))
+        self.assertFalse(registry.tem_coluna("travel", "unit_id"))
+        self.assertEqual(len(calls), 1)
+
+    def test_stale_registry_answers_and_refreshes_in_background(self):
+        loaded = threading.Event()
+        snapshots = iter([{"travel": set()}, {"travel": set(), "bill": set()}])
+
+        def loader():
+            value = next(snapshots)
+            if "bill" in value:
+                loaded.set()
+            return value
+
+        registry = TableRegistry(loader, ttl=0.01)
+        registry.atualizar()
+        self.assertFalse(registry.existe("bill"))
+        time.sleep(0.02)
+
+        self.assertFalse(registry.existe("bill"))  # valor antigo, atualização disparada
+        self.assertTrue(loaded.wait(2))
+        deadline = time.monotonic() + 2
+        while not registry.existe("bill") and time.monotonic() < deadline:
+            time.sleep(0.005)
+        self.assertTrue(registry.existe("bill"))
+
+    def test_loader_failure_means_unknown(self):
+        registry = TableRegistry(lambda: (_ for _ in ()).throw(RuntimeError("sem permissão")))
+
+        self.assertFalse(registry.atualizar())
+        self.assertIsNone(registry.existe("bill"))
+        self.assertEqual(registry.stats()["failures"], 1)
+
+    def test_marcar_ausente_updates_immediately(self):
+        registry = TableRegistry(lambda: {"bill": {"id"}}, ttl=3600)
+        registry.atualizar()
+        self.assertTrue(registry.existe("bill"))
+        registry.loader = lambda: {}
+
+        registry.marcar_ausente("bill")
+
+        self.assertFalse(registry.existe("bill"))
+
+
+class BigQueryClientTableRegistryTests(unittest.TestCase):
+    def test_registry_loads_with_one_information_schema_query(self):
+        google_client = FakeGoogleClient(rows=[
+            {"table_name": "travel", "column_name": "id"},
+            {"table_name": "travel", "column_name": "datetime"},
+            {"table_name": "unit", "column_name": "id"},
+        ])
+        client = BigQueryClient(client=google_client, cache=None)
+
+        self.assertTrue(client.tabelas.atualizar())
+
+        self.assertTrue(client.tabela_existe("travel"))
+        self.assertFalse(client.tabela_existe("bill"))
+        self.assertEqual(client.tabelas.colunas("travel"), {"id", "datetime"})
+        (sql, _), = google_client.queries
+        self.assertIn("`mock-project.agro_dataset`.INFORMATION_SCHEMA.COLUMNS", sql)
+
+    def test_unknown_metadata_assumes_table_exists(self):
+        client = BigQueryClient(client=FakeGoogleClient(), cache=None)
+
+        self.assertTrue(client.tabela_existe("bill"))
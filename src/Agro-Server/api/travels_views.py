@@ -1,16 +1,29 @@
 """
 Views para rotas de Viagens (Travels)
 """
-from typing import List
+import logging
+from typing import TYPE_CHECKING, Iterable, Iterator, List
 
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from google.api_core import exceptions as gcloud_exceptions
 
-from clients.bigquery_client import BigQueryClient
-from .helpers import build_datetime_filters, parse_iso_datetime
+from clients.bigquery_client import QueryBuilder, QueryTimeout, keyset_condition
+from clients.registry import BIGQUERY, lazy_client
+from .helpers import (
+    KeysetPage,
+    build_datetime_filters,
+    parse_iso_datetime,
+    parse_limit,
+    streaming_json_response,
+)
+
+if TYPE_CHECKING:
+    import pyarrow as pa
 
-client = BigQueryClient()
+logger = logging.getLogger(__name__)
+
+client = lazy_client(BIGQUERY)
 
 TABLE_NAME = "travel"
 UNIT_TABLE = "unit"
@@ -20,17 +33,17 @@ _COST_EXPRESSION = (
     "COALESCE(b.fix_cost + COALESCE(b.variable_km, 0) * "
     "COALESCE(t.full_distance, 0), 0)"
 )
+_TRAVEL_FLOATS = ("full_distance", "bill_total_cost")
 
 
-def _build_travel_filters(request) -> List[str]:
+def _build_travel_filters(request, builder: QueryBuilder) -> List[str]:
     start_dt = parse_iso_datetime(request.GET.get("start_date"))
     end_dt = parse_iso_datetime(request.GET.get("end_date"))
-    filters = build_datetime_filters("t.datetime", start_dt, end_dt)
+    filters = build_datetime_filters("t.datetime", start_dt, end_dt, builder)
 
     unit_id = request.GET.get("unit_id")
-    print(f"PAPAI TÁ AQUI Ó A SUA LINDEZA: ", unit_id)
     if unit_id:
-        filters.append(f"t.unit_id = '{unit_id}'")
+        filters.append(f"t.unit_id = {builder.param('unit_id', unit_id, 'STRING')}")
     return filters
 
 
@@ -61,57 +74,76 @@ def _build_travel_query(where_clause: str, include_bill: bool) -> str:
         LEFT JOIN `{client.table_ref(UNIT_TABLE)}` u ON u.id = t.unit_id
         {bill_join}
         {where_clause}
-        ORDER BY t.datetime DESC
+        ORDER BY t.datetime DESC, t.id DESC
     """
 
 
 @csrf_exempt
 def listar_travels(request):
-    """GET /api/travels - Lista viagens com filtros de data."""
+    """GET /api/travels - Lista viagens com filtros de data.
+
+    Paginação por cursor: envie o `next_cursor` da resposta anterior em `?cursor=`.
+    """
     if request.method != "GET":
         return JsonResponse({"erro": "Método não permitido"}, status=405)
 
     try:
-        print("SEGUE AQUI A REQUEST DE api/travels: ", request)
-        limit = request.GET.get("limit")
-        try:
-            limit_value = int(limit) if limit else 100
-        except ValueError:
-            limit_value = 100
-
-        filters = _build_travel_filters(request)
-        where_clause = f"WHERE {' AND '.join(filters)}" if filters else ""
-
-        query_with_bill = _build_travel_query(where_clause, include_bill=True) + f" LIMIT {limit_value}"
-        query_without_bill = _build_travel_query(where_clause, include_bill=False) + f" LIMIT {limit_value}"
-
+        logger.debug("listar_travels: %s", request.GET.dict())
+        limit_value = parse_limit(request.GET.get("limit"), 100)
+        cursor = request.GET.get("cursor")
+
+        builder = QueryBuilder()
+        filters = _build_travel_filters(request, builder)
+        if cursor:
+            filters.append(keyset_condition(builder, cursor, "t.datetime", "t.id", descending=True))
+        where_clause = builder.where(filters)
+        limit_clause = f" LIMIT {builder.param('limit', limit_value, 'INT64')}"
+
+        # registro de tabelas decide antes: sem `bill`, nem tenta o JOIN
+        bill_available = client.tabela_existe(BILL_TABLE)
         try:
-            results = client.executar_query(query_with_bill)
-            bill_available = True
+            batches = client.query_arrow_iter(
+                _build_travel_query(where_clause, include_bill=bill_available) + limit_clause,
+                builder,
+                float_columns=_TRAVEL_FLOATS,
+            )
         except gcloud_exceptions.NotFound:
-            results = client.executar_query(query_without_bill)
+            if not bill_available:
+                raise
+            # rede de segurança: o registro ainda não sabia que `bill` sumiu
+            client.tabela_ausente(BILL_TABLE)
             bill_available = False
-
-        for row in results:
-            full_distance = row.get("full_distance")
-            if full_distance is not None:
-                row["full_distance"] = float(full_distance)
-
-            bill_cost = row.get("bill_total_cost")
-            if bill_cost is not None:
-                row["bill.total_cost"] = float(bill_cost)
-                row["total_cost"] = float(bill_cost)
-            else:
-                row["bill.total_cost"] = None
-                row["total_cost"] = None
-
-        return JsonResponse(
-            {
-                "status": "ok",
-                "data": results,
-                "count": len(results),
+            batches = client.query_arrow_iter(
+                _build_travel_query(where_clause, include_bill=False) + limit_clause,
+                builder,
+                float_columns=_TRAVEL_FLOATS,
+            )
+
+        page = KeysetPage(_serialize_travels(batches), limit_value, order_key="datetime")
+        return streaming_json_response(
+            page,
+            extra=lambda: {
                 "bill_table_available": bill_available,
-            }
+                "next_cursor": page.next_cursor(),
+            },
         )
+    except QueryTimeout as e:
+        return JsonResponse({"erro": str(e)}, status=504)
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
+
+
+def _serialize_travels(batches: Iterable["pa.RecordBatch"]) -> Iterator[dict]:
+    """Replica o custo da fatura em `bill.total_cost`/`total_cost` lote a lote."""
+    # import tardio: só a listagem em Arrow paga o import do pyarrow
+    import pyarrow as pa
+
+    for batch in batches:
+        bill_cost = batch.column("bill_total_cost")
+        batch = pa.RecordBatch.from_arrays(
+            batch.columns + [bill_cost, bill_cost],
+            names=batch.schema.names + ["bill.total_cost", "total_cost"],
+        )
+        yield from batch.to_pylist()
@@ -4,10 +4,12 @@ Views para rotas de Unidades Operacionais
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from clients.bigquery_client import BigQueryClient
+from clients.bigquery_client import QueryBuilder
+from clients.registry import BIGQUERY, lazy_client
+from clients.id_allocator import get_id_allocator
 from utils.validators import validar_unit, validar_id
 
-client = BigQueryClient()
+client = lazy_client(BIGQUERY)
 TABLE_NAME = "unit"
 
 @csrf_exempt
@@ -21,22 +23,34 @@ def unidades_view(request, unit_id=None):
         return JsonResponse({"erro": "Método não permitido"}, status=405)
 
 def listar_units(request):
-    """GET /api/units - Lista todas as unidades"""
+    """GET /api/units - Lista todas as unidades
+
+    Paginação por cursor: envie o `next_cursor` da resposta anterior em `?cursor=`.
+    `offset` continua aceito por compatibilidade, mas fica mais caro a cada página.
+    """
     
     try:
         limit = request.GET.get("limit")
         offset = request.GET.get("offset", 0)
+        cursor = request.GET.get("cursor")
         
         limit = int(limit) if limit else None
         offset = int(offset) if offset else 0
         
-        units = client.listar(TABLE_NAME, limit=limit, offset=offset)
+        next_cursor = None
+        if offset:
+            units = client.listar(TABLE_NAME, limit=limit, offset=offset)
+        else:
+            units, next_cursor = client.listar_cursor(TABLE_NAME, limit=limit, cursor=cursor)
         
         return JsonResponse({
             "status": "ok",
             "data": units,
-            "count": len(units)
+            "count": len(units),
+            "next_cursor": next_cursor
         })
+    except ValueError as e:
+        return JsonResponse({"erro": str(e)}, status=400)
     except Exception as e:
         return JsonResponse({"erro": str(e)}, status=500)
 
@@ -92,16 +106,10 @@ def criar_unit(request):
             "description": data.get("description", "")
         }
         
-        # Se não tiver ID, o BigQueryClient gera UUID, mas para UNIT precisamos de int
-        # Vamos buscar o próximo ID disponível
+        # Se não tiver ID, o BigQueryClient gera UUID, mas para UNIT precisamos de int:
+        # o próximo ID vem de um bloco reservado pelo alocador de sequência
         if "id" not in data:
-            # Busca o maior ID existente e incrementa
-            existing = client.listar(TABLE_NAME, limit=1000)
-            if existing:
-                max_id = max([int(u.get("id", 0)) for u in existing if u.get("id")], default=0)
-                row["id"] = str(max_id + 1)
-            else:
-                row["id"] = "1"
+            row["id"] = str(get_id_allocator(client).next_id(TABLE_NAME))
         else:
             row["id"] = str(data["id"])
         
@@ -195,18 +203,16 @@ def stats_unit(request, unit_id):
         if not valido:
             return JsonResponse({"erro": msg}, status=400)
         
-        # Verifica se a unidade existe
-        unit = client.buscar_por_id(TABLE_NAME, str(unit_id))
-        if not unit:
-            return JsonResponse({"erro": "Unidade não encontrada"}, status=404)
-        
+        builder = QueryBuilder()
+        unit_param = builder.param("unit_id", unit_id)
+
         # Query para estatísticas de viagens (KM total)
         query_travels = f"""
         SELECT 
             COUNT(*) as total_viagens,
             COALESCE(SUM(full_distance), 0) as total_km
         FROM `{client.table_ref("TRAVEL")}`
-        WHERE unit_id = {unit_id}
+        WHERE unit_id = {unit_param}
         """
         
         # Query para estatísticas de ocorrências
@@ -214,11 +220,24 @@ def stats_unit(request, unit_id):
         SELECT 
             COUNT(*) as total_ocorrencias
         FROM `{client.table_ref("OCCURRENCE")}`
-        WHERE unit_id = {unit_id}
+        WHERE unit_id = {unit_param}
         """
         
-        travels_stats = client.executar_query(query_travels)
-        occurrences_stats = client.executar_query(query_occurrences)
+        # Busca a unidade e as estatísticas em paralelo
+        unit_query = client.montar_busca_por_id(TABLE_NAME, str(unit_id))
+        results = client.run_many({
+            "unit": unit_query,
+            "travels": (query_travels, builder),
+            "occurrences": (query_occurrences, builder),
+        })
+        
+        # Verifica se a unidade existe
+        unit = results["unit"][0] if results["unit"] else None
+        if not unit:
+            return JsonResponse({"erro": "Unidade não encontrada"}, status=404)
+        
+        travels_stats = results["travels"]
+        occurrences_stats = results["occurrences"]
         
         stats = {
             "unit_id": unit_id,
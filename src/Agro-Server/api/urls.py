@@ -7,6 +7,7 @@ from . import (
     bigquery_views,
     bills_views,
     dashboard_views,
+    metrics_views,
     occurrences_views,
     storage_views,
     travels_views,
@@ -22,10 +23,14 @@ urlpatterns = [
     path("api/bigquery/inserir/", bigquery_views.inserir_registro, name="inserir_registro"),
     path("api/bigquery/atualizar/", bigquery_views.atualizar_registro, name="atualizar_registro"),
     path("api/bigquery/remover/", bigquery_views.remover_registro, name="remover_registro"),
+    path("api/bigquery/atualizar-lote/", bigquery_views.atualizar_lote, name="atualizar_lote"),
+    path("api/bigquery/remover-lote/", bigquery_views.remover_lote, name="remover_lote"),
     path("api/bigquery/processar-raw/", bigquery_views.processar_arquivo_raw, name="processar_arquivo_raw"),
+    path("api/bigquery/processar-raw-lote/", bigquery_views.processar_prefixo_raw, name="processar_prefixo_raw"),
     path("api/bigquery/view-diaria/", bigquery_views.criar_view_diaria, name="criar_view_diaria"),
     path("api/bigquery/view-mensal/", bigquery_views.criar_view_mensal, name="criar_view_mensal"),
     path("api/bigquery/exportar-view/", bigquery_views.exportar_view, name="exportar_view"),
+    path("api/bigquery/jobs/<str:job_id>/", bigquery_views.status_job, name="status_job"),
 
     # Storage
     path("api/storage/inserir/", storage_views.upload_arquivo, name="upload_arquivo"),
@@ -52,4 +57,8 @@ urlpatterns = [
     path("api/occurrences/<int:occurrence_id>/", occurrences_views.occurrence_detail_view, name="occurrence_detail_view"),
     path("api/occurrences/categories/", occurrences_views.listar_categories, name="listar_categories"),
     path("api/occurrences/stats/", occurrences_views.stats_occurrences, name="stats_occurrences"),
+
+    # Métricas internas
+    path("api/_metrics/cache/", metrics_views.cache_metrics, name="metrics_cache"),
+    path("api/_metrics/queries/", metrics_views.query_metrics, name="metrics_queries"),
 ]
@@ -1,5 +1,3 @@
 from .bigquery_client import BigQueryClient
 from .storage_client import CloudStorageClient
-
-bigquery_client = BigQueryClient()
-storage_client = CloudStorageClient()
+from .registry import get_bigquery_client, get_storage_client, lazy_client
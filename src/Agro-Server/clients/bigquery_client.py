@@ -1,13 +1,440 @@
+from __future__ import annotations
+
+import atexit
+import contextvars
 import os
+import base64
 import json
+import logging
+import re
+import threading
+import time
 import uuid
-from google.cloud import bigquery
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+from .insert_buffer import DEFAULT_MAX_ATTEMPTS, DEFAULT_MAX_DELAY, DEFAULT_MAX_ROWS, InsertBuffer
+from .query_cache import ResultCache, cache_key, get_result_cache, is_cacheable
+from .query_metrics import QueryRecord, get_query_recorder
+from .registry import LazyModule
+from .single_flight import EsperaExpirada, SingleFlight, get_single_flight
+from .table_registry import DEFAULT_TTL as DEFAULT_TABLE_REGISTRY_TTL, TableRegistry
+
+# importado no primeiro uso: views, comandos e testes não pagam o import do google.cloud
+bigquery = LazyModule("google.cloud.bigquery")
+
+logger = logging.getLogger(__name__)
+
+_IDENTIFIER_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+_ORDER_BY_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_.]*(\s+(ASC|DESC))?$", re.IGNORECASE)
+
+
+_BYTES_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*(B|KB|MB|GB|TB)?\s*$", re.IGNORECASE)
+_BYTES_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3, "TB": 1024 ** 4}
+
+# Orçamento (endpoint, máximo de bytes, dry-run) ativo no contexto atual; ver `BigQueryClient.orcamento`
+_orcamento_atual: contextvars.ContextVar[Optional[Tuple[str, int, bool]]] = contextvars.ContextVar(
+    "bigquery_orcamento", default=None
+)
+# Prazo (time.monotonic) das queries do contexto atual; ver `BigQueryClient.prazo`
+_prazo_atual: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("bigquery_prazo", default=None)
+
+PRIORIDADE_BATCH = "BATCH"
+
+
+class QueryBudgetExceeded(Exception):
+    """A consulta passou do orçamento de bytes do endpoint.
+
+    Com dry-run, `estimated_bytes` traz a estimativa e o job nem foi executado;
+    sem dry-run, o BigQuery recusou o job pelo `maximum_bytes_billed` e
+    `estimated_bytes` é None.
+    """
+
+    def __init__(self, endpoint: str, estimated_bytes: Optional[int], budget_bytes: int):
+        self.endpoint = endpoint
+        self.estimated_bytes = estimated_bytes
+        self.budget_bytes = budget_bytes
+        estimativa = f"estimada em {estimated_bytes / 1024 ** 3:.2f} GB " if estimated_bytes is not None else ""
+        super().__init__(
+            f"Consulta {estimativa}excede o limite de "
+            f"{budget_bytes / 1024 ** 3:.2f} GB do endpoint '{endpoint}'. "
+            "Refine os filtros (ex: start_date/end_date)."
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "erro": str(self),
+            "endpoint": self.endpoint,
+            "estimated_bytes": self.estimated_bytes,
+            "budget_bytes": self.budget_bytes,
+        }
+
+
+class QueryTimeout(TimeoutError):
+    """O job passou do prazo; o cancelamento já foi pedido ao BigQuery."""
+
+    def __init__(self, job_id: Optional[str], timeout: float):
+        self.job_id = job_id
+        self.timeout = timeout
+        if job_id is None:
+            # quem esperava o job idêntico de outra chamada: esse job continua
+            message = f"Consulta excedeu o prazo de {timeout:.0f}s esperando um job idêntico em andamento."
+        else:
+            message = f"Consulta excedeu o prazo de {timeout:.0f}s e foi cancelada (job {job_id})."
+        super().__init__(message)
+
+
+def parse_bytes(value: Optional[str]) -> Optional[int]:
+    """Converte '500MB', '10GB', '1024'... em bytes (None para vazio)."""
+    if value is None or not str(value).strip():
+        return None
+    match = _BYTES_RE.match(str(value))
+    if not match:
+        raise ValueError(f"Tamanho inválido: {value!r}")
+    number, unit = match.groups()
+    return int(float(number) * _BYTES_UNITS[(unit or "B").upper()])
+
+
+def parse_budgets(value: Optional[str]) -> Dict[str, int]:
+    """Converte 'travel_summary=20GB,exportar_view=1GB' em {endpoint: bytes}."""
+    budgets: Dict[str, int] = {}
+    for item in (value or "").split(","):
+        if not item.strip():
+            continue
+        endpoint, _, size = item.partition("=")
+        budgets[endpoint.strip()] = parse_bytes(size)
+    return budgets
+
+
+def tipo_bigquery(value: Any) -> str:
+    """Infere o tipo BigQuery de um valor Python para uso em parâmetros."""
+    if isinstance(value, bool):
+        return "BOOL"
+    if isinstance(value, int):
+        return "INT64"
+    if isinstance(value, float):
+        return "FLOAT64"
+    if isinstance(value, Decimal):
+        return "NUMERIC"
+    if isinstance(value, datetime):
+        return "TIMESTAMP"
+    if isinstance(value, date):
+        return "DATE"
+    return "STRING"
+
+
+def validar_identificador(nome: str) -> str:
+    """Garante que um nome de coluna pode ser usado diretamente no SQL."""
+    if not isinstance(nome, str) or not _IDENTIFIER_RE.match(nome):
+        raise ValueError(f"Identificador inválido: {nome!r}")
+    return nome
+
+
+def validar_order_by(order_by: str) -> str:
+    """Valida expressões simples de ordenação (ex.: 'id' ou 't.datetime DESC')."""
+    if not isinstance(order_by, str) or not _ORDER_BY_RE.match(order_by.strip()):
+        raise ValueError(f"Ordenação inválida: {order_by!r}")
+    return order_by.strip()
+
+
+def encode_cursor(order_value: Any, row_id: Any) -> str:
+    """Gera o token opaco de paginação a partir do último registro da página."""
+    payload = {
+        "v": [_cursor_json(order_value), tipo_bigquery(order_value) if order_value is not None else None],
+        "id": [_cursor_json(row_id), tipo_bigquery(row_id)],
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[Any, Optional[str], Any, str]:
+    """Decodifica um token de `encode_cursor` em (valor, tipo, id, tipo_id)."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        (value, value_type), (row_id, id_type) = payload["v"], payload["id"]
+        return _cursor_value(value, value_type), value_type, _cursor_value(row_id, id_type), id_type
+    except (ValueError, TypeError, KeyError) as exc:
+        raise ValueError("Cursor de paginação inválido") from exc
+
+
+def keyset_condition(
+    builder: "QueryBuilder",
+    cursor: str,
+    order_column: str = "id",
+    id_column: str = "id",
+    descending: bool = False,
+) -> str:
+    """Condição WHERE que retoma a listagem logo após o registro do cursor.
+
+    A ordenação é sempre `(order_column, id_column)`; no BigQuery NULLs vêm
+    primeiro em ASC e por último em DESC, e a condição respeita isso.
+    """
+    value, value_type, row_id, id_type = decode_cursor(cursor)
+    op = "<" if descending else ">"
+    id_param = builder.param("cursor_id", row_id, id_type)
+    if order_column == id_column:
+        return f"{id_column} {op} {id_param}"
+
+    if value is None:
+        if descending:
+            return f"({order_column} IS NULL AND {id_column} {op} {id_param})"
+        return f"(({order_column} IS NULL AND {id_column} {op} {id_param}) OR {order_column} IS NOT NULL)"
+
+    value_param = builder.param("cursor_value", value, value_type)
+    condition = (
+        f"{order_column} {op} {value_param} "
+        f"OR ({order_column} = {value_param} AND {id_column} {op} {id_param})"
+    )
+    if descending:
+        condition += f" OR {order_column} IS NULL"
+    return f"({condition})"
+
+
+def _cursor_json(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _cursor_value(value: Any, value_type: Optional[str]) -> Any:
+    if value is None:
+        return None
+    if value_type == "TIMESTAMP":
+        return datetime.fromisoformat(value)
+    if value_type == "DATE":
+        return date.fromisoformat(value)
+    if value_type == "NUMERIC":
+        return Decimal(value)
+    return value
+
+
+def cast_numeric_columns(data, float_columns: Iterable[str] = ()):
+    """Converte colunas NUMERIC/BIGNUMERIC (e as listadas em `float_columns`) para float64.
+
+    Aceita `pyarrow.Table` ou `pyarrow.RecordBatch` e faz a conversão de forma
+    vetorizada, coluna a coluna, em vez de chamar `float()` célula a célula.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    float_columns = set(float_columns)
+    columns = []
+    changed = False
+    for field, column in zip(data.schema, data.columns):
+        if pa.types.is_decimal(field.type) or (
+            field.name in float_columns and pa.types.is_integer(field.type)
+        ):
+            column = pc.cast(column, pa.float64())
+            changed = True
+        columns.append(column)
+
+    if not changed:
+        return data
+    names = data.schema.names
+    if isinstance(data, pa.RecordBatch):
+        return pa.RecordBatch.from_arrays(columns, names=names)
+    return pa.Table.from_arrays(columns, names=names)
+
+
+def _split_order_by(order_by: str) -> Tuple[str, bool]:
+    """Separa 'coluna [ASC|DESC]' em (coluna, descendente)."""
+    parts = validar_order_by(order_by).split()
+    column = parts[0]
+    validar_identificador(column)
+    return column, len(parts) > 1 and parts[1].upper() == "DESC"
+
+
+def _prazo_env(name: str, default: float) -> Optional[float]:
+    """Lê um prazo em segundos do ambiente; 0 (ou negativo) desliga."""
+    value = float(os.getenv(name, default))
+    return value if value > 0 else None
+
+
+def _limite_de_bytes_excedido(error: Exception) -> bool:
+    """True se o job falhou por passar do `maximum_bytes_billed`."""
+    reasons = [item.get("reason") for item in getattr(error, "errors", None) or [] if isinstance(item, dict)]
+    return "bytesBilledLimitExceeded" in reasons or "bytesBilledLimitExceeded" in str(error)
+
+
+class QueryBuilder:
+    """Acumula parâmetros nomeados para gerar SQL com texto estável.
+
+    Os valores nunca são interpolados no SQL: `param` devolve o marcador `@nome`
+    e o valor segue como `ScalarQueryParameter`/`ArrayQueryParameter`. Assim,
+    requisições idênticas geram exatamente o mesmo texto SQL e aproveitam o
+    cache de resultados do BigQuery.
+    """
 
-class BigQueryClient:
     def __init__(self):
-        # Opção 1: ler do .env JSON
+        self.parameters: List[Any] = []
+        self._names: set = set()
+
+    def param(self, name: str, value: Any, type_: Optional[str] = None) -> str:
+        """Registra um parâmetro escalar e retorna o marcador para o SQL."""
+        name = self._register(name)
+        self.parameters.append(
+            bigquery.ScalarQueryParameter(name, type_ or tipo_bigquery(value), value)
+        )
+        return f"@{name}"
+
+    def array_param(self, name: str, values: Iterable[Any], type_: Optional[str] = None) -> str:
+        """Registra um parâmetro do tipo ARRAY e retorna o marcador para o SQL."""
+        name = self._register(name)
+        values = list(values)
+        if type_ is None:
+            type_ = tipo_bigquery(values[0]) if values else "STRING"
+        self.parameters.append(bigquery.ArrayQueryParameter(name, type_, values))
+        return f"@{name}"
+
+    def struct_array_param(
+        self,
+        name: str,
+        rows: Sequence[dict],
+        columns: Sequence[str],
+        types: Optional[Dict[str, str]] = None,
+    ) -> str:
+        """Registra um ARRAY<STRUCT> com as `columns` de cada linha (para `UNNEST`).
+
+        O tipo de cada campo vem de `types` ou do primeiro valor não nulo da coluna.
+        """
+        name = self._register(name)
+        types = dict(types or {})
+        for column in columns:
+            validar_identificador(column)
+            if column not in types:
+                sample = next((row[column] for row in rows if row.get(column) is not None), None)
+                types[column] = tipo_bigquery(sample) if sample is not None else "STRING"
+
+        structs = [
+            bigquery.StructQueryParameter(
+                None,
+                *[bigquery.ScalarQueryParameter(column, types[column], row.get(column)) for column in columns],
+            )
+            for row in rows
+        ]
+        self.parameters.append(bigquery.ArrayQueryParameter(name, "STRUCT", structs))
+        return f"@{name}"
+
+    def where(self, conditions: Iterable[str]) -> str:
+        """Monta a cláusula WHERE a partir de condições já parametrizadas."""
+        conditions = [c for c in conditions if c]
+        return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    def job_config(self, **kwargs) -> bigquery.QueryJobConfig:
+        return bigquery.QueryJobConfig(query_parameters=list(self.parameters), **kwargs)
+
+    def _register(self, name: str) -> str:
+        validar_identificador(name)
+        if name in self._names:
+            raise ValueError(f"Parâmetro duplicado na query: {name!r}")
+        self._names.add(name)
+        return name
+
+
+class KnownIds:
+    """Conjunto em memória de ids já confirmados em tabelas de referência.
+
+    Só guarda ids existentes (nunca "não existe"). Remoções feitas por este
+    processo saem na hora (`forget`); as de outros processos/workers só são
+    percebidas quando a confirmação vence (`ttl` segundos). Cada tabela guarda no
+    máximo `max_ids` ids (os mais antigos saem primeiro). Os nomes de tabela
+    são usados exatamente como recebidos.
+    """
+
+    DEFAULT_TTL = 300.0
+    DEFAULT_MAX_IDS = 50_000
+
+    def __init__(self, tables: Iterable[str] = (), ttl: float = DEFAULT_TTL, max_ids: int = DEFAULT_MAX_IDS):
+        self.tables = set(tables)
+        self.ttl = ttl
+        self.max_ids = max_ids
+        # tabela -> {id: expira_em}, na ordem de confirmação
+        self._ids: Dict[str, "OrderedDict[str, float]"] = {}
+        self._lock = threading.Lock()
+
+    def tracks(self, table_id: str) -> bool:
+        return table_id in self.tables
+
+    def missing(self, table_id: str, ids: Iterable[str]) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            known = self._ids.get(table_id, {})
+            return [i for i in ids if known.get(i, 0.0) <= now]
+
+    def add(self, table_id: str, ids: Iterable[str]) -> None:
+        if not self.tracks(table_id) or self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            known = self._ids.setdefault(table_id, OrderedDict())
+            for i in ids:
+                known[i] = expires_at
+                known.move_to_end(i)
+            while len(known) > self.max_ids:
+                known.popitem(last=False)
+
+    def forget(self, table_id: str, ids: Optional[Iterable[Any]] = None) -> None:
+        with self._lock:
+            if ids is None:
+                self._ids.pop(table_id, None)
+                return
+            known = self._ids.get(table_id)
+            if known is not None:
+                for i in ids:
+                    known.pop(str(i), None)
+
+
+_known_ids: Optional[KnownIds] = None
+_known_ids_lock = threading.Lock()
+
+
+def get_known_ids() -> KnownIds:
+    """Conjunto de ids conhecidos compartilhado por todas as instâncias do processo."""
+    global _known_ids
+    with _known_ids_lock:
+        if _known_ids is None:
+            tables = os.getenv("BIGQUERY_KNOWN_ID_TABLES", "unit,occurrence_category")
+            _known_ids = KnownIds(
+                (t.strip() for t in tables.split(",") if t.strip()),
+                ttl=float(os.getenv("BIGQUERY_KNOWN_IDS_TTL", KnownIds.DEFAULT_TTL)),
+                max_ids=int(os.getenv("BIGQUERY_KNOWN_IDS_MAX", KnownIds.DEFAULT_MAX_IDS)),
+            )
+        return _known_ids
+
+
+class BigQueryClient:
+    DEFAULT_PAGE_SIZE = 1000
+    DEFAULT_MAX_CONCURRENT_QUERIES = 8
+    BATCH_DML_MAX_ROWS = 5000
+    # prazo de cada envio do buffer write-behind (as tentativas somadas ficam abaixo dos 30s do gunicorn)
+    DEFAULT_INSERT_TIMEOUT = 5.0
+    DEFAULT_BYTES_BUDGET = 10 * 1024 ** 3
+    # abaixo do timeout padrão do gunicorn (30s): o job é cancelado antes do worker morrer
+    DEFAULT_QUERY_TIMEOUT = 25.0
+    DEFAULT_BATCH_TIMEOUT = 1800.0
+    DEFAULT_LOAD_TIMEOUT = 1800.0
+    MAX_POLL_INTERVAL = 1.0
+
+    def __init__(
+        self,
+        client: Optional[bigquery.Client] = None,
+        cache: Optional[ResultCache] = None,
+        known_ids: Optional[KnownIds] = None,
+        single_flight: Optional[SingleFlight] = None,
+    ):
+        # Opção 0: client injetado (útil em testes e scripts)
         key_json_str = os.getenv("BIGQUERY_KEY_JSON")
-        if key_json_str:
+        if client is not None:
+            self.client = client
+        # Opção 1: ler do .env JSON
+        elif key_json_str:
             key_info = json.loads(key_json_str)
             self.client = bigquery.Client.from_service_account_info(key_info)
         else:
@@ -17,28 +444,84 @@ class BigQueryClient:
 
         # Defina seu dataset e tabela padrão
         self.dataset_id = os.getenv("BIGQUERY_DATASET_NAME", "agro_dataset")
+        self.page_size = int(os.getenv("BIGQUERY_PAGE_SIZE", self.DEFAULT_PAGE_SIZE))
+        self.use_storage_api = os.getenv("BIGQUERY_USE_STORAGE_API", "true").lower() == "true"
+        self._read_client = None
+        self.max_concurrent_queries = int(
+            os.getenv("BIGQUERY_MAX_CONCURRENT_QUERIES", self.DEFAULT_MAX_CONCURRENT_QUERIES)
+        )
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+        # Cache de resultados compartilhado entre as instâncias do processo
+        self.cache = cache if cache is not None else get_result_cache()
+        self.known_ids = known_ids if known_ids is not None else get_known_ids()
+        # Write-behind: `inserir` passa pelo buffer de inserções em lote
+        self.write_behind = os.getenv("BIGQUERY_WRITE_BEHIND", "false").lower() == "true"
+        self.insert_timeout = float(os.getenv("BIGQUERY_INSERT_TIMEOUT", self.DEFAULT_INSERT_TIMEOUT))
+        self.insert_max_attempts = int(os.getenv("BIGQUERY_WRITE_BEHIND_MAX_ATTEMPTS", DEFAULT_MAX_ATTEMPTS))
+        self._insert_buffer: Optional[InsertBuffer] = None
+        # Orçamentos de bytes por endpoint (BIGQUERY_BYTES_BUDGETS="endpoint=10GB,...")
+        default_budget = parse_bytes(os.getenv("BIGQUERY_DEFAULT_BYTES_BUDGET"))
+        self.default_bytes_budget = default_budget if default_budget is not None else self.DEFAULT_BYTES_BUDGET
+        self.bytes_budgets = parse_budgets(os.getenv("BIGQUERY_BYTES_BUDGETS"))
+        # Métricas por job (buffer circular + log estruturado)
+        self.recorder = get_query_recorder()
+        # Prazos (segundos; 0 desliga): interativo, prioridade BATCH e jobs de carga
+        self.query_timeout = _prazo_env("BIGQUERY_QUERY_TIMEOUT", self.DEFAULT_QUERY_TIMEOUT)
+        self.batch_timeout = _prazo_env("BIGQUERY_BATCH_TIMEOUT", self.DEFAULT_BATCH_TIMEOUT)
+        self.load_timeout = _prazo_env("BIGQUERY_LOAD_TIMEOUT", self.DEFAULT_LOAD_TIMEOUT)
+        # Leituras idênticas em andamento no processo viram um único job
+        self.single_flight = single_flight if single_flight is not None else get_single_flight()
+        # Tabelas/colunas do dataset (metadados, atualizados em segundo plano)
+        self.tabelas = TableRegistry(
+            self._carregar_tabelas,
+            ttl=float(os.getenv("BIGQUERY_TABLE_REGISTRY_TTL", DEFAULT_TABLE_REGISTRY_TTL)),
+        )
 
     def load_csv_from_gcs(self, gcs_uri: str, table_id: str):
         """Carrega um CSV do GCS para uma tabela do BigQuery."""
+        self.load_from_gcs(gcs_uri, table_id)
+        return f"Dados carregados com sucesso em {self.dataset_id}.{table_id}"
+
+    def load_from_gcs(
+        self,
+        gcs_uri: str,
+        table_id: str,
+        *,
+        source_format: str = "CSV",
+        write_disposition: str = "WRITE_TRUNCATE",
+    ):
+        """Carrega um arquivo do GCS (CSV ou PARQUET) numa tabela com um único job de carga.
+
+        Retorna o job concluído (`output_rows` traz as linhas carregadas). Em
+        WRITE_APPEND, colunas novas do arquivo são adicionadas à tabela.
+        """
         table_ref = self.client.dataset(self.dataset_id).table(table_id)
 
+        source_format = source_format.upper()
         job_config = bigquery.LoadJobConfig(
-            source_format=bigquery.SourceFormat.CSV,
-            skip_leading_rows=1,
-            autodetect=True,
-            write_disposition=bigquery.WriteDisposition.WRITE_TRUNCATE,
+            source_format=source_format,
+            write_disposition=write_disposition,
         )
+        if source_format == bigquery.SourceFormat.CSV:
+            job_config.skip_leading_rows = 1
+            job_config.autodetect = True
+        if write_disposition == bigquery.WriteDisposition.WRITE_APPEND:
+            job_config.schema_update_options = [bigquery.SchemaUpdateOption.ALLOW_FIELD_ADDITION]
 
+        # jobs de carga não têm prioridade (usam o pool compartilhado de carga, não slots de query)
         load_job = self.client.load_table_from_uri(
             gcs_uri, table_ref, job_config=job_config
         )
-        load_job.result()  # Espera a conclusão do job
+        self._aguardar(load_job, self.load_timeout)  # Espera a conclusão do job
 
         if load_job.errors:
             raise Exception(f"Erro no job de carga do BigQuery: {load_job.errors}")
 
-        return f"Dados carregados com sucesso em {self.dataset_id}.{table_id}"
-
+        self.invalidar_cache(table_id)
+        self.known_ids.forget(table_id)
+        self.tabelas.marcar_existente(table_id)
+        return load_job
 
     def table_ref(self, table_id):
         return f"{self.client.project}.{self.dataset_id}.{table_id}"
@@ -48,134 +531,693 @@ class BigQueryClient:
         if "id" not in row or not row["id"]:
             row["id"] = str(uuid.uuid4())
 
+        if self.write_behind:
+            # Espera o lote em que a linha entrou; erros da linha sobem daqui
+            future = self.inserir_async(row, table_id)
+            timeout = self._get_insert_buffer().max_delay + self.insert_timeout * self.insert_max_attempts
+            try:
+                future.result(timeout)
+            except FutureTimeoutError:
+                if future.done():
+                    raise  # o próprio envio falhou com timeout
+                raise TimeoutError(
+                    f"O lote de {table_id} não foi gravado em {timeout:.0f}s; a linha continua na fila "
+                    "e será reenviada (o insertId evita duplicata)."
+                ) from None
+            return {"status": "ok", "row": row}
+
         errors = self.client.insert_rows_json(self.table_ref(table_id), [row])
+        self.invalidar_cache(table_id)
         if errors:
             raise Exception(f"Erro ao inserir: {errors}")
         return {"status": "ok", "row": row}
 
+    def inserir_async(self, row: dict, table_id) -> Future:
+        """Enfileira o registro no buffer write-behind e retorna um Future.
+
+        O Future resolve com a linha inserida quando o lote da tabela for enviado
+        (`BIGQUERY_WRITE_BEHIND_MAX_ROWS` linhas ou `BIGQUERY_WRITE_BEHIND_MAX_DELAY_MS`),
+        ou com a exceção do erro daquela linha.
+        """
+        if "id" not in row or not row["id"]:
+            row["id"] = str(uuid.uuid4())
+        return self._get_insert_buffer().submit(table_id, row)
+
+    def _inserir_lote(self, table_id, rows: List[dict], row_ids: List[Optional[str]]):
+        """Streaming insert de um lote do buffer, com `insertId` para deduplicação.
+
+        Cada envio tem no máximo `insert_timeout` segundos, incluindo as retentativas
+        da biblioteca (cujo padrão iria a 600s); ao estourar, o buffer recoloca o lote.
+        """
+        errors = self.client.insert_rows_json(
+            self.table_ref(table_id),
+            rows,
+            row_ids=row_ids,
+            timeout=self.insert_timeout,
+            retry=bigquery.DEFAULT_RETRY.with_timeout(self.insert_timeout),
+        )
+        self.invalidar_cache(table_id)
+        return errors
+
+    def _get_insert_buffer(self) -> InsertBuffer:
+        with self._executor_lock:
+            if self._insert_buffer is None:
+                from google.api_core import exceptions as google_exceptions
+                from requests import exceptions as requests_exceptions
+
+                self._insert_buffer = InsertBuffer(
+                    self._inserir_lote,
+                    max_rows=int(os.getenv("BIGQUERY_WRITE_BEHIND_MAX_ROWS", DEFAULT_MAX_ROWS)),
+                    max_delay=float(os.getenv("BIGQUERY_WRITE_BEHIND_MAX_DELAY_MS", DEFAULT_MAX_DELAY * 1000)) / 1000,
+                    max_attempts=self.insert_max_attempts,
+                    # erros de prazo do envio: o lote volta para a fila
+                    retry_on=(
+                        TimeoutError,
+                        google_exceptions.RetryError,
+                        google_exceptions.DeadlineExceeded,
+                        requests_exceptions.Timeout,
+                    ),
+                )
+                # Não perde linhas enfileiradas quando o processo termina
+                atexit.register(self._insert_buffer.close, 5)
+            return self._insert_buffer
+
 
     def atualizar(self, row_id: str, updates: dict, table_id):
         """Atualiza registros da tabela por um campo id"""
+        builder = QueryBuilder()
         set_parts = []
         for k, v in updates.items():
-            if isinstance(v, (int, float)):
-                set_parts.append(f"{k} = {v}")
-            elif isinstance(v, bool):
-                set_parts.append(f"{k} = {str(v).upper()}")
-            elif v is None:
+            validar_identificador(k)
+            if v is None:
                 set_parts.append(f"{k} = NULL")
             else:
-                # Escapa aspas simples em strings
-                v_escaped = str(v).replace("'", "\\'")
-                set_parts.append(f"{k} = '{v_escaped}'")
-        
+                set_parts.append(f"{k} = {builder.param(f'u_{k}', v)}")
+
         set_expr = ", ".join(set_parts)
         query = f"""
         UPDATE `{self.table_ref(table_id)}`
         SET {set_expr}
-        WHERE id = '{row_id}'
+        WHERE id = {builder.param("id", row_id)}
         """
-        query_job = self.client.query(query)
-        query_job.result()  # espera a conclusão
+        self._executar_job(query, builder)  # espera a conclusão
+        self.invalidar_cache(table_id)
         return {"status": "ok", "updated_id": row_id}
 
     def remover(self, row_id: str, table_id):
         """Remove registros da tabela por um campo id"""
+        builder = QueryBuilder()
         query = f"""
         DELETE FROM `{self.table_ref(table_id)}`
-        WHERE id = '{row_id}'
+        WHERE id = {builder.param("id", row_id)}
         """
-        query_job = self.client.query(query)
-        query_job.result()
+        self._executar_job(query, builder)
+        self.invalidar_cache(table_id)
+        self.known_ids.forget(table_id, [row_id])
         return {"status": "ok", "deleted_id": row_id}
 
+    def atualizar_lote(self, updates: List[dict], table_id, types: Optional[Dict[str, str]] = None):
+        """Atualiza vários registros com um único MERGE em vez de um UPDATE por linha.
+
+        Cada item de `updates` traz o `id` e os campos a alterar. As linhas seguem
+        como um ARRAY<STRUCT> (`UNNEST(@updates)`); itens com o mesmo conjunto de
+        campos vão no mesmo MERGE e ids repetidos são combinados (o último vence).
+        `types` permite fixar o tipo BigQuery de colunas que só recebem NULL.
+        """
+        validar_identificador(table_id)
+        merged: Dict[Any, dict] = {}
+        for update in updates:
+            if "id" not in update or update["id"] in (None, ""):
+                raise ValueError("Todo item de 'updates' precisa do campo 'id'")
+            merged.setdefault(update["id"], {}).update(update)
+
+        groups: Dict[Tuple[str, ...], List[dict]] = {}
+        for row in merged.values():
+            columns = tuple(sorted(k for k in row if k != "id"))
+            if not columns:
+                raise ValueError(f"Nenhum campo para atualizar no id {row['id']!r}")
+            groups.setdefault(columns, []).append(row)
+
+        updated = 0
+        for columns, rows in groups.items():
+            for start in range(0, len(rows), self.BATCH_DML_MAX_ROWS):
+                chunk = rows[start:start + self.BATCH_DML_MAX_ROWS]
+                builder = QueryBuilder()
+                source = builder.struct_array_param("updates", chunk, ("id",) + columns, types)
+                set_expr = ", ".join(f"{column} = S.{column}" for column in columns)
+                query = f"""
+                MERGE `{self.table_ref(table_id)}` T
+                USING UNNEST({source}) S
+                ON T.id = S.id
+                WHEN MATCHED THEN UPDATE SET {set_expr}
+                """
+                query_job, _ = self._executar_job(query, builder)
+                updated += query_job.num_dml_affected_rows or 0
+
+        self.invalidar_cache(table_id)
+        return {"status": "ok", "updated": updated, "ids": list(merged)}
+
+    def remover_lote(self, ids: Iterable[Any], table_id):
+        """Remove vários registros com `DELETE ... WHERE id IN UNNEST(@ids)`."""
+        validar_identificador(table_id)
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise ValueError("Nenhum id informado para remoção")
+
+        deleted = 0
+        for start in range(0, len(ids), self.BATCH_DML_MAX_ROWS):
+            builder = QueryBuilder()
+            query = f"""
+            DELETE FROM `{self.table_ref(table_id)}`
+            WHERE id IN UNNEST({builder.array_param("ids", ids[start:start + self.BATCH_DML_MAX_ROWS])})
+            """
+            query_job, _ = self._executar_job(query, builder)
+            deleted += query_job.num_dml_affected_rows or 0
+
+        self.invalidar_cache(table_id)
+        self.known_ids.forget(table_id, ids)
+        return {"status": "ok", "deleted": deleted, "ids": ids}
+
+    def invalidar_cache(self, *table_ids) -> int:
+        """Descarta do cache os resultados de queries que leem as tabelas informadas."""
+        if self.cache is None:
+            return 0
+        return self.cache.invalidate(*table_ids)
+
+    def cache_stats(self) -> Optional[dict]:
+        """Contadores de hit/miss do cache de resultados (None se desligado)."""
+        return self.cache.stats() if self.cache is not None else None
+
+    def tabela_existe(self, table_id) -> bool:
+        """Consulta o registro de tabelas; na dúvida (metadados indisponíveis) assume que existe."""
+        return self.tabelas.existe(table_id) is not False
+
+    def tabela_ausente(self, table_id) -> None:
+        """Avisa o registro que um job deu `NotFound` para a tabela (registro desatualizado)."""
+        self.tabelas.marcar_ausente(table_id)
+
+    def _carregar_tabelas(self) -> Dict[str, set]:
+        """{tabela: {colunas}} do dataset numa única query em `INFORMATION_SCHEMA.COLUMNS`
+        (em vez de `list_tables` mais um `get_table` por tabela)."""
+        rows = self.executar_query(
+            f"SELECT table_name, column_name "
+            f"FROM `{self.client.project}.{self.dataset_id}`.INFORMATION_SCHEMA.COLUMNS",
+            use_cache=False,
+        )
+        tables: Dict[str, set] = {}
+        for row in rows:
+            tables.setdefault(row["table_name"], set()).add(row["column_name"])
+        return tables
+
+    def single_flight_stats(self) -> Optional[dict]:
+        """Contadores da coalescência de queries em andamento (None se desligada)."""
+        return self.single_flight.stats() if self.single_flight is not None else None
+
     def listar(self, table_id, limit=None, offset=0, order_by="id"):
         """Lista todos os registros da tabela"""
-        query = f"SELECT * FROM `{self.table_ref(table_id)}`"
-        if order_by:
-            query += f" ORDER BY {order_by}"
-        if limit:
-            query += f" LIMIT {limit}"
-        if offset and offset > 0:
-            query += f" OFFSET {offset}"
-
-        query_job = self.client.query(query)
-        results = query_job.result()
-        
-        rows = []
-        for row in results:
-            row_dict = dict(row)
-            rows.append(row_dict)
-        
-        return rows
+        return self.filtrar(table_id, {}, limit=limit, offset=offset, order_by=order_by)
 
     def buscar_por_id(self, table_id, row_id):
         """Busca um registro por ID"""
+        query, builder = self.montar_busca_por_id(table_id, row_id)
+        results = self.executar_query(query, builder)
+
+        if not results:
+            return None
+
+        return results[0]
+
+    def montar_busca_por_id(self, table_id, row_id):
+        """Monta o SELECT parametrizado de `buscar_por_id` e retorna (sql, builder)."""
+        builder = QueryBuilder()
         query = f"""
         SELECT * FROM `{self.table_ref(table_id)}`
-        WHERE id = '{row_id}'
+        WHERE id = {builder.param("id", row_id)}
         LIMIT 1
         """
-        query_job = self.client.query(query)
-        results = list(query_job.result())
-        
-        if not results:
-            return None
-        
-        return dict(results[0])
+        return query, builder
+
+    def exists_many(self, refs: Mapping[str, Iterable[Any]]) -> Dict[str, set]:
+        """Verifica de uma vez quais ids existem em cada tabela.
+
+        Recebe `{tabela: [ids]}` e retorna `{tabela: {ids encontrados}}` (ids como
+        string). Todas as tabelas vão num único `UNION ALL`; ids de tabelas de
+        referência confirmados há pouco (`KnownIds`) nem chegam a ir para a query.
+        A consulta não passa pelo cache de resultados: uma remoção recente precisa
+        aparecer na próxima checagem.
+        """
+        found: Dict[str, set] = {}
+        pending: List[Tuple[str, List[str]]] = []
+        for table_id, ids in refs.items():
+            ids = list(dict.fromkeys(str(i) for i in ids))
+            found[table_id] = set(ids)
+            missing = self.known_ids.missing(table_id, ids) if self.known_ids.tracks(table_id) else ids
+            if missing:
+                found[table_id].difference_update(missing)
+                pending.append((table_id, missing))
+
+        if not pending:
+            return found
+
+        builder = QueryBuilder()
+        selects = [
+            f"""
+            SELECT {index} AS ref, CAST(id AS STRING) AS id
+            FROM `{self.table_ref(table_id)}`
+            WHERE CAST(id AS STRING) IN UNNEST({builder.array_param(f"ids_{index}", ids, "STRING")})
+            """
+            for index, (table_id, ids) in enumerate(pending)
+        ]
+        for row in self.executar_query("UNION ALL".join(selects), builder, use_cache=False):
+            table_id = pending[row["ref"]][0]
+            found[table_id].add(row["id"])
+
+        for table_id, _ in pending:
+            self.known_ids.add(table_id, found[table_id])
+        return found
 
     def filtrar(self, table_id, filters: dict, limit=None, offset=0, order_by="id"):
         """Filtra registros por condições (ex: {"unit_id": "1"})"""
-        query = f"SELECT * FROM `{self.table_ref(table_id)}`"
-        
-        if filters:
-            conditions = []
-            for key, value in filters.items():
-                if isinstance(value, str):
-                    conditions.append(f"{key} = '{value}'")
-                else:
-                    conditions.append(f"{key} = {value}")
-            if conditions:
-                query += " WHERE " + " AND ".join(conditions)
-        
-        if order_by:
-            query += f" ORDER BY {order_by}"
+        query, builder = self.montar_select(table_id, filters, limit, offset, order_by)
+        return self.executar_query(query, builder)
+
+    def listar_cursor(self, table_id, limit=None, order_by="id", cursor=None) -> Tuple[List[dict], Optional[str]]:
+        """Lista registros com paginação por cursor; retorna (registros, next_cursor)."""
+        return self.filtrar_cursor(table_id, {}, limit=limit, order_by=order_by, cursor=cursor)
+
+    def filtrar_cursor(self, table_id, filters: dict, limit=None, order_by="id", cursor=None) -> Tuple[List[dict], Optional[str]]:
+        """Filtra registros com paginação por cursor (keyset) em `(order_by, id)`.
+
+        Diferente de OFFSET, cada página parte direto do último registro visto, então
+        páginas profundas custam o mesmo que a primeira. `next_cursor` é `None`
+        quando não há mais páginas.
+        """
+        query, builder = self.montar_select(table_id, filters, limit, order_by=order_by, cursor=cursor, keyset=True)
+        rows = self.executar_query(query, builder)
+
+        next_cursor = None
+        if limit and len(rows) >= int(limit):
+            column, _ = _split_order_by(order_by)
+            next_cursor = encode_cursor(rows[-1].get(column), rows[-1].get("id"))
+        return rows, next_cursor
+
+    def montar_select(
+        self,
+        table_id,
+        filters: Optional[dict] = None,
+        limit=None,
+        offset=0,
+        order_by="id",
+        cursor: Optional[str] = None,
+        keyset: bool = False,
+    ):
+        """Monta um SELECT parametrizado sobre a tabela e retorna (sql, builder).
+
+        Com `keyset=True` a ordenação ganha o `id` como desempate e, se houver
+        `cursor`, a consulta começa logo após o registro que ele representa.
+        """
+        builder = QueryBuilder()
+        conditions = []
+        for key, value in (filters or {}).items():
+            validar_identificador(key)
+            if value is None:
+                conditions.append(f"{key} IS NULL")
+            else:
+                conditions.append(f"{key} = {builder.param(f'f_{key}', value)}")
+
+        order_clause = validar_order_by(order_by) if order_by else ""
+        if keyset:
+            column, descending = _split_order_by(order_by or "id")
+            direction = "DESC" if descending else "ASC"
+            if cursor:
+                conditions.append(keyset_condition(builder, cursor, column, descending=descending))
+            order_clause = f"{column} {direction}"
+            if column != "id":
+                order_clause += f", id {direction}"
+
+        query = f"SELECT * FROM `{self.table_ref(table_id)}` {builder.where(conditions)}"
+        if order_clause:
+            query += f" ORDER BY {order_clause}"
         if limit:
-            query += f" LIMIT {limit}"
+            query += f" LIMIT {builder.param('limit', int(limit), 'INT64')}"
         if offset and offset > 0:
-            query += f" OFFSET {offset}"
-
-        query_job = self.client.query(query)
-        results = query_job.result()
-        
-        rows = []
-        for row in results:
-            row_dict = dict(row)
-            rows.append(row_dict)
-        
-        return rows
-
-    def executar_query(self, query: str):
-        """Executa uma query SQL customizada e retorna os resultados"""
-        query_job = self.client.query(query)
-        results = query_job.result()
-        
-        rows = []
-        for row in results:
-            row_dict = dict(row)
-            rows.append(row_dict)
-        
-        return rows
-   
-
-    def execute_query(self, query):
-        """Executa uma query SQL no BigQuery"""
+            query += f" OFFSET {builder.param('offset', int(offset), 'INT64')}"
+        return query, builder
+
+    def executar_query(self, query: str, params=None, use_cache: bool = True):
+        """Executa uma query SQL customizada e retorna os resultados.
+
+        `params` pode ser um `QueryBuilder` ou uma lista de parâmetros do BigQuery.
+        Leituras passam pelo cache de resultados, salvo `use_cache=False`.
+        """
+        def compute():
+            return list(self.executar_query_iter(query, params))
+
+        if not use_cache or self.cache is None:
+            return compute()
+        rows = self.cache.get_or_compute("rows", query, self._parametros(params), compute)
+        # cópia rasa: quem chama pode alterar os dicts sem contaminar o cache
+        return [dict(row) for row in rows]
+
+    def run_many(
+        self,
+        queries: Union[Mapping[str, Any], Sequence[Any]],
+        return_exceptions: bool = False,
+    ):
+        """Executa várias queries em paralelo e devolve os resultados na mesma forma.
+
+        `queries` pode ser um dict {nome: query} ou uma lista, onde cada query é
+        um SQL ou uma tupla (sql, params). Todos os jobs são submetidos de uma vez
+        em um pool limitado por `BIGQUERY_MAX_CONCURRENT_QUERIES`, então a latência
+        total fica próxima à da query mais lenta. Com `return_exceptions=True`, a
+        exceção de uma query ocupa o lugar do seu resultado em vez de ser lançada.
+        """
+        items = list(queries.items()) if isinstance(queries, Mapping) else list(enumerate(queries))
+        executor = self._get_executor()
+        # cada job roda com uma cópia do contexto de quem chamou (ex: orçamento ativo)
+        futures = [
+            executor.submit(contextvars.copy_context().run, self._executar_item, query)
+            for _, query in items
+        ]
+
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as exc:
+                if not return_exceptions:
+                    raise
+                results.append(exc)
+
+        if isinstance(queries, Mapping):
+            return {name: result for (name, _), result in zip(items, results)}
+        return results
+
+    def _executar_item(self, query):
+        sql, params = query if isinstance(query, tuple) else (query, None)
+        return self.executar_query(sql, params)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrent_queries,
+                    thread_name_prefix="bigquery-query",
+                )
+            return self._executor
+
+    # ==============================
+    # Leitura em streaming
+    # ==============================
+    def listar_iter(self, table_id, limit=None, offset=0, order_by="id", page_size=None) -> Iterator[dict]:
+        """Versão em streaming de `listar`: devolve os registros página a página."""
+        return self.filtrar_iter(table_id, {}, limit=limit, offset=offset, order_by=order_by, page_size=page_size)
+
+    def filtrar_iter(self, table_id, filters: dict, limit=None, offset=0, order_by="id", page_size=None) -> Iterator[dict]:
+        """Versão em streaming de `filtrar`: devolve os registros página a página."""
+        query, builder = self.montar_select(table_id, filters, limit, offset, order_by)
+        return self.executar_query_iter(query, builder, page_size=page_size)
+
+    def executar_query_iter(self, query: str, params=None, page_size=None) -> Iterator[dict]:
+        """Executa a query e devolve um gerador de dicts que percorre o `RowIterator`.
+
+        O job é submetido e aguardado antes do retorno (erros como `NotFound`
+        aparecem na chamada), mas as páginas só são baixadas conforme o gerador
+        é consumido, então apenas uma página fica em memória por vez.
+        """
+        pages = self._paginas(query, params, page_size)
+        return (dict(row) for page in pages for row in page)
+
+    def executar_query_lotes(self, query: str, params=None, page_size=None) -> Iterator[Dict[str, list]]:
+        """Como `executar_query_iter`, mas devolve cada página como colunas ({coluna: [valores]})."""
+        pages = self._paginas(query, params, page_size)
+
+        def gerar():
+            for page in pages:
+                rows = [dict(row) for row in page]
+                if not rows:
+                    continue
+                yield {column: [row.get(column) for row in rows] for column in rows[0]}
+
+        return gerar()
+
+    # ==============================
+    # Leitura colunar (Arrow)
+    # ==============================
+    def query_arrow(self, query: str, params=None, float_columns: Iterable[str] = ()):
+        """Executa a query e retorna um `pyarrow.Table` com colunas numéricas já convertidas.
+
+        Usa a BigQuery Storage Read API quando `google-cloud-bigquery-storage`
+        está instalado; caso contrário, a biblioteca cai para a API REST.
+        """
+        def compute():
+            _, results = self._executar_job(query, params)
+            table = results.to_arrow(
+                bqstorage_client=self._bqstorage_client(),
+                create_bqstorage_client=False,
+            )
+            return cast_numeric_columns(table, float_columns)
+
+        if self.cache is None:
+            return compute()
+        kind = "arrow:" + ",".join(sorted(float_columns))
+        return self.cache.get_or_compute(kind, query, self._parametros(params), compute)
+
+    def query_arrow_iter(self, query: str, params=None, float_columns: Iterable[str] = (), page_size=None):
+        """Versão em streaming de `query_arrow`: devolve `RecordBatch`es já convertidos.
+
+        Se o consumidor fechar o gerador antes do fim (cliente desconectou no meio
+        de uma resposta em streaming), as páginas restantes não são baixadas.
+        """
+        _, results = self._executar_job(query, params, page_size=page_size or self.page_size)
+        batches = results.to_arrow_iterable(bqstorage_client=self._bqstorage_client())
+        return (cast_numeric_columns(batch, float_columns) for batch in batches)
+
+    def _bqstorage_client(self):
+        """Cria (uma única vez) o client da Storage Read API, se estiver disponível."""
+        if self._read_client is None and self.use_storage_api:
+            try:
+                from google.cloud import bigquery_storage
+            except ImportError:
+                self.use_storage_api = False
+                return None
+            self._read_client = bigquery_storage.BigQueryReadClient(
+                credentials=self.client._credentials
+            )
+        return self._read_client
+
+    def _paginas(self, query: str, params=None, page_size=None) -> Iterator[Iterable]:
+        """Submete a query, espera o job e retorna o iterador de páginas do resultado."""
+        _, results = self._executar_job(query, params, page_size=page_size or self.page_size)
+        return iter(results.pages)
+
+    # ==============================
+    # Prazo, prioridade e cancelamento
+    # ==============================
+    @contextmanager
+    def prazo(self, seconds: Optional[float]):
+        """Limita o tempo total das queries feitas dentro do bloco (inclusive via `run_many`).
+
+        O prazo mais curto vence: um bloco interno não estende o de fora. Job que
+        passa do prazo é cancelado no BigQuery e vira `QueryTimeout`.
+        """
+        deadline = time.monotonic() + seconds if seconds else None
+        outer = _prazo_atual.get()
+        if outer is not None and (deadline is None or outer < deadline):
+            deadline = outer
+        token = _prazo_atual.set(deadline)
+        try:
+            yield
+        finally:
+            _prazo_atual.reset(token)
+
+    def _timeout_efetivo(self, timeout: Optional[float] = None, priority: Optional[str] = None) -> Optional[float]:
+        """Segundos que o job pode levar: argumento, senão o padrão da prioridade, limitado pelo `prazo`."""
+        if timeout is None:
+            timeout = self.batch_timeout if priority == PRIORIDADE_BATCH else self.query_timeout
+        deadline = _prazo_atual.get()
+        if deadline is not None:
+            remaining = max(deadline - time.monotonic(), 0.0)
+            timeout = remaining if timeout is None else min(timeout, remaining)
+        return timeout
+
+    def _aguardar(self, job, timeout: Optional[float], **result_kwargs):
+        """`job.result()` com prazo total; ao estourar, cancela o job e levanta `QueryTimeout`.
+
+        O `timeout` do `result()` da biblioteca vale por requisição HTTP, não para a
+        espera inteira, então o prazo é controlado aqui consultando `done()`.
+        """
+        if timeout is None:
+            return job.result(**result_kwargs)
+
+        deadline = time.monotonic() + timeout
+        interval = 0.05
+        while not job.done():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self._cancelar(job)
+                raise QueryTimeout(getattr(job, "job_id", None), timeout)
+            time.sleep(min(interval, remaining))
+            interval = min(interval * 1.5, self.MAX_POLL_INTERVAL)
+        # job concluído: o result() só busca a primeira página
+        return job.result(**result_kwargs)
+
+    def _cancelar(self, job) -> None:
+        """Pede o cancelamento do job (ignora falhas: o job pode já ter terminado)."""
+        try:
+            if not job.done():
+                job.cancel()
+        except Exception as e:
+            logger.warning("falha ao cancelar o job %s: %s", getattr(job, "job_id", None), e)
+
+    # ==============================
+    # Custo (dry-run e orçamento de bytes)
+    # ==============================
+    @contextmanager
+    def orcamento(self, endpoint: str, max_bytes: Optional[int] = None, dry_run: bool = False):
+        """Aplica o orçamento de bytes do endpoint às queries feitas dentro do bloco.
+
+        Os jobs vão com `maximum_bytes_billed`: o BigQuery recusa a consulta que
+        passaria do limite (sem cobrar) e o erro vira `QueryBudgetExceeded`.
+        Com `dry_run=True`, cada leitura que chega a virar job (respostas do cache
+        e do single-flight não passam por aqui) é estimada antes, e a recusa sai
+        sem executar nada e com a estimativa; custa uma ida ao BigQuery a mais,
+        então fica para rotas pesadas como a exportação. O limite vem de
+        `max_bytes`, `BIGQUERY_BYTES_BUDGETS` ou `BIGQUERY_DEFAULT_BYTES_BUDGET`
+        (0 desliga).
+        """
+        if max_bytes is None:
+            max_bytes = self.bytes_budgets.get(endpoint, self.default_bytes_budget)
+        token = _orcamento_atual.set((endpoint, max_bytes, dry_run) if max_bytes else None)
+        try:
+            yield
+        finally:
+            _orcamento_atual.reset(token)
+
+    def estimar_bytes(self, query: str, params=None) -> int:
+        """Dry-run da query: quantos bytes ela processaria (sem custo e sem executar)."""
+        config = self._job_config(params, dry_run=True, use_query_cache=False)
+        query_job = self.client.query(query, job_config=config)
+        return int(query_job.total_bytes_processed or 0)
+
+    def _iniciar_query(self, query: str, params=None, priority: Optional[str] = None):
+        """Submete o job de leitura respeitando o orçamento ativo (ver `orcamento`)."""
+        config_kwargs = {"priority": priority} if priority else {}
+        orcamento = _orcamento_atual.get()
+        if orcamento is None:
+            return self.client.query(query, job_config=self._job_config(params, **config_kwargs))
+
+        endpoint, max_bytes, dry_run = orcamento
+        if dry_run:
+            estimated = self.estimar_bytes(query, params)
+            if estimated > max_bytes:
+                raise QueryBudgetExceeded(endpoint, estimated, max_bytes)
+        return self.client.query(
+            query, job_config=self._job_config(params, maximum_bytes_billed=max_bytes, **config_kwargs)
+        )
+
+    def _executar_job(self, query: str, params=None, timeout=None, priority=None, **result_kwargs):
+        """Submete o job, espera o resultado e registra suas métricas; retorna (job, resultado).
+
+        Leituras idênticas (mesmo SQL, parâmetros e orçamento) já em andamento no
+        processo não geram outro job: quem chega depois espera o job do primeiro
+        e lê o resultado dele com seu próprio iterador. A espera vale o prazo de
+        quem espera, não o do primeiro: ao estourar, sai com `QueryTimeout` sem
+        cancelar o job compartilhado.
+        """
+        timeout = self._timeout_efetivo(timeout, priority)
+        key = self._chave_single_flight(query, params, priority)
+        if key is None:
+            return self._submeter_job(query, params, timeout, priority, **result_kwargs)
+
+        try:
+            (query_job, results), shared = self.single_flight.do(
+                key, lambda: self._submeter_job(query, params, timeout, priority, **result_kwargs), timeout
+            )
+        except EsperaExpirada as e:
+            raise QueryTimeout(None, e.timeout) from e
+        if shared:
+            # o job já terminou: só lê o resultado (sem custo de query)
+            results = query_job.result(**result_kwargs)
+        return query_job, results
+
+    def _chave_single_flight(self, query: str, params=None, priority=None) -> Optional[str]:
+        if self.single_flight is None or not is_cacheable(query):
+            return None
+        return cache_key(f"job:{_orcamento_atual.get()}:{priority}", query, self._parametros(params))
+
+    def _submeter_job(self, query: str, params=None, timeout=None, priority=None, **result_kwargs):
+        started = time.perf_counter()
+        query_job = None
+        try:
+            query_job = self._iniciar_query(query, params, priority)
+            results = self._aguardar(query_job, timeout, **result_kwargs)
+        except Exception as e:
+            orcamento = _orcamento_atual.get()
+            if orcamento is not None and _limite_de_bytes_excedido(e):
+                # o BigQuery recusou pelo maximum_bytes_billed (nada foi cobrado)
+                budget_error = QueryBudgetExceeded(orcamento[0], None, orcamento[1])
+                self._registrar_job(query, query_job, started, budget_error)
+                raise budget_error from e
+            self._registrar_job(query, query_job, started, e)
+            raise
+        self._registrar_job(query, query_job, started)
+        return query_job, results
+
+    def _registrar_job(self, query: str, query_job, started: float, error: Optional[Exception] = None) -> None:
+        if self.recorder is None:
+            return
+        wall_ms = (time.perf_counter() - started) * 1000
+        self.recorder.record(QueryRecord.from_job(query, query_job, wall_ms, error))
+
+    def _parametros(self, params=None) -> List[Any]:
+        if isinstance(params, QueryBuilder):
+            return list(params.parameters)
+        return list(params or [])
+
+    def _job_config(self, params=None, **kwargs) -> bigquery.QueryJobConfig:
+        """Constrói o QueryJobConfig a partir de um QueryBuilder ou lista de parâmetros."""
+        if isinstance(params, QueryBuilder):
+            return params.job_config(**kwargs)
+        return bigquery.QueryJobConfig(query_parameters=list(params or []), **kwargs)
+
+    def execute_query(self, query, priority: Optional[str] = None, timeout: Optional[float] = None):
+        """Executa uma query SQL (com `{project}`/`{dataset}`) no BigQuery e espera o job.
+
+        Use `priority=PRIORIDADE_BATCH` para DDL/manutenção que não deve disputar
+        slots com os dashboards; o prazo padrão passa a ser `BIGQUERY_BATCH_TIMEOUT`.
+        """
         query = query.format(
-            project=self.project,
-            dataset=self.dataset
+            project=self.client.project,
+            dataset=self.dataset_id
         )
-        return self.client.query(query)
+        query_job, _ = self._executar_job(query, timeout=timeout, priority=priority)
+        return query_job
+
+    def submeter_query(self, query, priority: Optional[str] = None):
+        """Submete a query (com `{project}`/`{dataset}`) e devolve o job sem esperar por ele.
+
+        Para DDL/manutenção disparada por uma view: um job BATCH pode ficar na
+        fila por muito mais tempo que o timeout do worker. Acompanhe por `status_job`.
+        """
+        query = query.format(
+            project=self.client.project,
+            dataset=self.dataset_id
+        )
+        config_kwargs = {"priority": priority} if priority else {}
+        return self.client.query(query, job_config=self._job_config(**config_kwargs))
+
+    def status_job(self, job_id: str) -> Dict[str, Any]:
+        """Estado de um job submetido por `submeter_query` (PENDING, RUNNING ou DONE)."""
+        job = self.client.get_job(job_id)
+        error = getattr(job, "error_result", None)
+        return {
+            "job_id": job.job_id,
+            "state": job.state,
+            "erro": error.get("message") if error else None,
+        }
 
-    def query_to_dataframe(self, query):
+    def query_to_dataframe(self, query, params=None):
         """Executa uma query e retorna os resultados como DataFrame"""
-        return self.client.query(query).to_dataframe()
+        query_job, _ = self._executar_job(query, params)
+        return query_job.to_dataframe()
@@ -0,0 +1,216 @@
+"""Carga de streaming inserts em blocos paralelos, com retentativa e registro por bloco.
+
+O ETL mandava os blocos de `insert_rows_json` um depois do outro e, se algum
+voltasse com erro, desistia do arquivo inteiro no fim; os blocos que já tinham
+entrado ficavam na tabela e uma nova execução os duplicava. O `ChunkLoader`:
+
+- envia até `workers` blocos ao mesmo tempo (com no máximo `2 * workers` blocos
+  em memória, então a leitura do arquivo não dispara na frente da carga);
+- repete o bloco com backoff exponencial (e jitter) em 429/5xx, erros de conexão
+  e erros de linha transitórios (`backendError`, `rateLimitExceeded`...);
+- manda um `insertId` determinístico por linha (hash de `namespace` + índice), então
+  retentativas e reexecuções do mesmo arquivo são deduplicadas pelo BigQuery
+  (a deduplicação por `insertId` é best-effort, dentro de cerca de um minuto);
+- guarda um `ChunkResult` por bloco; se algum falhar, `ChunkLoadError` diz
+  exatamente quais faixas de linhas ficaram de fora.
+"""
+from __future__ import annotations
+
+import hashlib
+import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30.0
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# `insertErrors[].errors[].reason` que indicam falha transitória (linhas "stopped" só
+# não entraram porque outra linha do mesmo request falhou)
+RETRYABLE_REASONS = {"backendError", "internalError", "rateLimitExceeded", "timeout", "stopped"}
+
+# (linhas, insert_ids) -> erros no formato de `insert_rows_json`
+SendFn = Callable[[List[dict], List[str]], List[dict]]
+
+
+def insert_id(namespace: str, index: int) -> str:
+    """`insertId` estável da linha `index` de `namespace` (ex: o blob de origem)."""
+    return hashlib.sha1(f"{namespace}:{index}".encode("utf-8")).hexdigest()
+
+
+@dataclass
+class ChunkResult:
+    """Resultado de um bloco: linhas `[start, end)` do fluxo enviado."""
+
+    start: int
+    end: int
+    status: str = "pending"
+    attempts: int = 0
+    error: Optional[str] = None
+
+    @property
+    def rows(self) -> int:
+        return self.end - self.start
+
+    def as_dict(self) -> dict:
+        return {
+            "start": self.start,
+            "end": self.end,
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+        }
+
+
+@dataclass
+class LoadLedger:
+    """Registro por bloco de uma carga."""
+
+    chunks: List[ChunkResult] = field(default_factory=list)
+
+    @property
+    def rows_loaded(self) -> int:
+        return sum(chunk.rows for chunk in self.chunks if chunk.status == "ok")
+
+    @property
+    def failed(self) -> List[ChunkResult]:
+        return [chunk for chunk in self.chunks if chunk.status != "ok"]
+
+    def missing_ranges(self) -> List[Tuple[int, int]]:
+        """Faixas `(primeira, última)` (inclusivas) de linhas que não entraram, já unidas."""
+        ranges: List[Tuple[int, int]] = []
+        for chunk in sorted(self.failed, key=lambda c: c.start):
+            if ranges and ranges[-1][1] + 1 >= chunk.start:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], chunk.end - 1))
+            else:
+                ranges.append((chunk.start, chunk.end - 1))
+        return ranges
+
+    def as_dict(self) -> dict:
+        return {
+            "chunks": len(self.chunks),
+            "rows_loaded": self.rows_loaded,
+            "failed_chunks": [chunk.as_dict() for chunk in self.failed],
+            "missing_ranges": [list(r) for r in self.missing_ranges()],
+        }
+
+
+class ChunkLoadError(RuntimeError):
+    """Algum bloco falhou depois de todas as tentativas; `ledger` diz quais linhas faltam."""
+
+    def __init__(self, ledger: LoadLedger):
+        self.ledger = ledger
+        ranges = ", ".join(f"{first}-{last}" for first, last in ledger.missing_ranges())
+        first_error = ledger.failed[0].error if ledger.failed else None
+        super().__init__(
+            f"Falha ao inserir registros no BigQuery: {len(ledger.failed)} de {len(ledger.chunks)} blocos "
+            f"não entraram (linhas {ranges}); {ledger.rows_loaded} linhas carregadas. Primeiro erro: {first_error}"
+        )
+
+    def to_dict(self) -> dict:
+        return {"erro": str(self), **self.ledger.as_dict()}
+
+
+class ChunkLoader:
+    """Envia um fluxo de registros em blocos paralelos; `load` retorna o `LoadLedger`."""
+
+    def __init__(
+        self,
+        send: SendFn,
+        *,
+        namespace: str,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        workers: int = DEFAULT_WORKERS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        base_delay: float = DEFAULT_BASE_DELAY,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.send = send
+        self.namespace = namespace
+        self.chunk_size = max(1, chunk_size)
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+
+    def load(self, records: Iterable[dict]) -> LoadLedger:
+        """Envia tudo e retorna o registro; levanta `ChunkLoadError` se algum bloco falhou."""
+        ledger = LoadLedger()
+        pending: Set[Future] = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="etl-insert") as pool:
+            for start, rows in self._blocos(records):
+                chunk = ChunkResult(start=start, end=start + len(rows))
+                ledger.chunks.append(chunk)
+                pending.add(pool.submit(self._enviar, chunk, rows))
+                if len(pending) >= 2 * self.workers:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+            for future in pending:
+                future.result()
+
+        if ledger.failed:
+            logger.warning("carga %s incompleta: %s", self.namespace, ledger.as_dict())
+            raise ChunkLoadError(ledger)
+        return ledger
+
+    def _blocos(self, records: Iterable[dict]):
+        chunk: List[dict] = []
+        start = 0
+        for record in records:
+            chunk.append(record)
+            if len(chunk) == self.chunk_size:
+                yield start, chunk
+                start += len(chunk)
+                chunk = []
+        if chunk:
+            yield start, chunk
+
+    def _enviar(self, chunk: ChunkResult, rows: List[dict]) -> None:
+        ids = [insert_id(self.namespace, chunk.start + i) for i in range(len(rows))]
+        while True:
+            chunk.attempts += 1
+            try:
+                errors = self.send(rows, ids)
+            except Exception as e:
+                retry, chunk.error = _excecao_retentavel(e), f"{type(e).__name__}: {e}"
+            else:
+                if not errors:
+                    chunk.status, chunk.error = "ok", None
+                    return
+                retry, chunk.error = _erros_retentaveis(errors), str(errors[:3])
+
+            if not retry or chunk.attempts >= self.max_attempts:
+                chunk.status = "failed"
+                return
+            self.sleep(self._atraso(chunk.attempts))
+
+    def _atraso(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+
+def _excecao_retentavel(error: BaseException) -> bool:
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    # exceções do google.api_core trazem o status HTTP em `code`
+    return getattr(error, "code", None) in RETRYABLE_STATUS
+
+
+def _erros_retentaveis(errors: List[Any]) -> bool:
+    reasons = {
+        detail.get("reason")
+        for item in errors
+        for detail in (item.get("errors") or [{}] if isinstance(item, dict) else [{}])
+    }
+    return bool(reasons) and reasons <= RETRYABLE_REASONS
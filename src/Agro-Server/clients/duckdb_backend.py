@@ -0,0 +1,366 @@
+"""Backend local (DuckDB) com a mesma interface do `BigQueryClient`.
+
+Permite rodar a API inteira offline, em benchmarks e testes de carga, sem tocar
+no BigQuery. O `DuckDBBigQueryClient` é o próprio `BigQueryClient` (mesmos
+`listar`, `filtrar`, `buscar_por_id`, `inserir`, `atualizar`, `remover`,
+`executar_query`, `load_csv_from_gcs`, cache, cursores e métricas), só que o
+`self.client` é um `DuckDBClient`: um adaptador que fala o subconjunto da API do
+`google.cloud.bigquery.Client` usado aqui (`query`, `insert_rows_json`,
+`load_table_from_uri`) sobre um arquivo DuckDB.
+
+O SQL passa por `traduzir_sql`, um shim pequeno do dialeto do BigQuery: refs de
+tabela com crases, parâmetros `@nome`, `FORMAT_TIMESTAMP`/`FORMAT_DATE`,
+`TIMESTAMP()`/`DATE()`, `SAFE_CAST` e tipos (`INT64`, `STRING`...),
+`IN UNNEST(@lista)`, `MERGE ... USING UNNEST(@structs)` e aritmética de datas.
+Não é um tradutor completo: scripts (`DECLARE`, transações) não são suportados.
+
+Selecionado com `BIGQUERY_BACKEND=duckdb` (arquivo em `DUCKDB_PATH`; URIs
+`gs://bucket/blob` são lidas de `DUCKDB_GCS_ROOT/bucket/blob`).
+"""
+from __future__ import annotations
+
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .bigquery_client import BigQueryClient
+
+LOCAL_PROJECT = "local"
+
+_TABLE_REF_RE = re.compile(r"`([^`]+)`")
+_PARAM_RE = re.compile(r"(?<![\w@$])@([A-Za-z_][A-Za-z0-9_]*)")
+_IN_UNNEST_RE = re.compile(r"\bIN\s+UNNEST\s*\(\s*(\$\w+)\s*\)", re.IGNORECASE)
+_USING_UNNEST_RE = re.compile(r"\bUSING\s+UNNEST\s*\(\s*(\$\w+)\s*\)", re.IGNORECASE)
+_MERGE_RE = re.compile(r"^\s*MERGE\s+(?!INTO\b)", re.IGNORECASE)
+_DML_RE = re.compile(r"^\s*(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+_SCRIPT_RE = re.compile(r"^\s*(DECLARE|BEGIN)\b", re.IGNORECASE)
+_TYPES = (
+    (re.compile(r"\bAS\s+INT64\b", re.IGNORECASE), "AS BIGINT"),
+    (re.compile(r"\bAS\s+FLOAT64\b", re.IGNORECASE), "AS DOUBLE"),
+    (re.compile(r"\bAS\s+STRING\b", re.IGNORECASE), "AS VARCHAR"),
+    (re.compile(r"\bAS\s+BOOL\b", re.IGNORECASE), "AS BOOLEAN"),
+    (re.compile(r"\bAS\s+NUMERIC\b", re.IGNORECASE), "AS DECIMAL(38, 9)"),
+    (re.compile(r"\bSAFE_CAST\s*\(", re.IGNORECASE), "TRY_CAST("),
+    (re.compile(r"\bCURRENT_DATE\s*\(\s*\)", re.IGNORECASE), "current_date"),
+)
+
+
+# ==============================
+# Shim de dialeto BigQuery -> DuckDB
+# ==============================
+def _split_args(args: str) -> List[str]:
+    """Separa os argumentos de uma chamada pelas vírgulas de nível zero."""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, ch in enumerate(args):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "(":
+            depth += 1
+        elif ch == ")":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            parts.append(args[start:i].strip())
+            start = i + 1
+    parts.append(args[start:].strip())
+    return parts
+
+
+def _rewrite_calls(sql: str, name: str, rewrite: Callable[[List[str]], str]) -> str:
+    """Reescreve cada chamada `name(...)` (inclusive aninhadas) com `rewrite(args)`."""
+    pattern = re.compile(rf"\b{name}\s*\(", re.IGNORECASE)
+    position = 0
+    while True:
+        match = pattern.search(sql, position)
+        if not match:
+            return sql
+        depth, quote, end = 1, None, None
+        for i in range(match.end(), len(sql)):
+            ch = sql[i]
+            if quote:
+                if ch == quote:
+                    quote = None
+            elif ch in "'\"":
+                quote = ch
+            elif ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+                if depth == 0:
+                    end = i
+                    break
+        if end is None:
+            raise ValueError(f"Parênteses desbalanceados em {name}()")
+        args = _rewrite_calls(sql[match.end():end], name, rewrite)
+        replacement = rewrite(_split_args(args))
+        sql = sql[:match.start()] + replacement + sql[end + 1:]
+        # continua depois da substituição (ela pode conter o mesmo nome, ex: date_trunc)
+        position = match.start() + len(replacement)
+
+
+def _table_ref(ref: str) -> str:
+    parts = [p for p in ref.split(".") if p]
+    return ".".join(f'"{p}"' for p in parts[-2:])
+
+
+def traduzir_sql(sql: str) -> str:
+    """Traduz o SQL (dialeto BigQuery) usado pelas views para DuckDB."""
+    sql = _TABLE_REF_RE.sub(lambda m: _table_ref(m.group(1)), sql)
+    sql = _PARAM_RE.sub(r"$\1", sql)
+    for pattern, replacement in _TYPES:
+        sql = pattern.sub(replacement, sql)
+
+    sql = _rewrite_calls(sql, "FORMAT_TIMESTAMP", lambda a: f"strftime({a[1]}, {a[0]})")
+    sql = _rewrite_calls(sql, "FORMAT_DATE", lambda a: f"strftime({a[1]}, {a[0]})")
+    sql = _rewrite_calls(sql, "TIMESTAMP", lambda a: f"CAST({a[0]} AS TIMESTAMP)")
+    sql = _rewrite_calls(sql, "DATE", lambda a: f"CAST({a[0]} AS DATE)")
+    sql = _rewrite_calls(sql, "DATE_SUB", lambda a: f"CAST(({a[0]}) - {a[1]} AS DATE)")
+    sql = _rewrite_calls(sql, "DATE_ADD", lambda a: f"CAST(({a[0]}) + {a[1]} AS DATE)")
+    sql = _rewrite_calls(sql, "DATE_TRUNC", lambda a: f"date_trunc('{a[1].lower()}', {a[0]})")
+
+    sql = _IN_UNNEST_RE.sub(r"IN (SELECT UNNEST(\1))", sql)
+    sql = _USING_UNNEST_RE.sub(r"USING (SELECT UNNEST(\1, recursive := true))", sql)
+    sql = _MERGE_RE.sub("MERGE INTO ", sql)
+    return sql
+
+
+def _valor_parametro(param) -> Any:
+    """Converte Scalar/Array/StructQueryParameter no valor Python aceito pelo DuckDB."""
+    if hasattr(param, "struct_values"):
+        return {name: value for name, value in param.struct_values.items()}
+    if hasattr(param, "values"):
+        return [_valor_parametro(v) if hasattr(v, "struct_values") else v for v in param.values]
+    return param.value
+
+
+def _erro_google(error: Exception) -> Exception:
+    """Mapeia erros do DuckDB para as exceções do google.api_core que as views tratam."""
+    import duckdb
+    from google.api_core import exceptions as gcloud_exceptions
+
+    if isinstance(error, duckdb.CatalogException):
+        return gcloud_exceptions.NotFound(str(error))
+    return gcloud_exceptions.BadRequest(str(error))
+
+
+# ==============================
+# Adaptador do google.cloud.bigquery.Client
+# ==============================
+class DuckDBRowIterator:
+    """Imita o `RowIterator` do BigQuery sobre um `pyarrow.Table` já materializado."""
+
+    def __init__(self, table, page_size: Optional[int] = None):
+        self._table = table
+        self.page_size = page_size or 1000
+        self.total_rows = table.num_rows
+
+    @property
+    def pages(self) -> Iterator[List[dict]]:
+        for batch in self._table.to_batches(max_chunksize=self.page_size):
+            yield batch.to_pylist()
+
+    def __iter__(self) -> Iterator[dict]:
+        for page in self.pages:
+            yield from page
+
+    def to_arrow(self, **kwargs):
+        return self._table
+
+    def to_arrow_iterable(self, **kwargs):
+        return iter(self._table.to_batches(max_chunksize=self.page_size))
+
+    def to_dataframe(self, **kwargs):
+        return self._table.to_pandas()
+
+
+class DuckDBQueryJob:
+    """Imita o `QueryJob`: o SQL já rodou quando o job é criado."""
+
+    def __init__(self, table=None, num_dml_affected_rows: Optional[int] = None, dry_run: bool = False):
+        self._table = table
+        self.num_dml_affected_rows = num_dml_affected_rows
+        self.total_bytes_processed = 0 if dry_run else (table.nbytes if table is not None else 0)
+        self.total_bytes_billed = 0
+        self.cache_hit = False
+        self.errors = None
+        self.job_id = None
+
+    def result(self, page_size: Optional[int] = None, **kwargs) -> DuckDBRowIterator:
+        import pyarrow as pa
+
+        return DuckDBRowIterator(self._table if self._table is not None else pa.table({}), page_size)
+
+    def to_dataframe(self, **kwargs):
+        return self.result().to_dataframe()
+
+    def done(self, *args, **kwargs) -> bool:
+        return True
+
+    def cancel(self) -> bool:
+        return False
+
+
+class _DatasetRef:
+    def __init__(self, project: str, dataset_id: str):
+        self.project = project
+        self.dataset_id = dataset_id
+
+    def table(self, table_id: str) -> str:
+        return f"{self.project}.{self.dataset_id}.{table_id}"
+
+
+class DuckDBClient:
+    """Subconjunto da API do `bigquery.Client` usado pelo `BigQueryClient`, sobre DuckDB."""
+
+    def __init__(self, path: str = ":memory:", gcs_root: Optional[str] = None):
+        import duckdb
+
+        self.project = LOCAL_PROJECT
+        self.path = path
+        self.gcs_root = gcs_root or os.path.join(tempfile.gettempdir(), "agro_gcs")
+        self._conn = duckdb.connect(path)
+        # mesma ordenação de NULLs do BigQuery (primeiro em ASC, por último em DESC)
+        self._conn.execute("SET default_null_order = 'nulls_first_on_asc_last_on_desc'")
+        self._schemas: set = set()
+        self._lock = threading.Lock()
+
+    def dataset(self, dataset_id: str) -> _DatasetRef:
+        return _DatasetRef(self.project, dataset_id)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    # ---- queries ----
+    def query(self, sql: str, job_config=None, **kwargs) -> DuckDBQueryJob:
+        if _SCRIPT_RE.match(sql):
+            raise NotImplementedError("Scripts (DECLARE/BEGIN) não são suportados pelo backend DuckDB")
+
+        translated = traduzir_sql(sql)
+        params = {
+            p.name: _valor_parametro(p)
+            for p in getattr(job_config, "query_parameters", None) or []
+            if f"${p.name}" in translated
+        }
+        if getattr(job_config, "dry_run", False):
+            return DuckDBQueryJob(dry_run=True)
+
+        self._garantir_schemas(sql)
+        cursor = self._conn.cursor()  # um cursor por chamada: seguro entre threads (run_many)
+        try:
+            result = cursor.execute(translated, params)
+            if _DML_RE.match(translated):
+                rows = result.fetchall()
+                return DuckDBQueryJob(num_dml_affected_rows=rows[0][0] if rows else 0)
+            if result.description is None:
+                return DuckDBQueryJob()
+            return DuckDBQueryJob(result.to_arrow_table())
+        except Exception as e:
+            raise _erro_google(e) from e
+        finally:
+            cursor.close()
+
+    # ---- escrita ----
+    def insert_rows_json(self, table, rows: Iterable[dict], row_ids=None, **kwargs) -> List[dict]:
+        """Insere as linhas (cria a tabela a partir delas se ainda não existir)."""
+        import pyarrow as pa
+
+        rows = list(rows)
+        if not rows:
+            return []
+        target = _table_ref(str(table))
+        try:
+            self._inserir_arrow(target, pa.Table.from_pylist(rows), append=True)
+        except Exception as e:
+            return [{"index": i, "errors": [{"reason": "invalid", "message": str(e)}]} for i in range(len(rows))]
+        return []
+
+    def load_table_from_uri(self, source_uris, destination, job_config=None, **kwargs) -> DuckDBQueryJob:
+        """Carrega CSV/Parquet de `gs://` (mapeado para `gcs_root`) ou de um caminho local."""
+        uris = [source_uris] if isinstance(source_uris, str) else list(source_uris)
+        paths = [self._caminho_local(uri) for uri in uris]
+        source_format = str(getattr(job_config, "source_format", "CSV") or "CSV").upper()
+        reader = "read_parquet" if source_format == "PARQUET" else "read_csv_auto"
+        truncate = str(getattr(job_config, "write_disposition", "")).upper().endswith("TRUNCATE")
+
+        cursor = self._conn.cursor()
+        try:
+            table = cursor.execute(f"SELECT * FROM {reader}($paths)", {"paths": paths}).to_arrow_table()
+        finally:
+            cursor.close()
+        self._inserir_arrow(_table_ref(str(destination)), table, append=not truncate)
+        job = DuckDBQueryJob()
+        job.output_rows = table.num_rows
+        return job
+
+    def _inserir_arrow(self, target: str, table, append: bool) -> None:
+        self._garantir_schema(target.split(".")[0].strip('"'))
+        with self._lock:
+            cursor = self._conn.cursor()
+            try:
+                cursor.register("_linhas", table)
+                if not append:
+                    cursor.execute(f"CREATE OR REPLACE TABLE {target} AS SELECT * FROM _linhas")
+                else:
+                    cursor.execute(f"CREATE TABLE IF NOT EXISTS {target} AS SELECT * FROM _linhas LIMIT 0")
+                    cursor.execute(f"INSERT INTO {target} BY NAME SELECT * FROM _linhas")
+                cursor.unregister("_linhas")
+            finally:
+                cursor.close()
+
+    def colunas_por_tabela(self, schema: str) -> Dict[str, set]:
+        """{tabela: {colunas}} do schema (= dataset), pelo information_schema."""
+        cursor = self._conn.cursor()
+        try:
+            rows = cursor.execute(
+                "SELECT table_name, column_name FROM information_schema.columns WHERE table_schema = $schema",
+                {"schema": schema},
+            ).fetchall()
+        finally:
+            cursor.close()
+        tables: Dict[str, set] = {}
+        for table_name, column_name in rows:
+            tables.setdefault(table_name, set()).add(column_name)
+        return tables
+
+    def _caminho_local(self, uri: str) -> str:
+        if uri.startswith("gs://"):
+            return os.path.join(self.gcs_root, uri[len("gs://"):])
+        return uri
+
+    def _garantir_schemas(self, sql: str) -> None:
+        """Cria o schema (= dataset) de cada tabela referenciada, na primeira vez."""
+        for ref in _TABLE_REF_RE.findall(sql):
+            parts = [p for p in ref.split(".") if p]
+            if len(parts) >= 2:
+                self._garantir_schema(parts[-2])
+
+    def _garantir_schema(self, name: str) -> None:
+        if name in self._schemas:
+            return
+        with self._lock:
+            self._conn.execute(f'CREATE SCHEMA IF NOT EXISTS "{name}"')
+            self._schemas.add(name)
+
+
+class DuckDBBigQueryClient(BigQueryClient):
+    """`BigQueryClient` rodando sobre um arquivo DuckDB local."""
+
+    def __init__(self, path: Optional[str] = None, **kwargs):
+        duckdb_client = DuckDBClient(
+            path or os.getenv("DUCKDB_PATH", os.path.join(tempfile.gettempdir(), "agro_local.duckdb")),
+            gcs_root=os.getenv("DUCKDB_GCS_ROOT"),
+        )
+        super().__init__(client=duckdb_client, **kwargs)
+        self.use_storage_api = False
+
+    def _carregar_tabelas(self) -> Dict[str, set]:
+        return self.client.colunas_por_tabela(self.dataset_id)
+
+
+def backend_local_ativo() -> bool:
+    """True quando BIGQUERY_BACKEND=duckdb."""
+    return os.getenv("BIGQUERY_BACKEND", "bigquery").lower() == "duckdb"
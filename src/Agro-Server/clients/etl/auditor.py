@@ -1,7 +1,6 @@
 import pandas as pd
 import numpy as np
 import logging
-from clients import bigquery_client
 
 logger = logging.getLogger(__name__)
 
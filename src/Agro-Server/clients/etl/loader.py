@@ -1,7 +1,7 @@
 import os
 import logging
 import tempfile
-from clients import storage_client, bigquery_client
+from clients.registry import get_bigquery_client, get_storage_client
 
 logger = logging.getLogger(__name__)
 
@@ -19,11 +19,11 @@ def upload_to_gcs_and_load_bq(df, prefix: str, table_name: str):
         destination_blob = f"{prefix}/{os.path.basename(csv_path)}"
 
         # Faz o upload para o GCS
-        gcs_uri = storage_client.upload_file(csv_path, destination_blob)
+        gcs_uri = get_storage_client().upload_file(csv_path, destination_blob)
         logger.info(f"Arquivo CSV enviado para {gcs_uri}")
 
         # Carrega os dados no BigQuery
-        bigquery_client.load_csv_from_gcs(gcs_uri, table_name)
+        get_bigquery_client().load_csv_from_gcs(gcs_uri, table_name)
         logger.info(f"Dados carregados na tabela {table_name} do BigQuery")
 
         return gcs_uri
@@ -0,0 +1,402 @@
+"""Manifesto dos arquivos brutos já processados pelo ETL.
+
+Nada impedia o mesmo arquivo de ser processado duas vezes: uma retentativa do
+cliente recarregava todas as linhas em `raw_layer` e gravava outro
+`_processed_<timestamp>` no *staging*. O manifesto guarda uma linha por arquivo
+processado, identificada pelo nome do blob, pela geração e pelos checksums
+(CRC32C/MD5) que o Cloud Storage já calcula. O `EtlService` consulta o
+manifesto antes de baixar o arquivo e devolve "skipped" se:
+
+- a mesma geração do blob já foi processada, ou
+- o mesmo conteúdo (mesmo CRC32C e, quando houver, o mesmo MD5) já foi
+  processado com esse nome, como num reenvio idêntico do arquivo.
+
+Um arquivo sobrescrito com outro conteúdo é processado de novo.
+
+Consultar e só registrar no fim deixava uma janela: duas chamadas concorrentes
+(ou a retentativa de um cliente cujo request expirou) liam o manifesto vazio e
+carregavam o arquivo as duas. Antes de carregar, o `EtlService` reserva a versão
+do blob com `reservar`, uma inserção condicional por blob + geração que grava a
+linha com status "in_progress". Só quem reserva carrega; os outros recebem None.
+`registrar` marca a linha como "done" e `liberar` apaga a reserva se a carga
+falhar. Uma reserva "in_progress" mais velha que `claim_ttl` (processo que morreu
+no meio) pode ser retomada, e `force` retoma uma linha "done".
+
+Há dois armazenamentos com a mesma interface (`buscar`, `reservar`, `registrar`,
+`liberar`, `entradas`):
+
+- `BigQueryManifest`, uma tabela no dataset (padrão `etl_manifest`). Leituras e
+  escritas são DML/queries comuns, sem streaming buffer.
+- `SqliteManifest`, um arquivo sqlite local. É o substituto para rodar offline
+  (`BIGQUERY_BACKEND=duckdb`) e para os testes.
+
+`manifesto_padrao` escolhe pelo `ETL_MANIFEST`: `bigquery`, `sqlite` ou `off`.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional
+
+DEFAULT_TABLE = "etl_manifest"
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "etl_manifest.sqlite3")
+# reserva "in_progress" mais velha que isso é de um processo que morreu: pode ser retomada
+DEFAULT_CLAIM_TTL = 6 * 3600
+
+STATUS_EM_ANDAMENTO = "in_progress"
+STATUS_CONCLUIDO = "done"
+
+# colunas gravadas por arquivo processado (mesma ordem nos dois armazenamentos)
+COLUMNS = (
+    "blob_name",
+    "generation",
+    "crc32c",
+    "md5_hash",
+    "size",
+    "staging_blob",
+    "target_table",
+    "rows_read",
+    "rows_loaded",
+    "load_strategy",
+    "processed_at",
+    "status",
+    "claim_id",
+)
+
+
+@dataclass(frozen=True)
+class FileFingerprint:
+    """Identidade de uma versão de um blob: nome, geração e checksums do Cloud Storage."""
+
+    blob_name: str
+    generation: Optional[int] = None
+    crc32c: Optional[str] = None
+    md5_hash: Optional[str] = None
+    size: Optional[int] = None
+
+    @classmethod
+    def from_stat(cls, stat: dict) -> "FileFingerprint":
+        """Monta a partir dos metadados de `CloudStorageClient.stat`/`list_stats`."""
+        generation = stat.get("generation")
+        return cls(
+            blob_name=stat["name"],
+            generation=int(generation) if generation is not None else None,
+            crc32c=stat.get("crc32c"),
+            md5_hash=stat.get("md5_hash"),
+            size=stat.get("size"),
+        )
+
+    @property
+    def namespace(self) -> str:
+        """Namespace dos `insertId`: uma versão nova do blob não colide com as linhas da anterior."""
+        return f"{self.blob_name}#{self.generation}" if self.generation is not None else self.blob_name
+
+    def corresponde(self, entry: dict) -> bool:
+        """True se `entry` (linha concluída do manifesto) registra esta versão ou este mesmo conteúdo."""
+        if entry.get("blob_name") != self.blob_name or entry.get("status", STATUS_CONCLUIDO) != STATUS_CONCLUIDO:
+            return False
+        if self.generation is not None and entry.get("generation") == self.generation:
+            return True
+        if not self.crc32c or entry.get("crc32c") != self.crc32c:
+            return False
+        # objetos compostos não têm MD5: aí vale só o CRC32C
+        return not (self.md5_hash and entry.get("md5_hash")) or entry["md5_hash"] == self.md5_hash
+
+
+def _agora(delta: float = 0) -> str:
+    """Instante UTC (menos `delta` segundos) num formato fixo, comparável como texto."""
+    return (datetime.now(timezone.utc) - timedelta(seconds=delta)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+def _linha(fingerprint: FileFingerprint, result: dict, claim_id: Optional[str] = None) -> dict:
+    return {
+        "blob_name": fingerprint.blob_name,
+        "generation": fingerprint.generation,
+        "crc32c": fingerprint.crc32c,
+        "md5_hash": fingerprint.md5_hash,
+        "size": fingerprint.size,
+        "staging_blob": result.get("staging_blob"),
+        "target_table": result.get("table"),
+        "rows_read": result.get("rows_read"),
+        "rows_loaded": result.get("rows_loaded"),
+        "load_strategy": result.get("load_strategy"),
+        "processed_at": result.get("processed_at") or _agora(),
+        "status": STATUS_CONCLUIDO,
+        "claim_id": claim_id,
+    }
+
+
+def _mais_recente(entries: Iterable[dict], fingerprint: FileFingerprint) -> Optional[dict]:
+    matches = [entry for entry in entries if fingerprint.corresponde(entry)]
+    return max(matches, key=lambda entry: str(entry.get("processed_at") or "")) if matches else None
+
+
+class SqliteManifest:
+    """Manifesto num arquivo sqlite local (uma conexão por operação: serve a threads e processos)."""
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH, timeout: float = 30.0, claim_ttl: float = DEFAULT_CLAIM_TTL):
+        self.path = path
+        self.timeout = timeout
+        self.claim_ttl = claim_ttl
+
+    def buscar(self, fingerprint: FileFingerprint) -> Optional[dict]:
+        """Registro mais recente desta versão (ou deste conteúdo) do blob; None se nunca foi processado."""
+        return _mais_recente(self.entradas([fingerprint.blob_name]).get(fingerprint.blob_name, []), fingerprint)
+
+    def reservar(self, fingerprint: FileFingerprint, force: bool = False) -> Optional[str]:
+        """Reserva esta geração do blob para carga; devolve o id da reserva ou None se outro já a tem."""
+        claim_id = uuid.uuid4().hex
+        expired = _agora(self.claim_ttl)
+        with self._conectar() as conn:
+            conn.execute("BEGIN IMMEDIATE")  # trava a escrita entre a leitura e a inserção
+            current = conn.execute(
+                f"SELECT status, processed_at FROM {DEFAULT_TABLE} WHERE blob_name = ? AND generation IS ?",
+                (fingerprint.blob_name, fingerprint.generation),
+            ).fetchone()
+            if current is not None:
+                status, since = current
+                if status == STATUS_CONCLUIDO and not force:
+                    return None
+                if status == STATUS_EM_ANDAMENTO and since > expired:
+                    return None
+            row = {
+                **{column: None for column in COLUMNS},
+                "blob_name": fingerprint.blob_name,
+                "generation": fingerprint.generation,
+                "crc32c": fingerprint.crc32c,
+                "md5_hash": fingerprint.md5_hash,
+                "size": fingerprint.size,
+                "processed_at": _agora(),
+                "status": STATUS_EM_ANDAMENTO,
+                "claim_id": claim_id,
+            }
+            self._gravar(conn, row)
+        return claim_id
+
+    def registrar(self, fingerprint: FileFingerprint, result: dict, claim_id: Optional[str] = None) -> None:
+        """Grava (ou substitui, num reprocessamento forçado) o registro concluído desta geração do blob."""
+        with self._conectar() as conn:
+            self._gravar(conn, _linha(fingerprint, result, claim_id))
+
+    def liberar(self, fingerprint: FileFingerprint, claim_id: str) -> None:
+        """Desfaz a reserva `claim_id` (a carga falhou): o arquivo volta a ficar pendente."""
+        with self._conectar() as conn:
+            conn.execute(
+                f"DELETE FROM {DEFAULT_TABLE} WHERE blob_name = ? AND generation IS ? AND claim_id = ? AND status = ?",
+                (fingerprint.blob_name, fingerprint.generation, claim_id, STATUS_EM_ANDAMENTO),
+            )
+
+    def entradas(self, blob_names: Iterable[str]) -> Dict[str, List[dict]]:
+        """Registros por nome de blob (só os nomes que aparecem no manifesto)."""
+        names = list(dict.fromkeys(blob_names))
+        entries: Dict[str, List[dict]] = {}
+        with self._conectar() as conn:
+            # em lotes, abaixo do limite de parâmetros do sqlite
+            for start in range(0, len(names), 500):
+                batch = names[start:start + 500]
+                cursor = conn.execute(
+                    f"SELECT {', '.join(COLUMNS)} FROM {DEFAULT_TABLE} "
+                    f"WHERE blob_name IN ({', '.join('?' for _ in batch)})",
+                    batch,
+                )
+                for values in cursor:
+                    entry = dict(zip(COLUMNS, values))
+                    entries.setdefault(entry["blob_name"], []).append(entry)
+        return entries
+
+    @staticmethod
+    def _gravar(conn: sqlite3.Connection, row: dict) -> None:
+        # DELETE + INSERT em vez de INSERT OR REPLACE: na chave primária do sqlite
+        # gerações NULL são distintas entre si e nunca seriam substituídas
+        conn.execute(
+            f"DELETE FROM {DEFAULT_TABLE} WHERE blob_name = ? AND generation IS ?",
+            (row["blob_name"], row["generation"]),
+        )
+        conn.execute(
+            f"INSERT INTO {DEFAULT_TABLE} ({', '.join(COLUMNS)}) "
+            f"VALUES ({', '.join('?' for _ in COLUMNS)})",
+            [row[column] for column in COLUMNS],
+        )
+
+    @contextmanager
+    def _conectar(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        try:
+            with conn:  # commit no fim (rollback se der erro)
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {DEFAULT_TABLE} ("
+                    "blob_name TEXT NOT NULL, generation INTEGER, crc32c TEXT, md5_hash TEXT, size INTEGER, "
+                    "staging_blob TEXT, target_table TEXT, rows_read INTEGER, rows_loaded INTEGER, "
+                    "load_strategy TEXT, processed_at TEXT NOT NULL, status TEXT NOT NULL, claim_id TEXT, "
+                    "PRIMARY KEY (blob_name, generation))"
+                )
+                yield conn
+        finally:
+            conn.close()
+
+
+class BigQueryManifest:
+    """Manifesto numa tabela do BigQuery (criada no primeiro uso).
+
+    A reserva é um único MERGE, atômico: o BigQuery serializa DML concorrente na
+    mesma tabela, então a segunda reserva do mesmo blob + geração já encontra a
+    linha da primeira e não grava nada (ou falha por conflito, sem carregar).
+    """
+
+    def __init__(self, bigquery_client, table_id: str = DEFAULT_TABLE, claim_ttl: float = DEFAULT_CLAIM_TTL):
+        self.bigquery_client = bigquery_client
+        self.table_id = table_id
+        self.claim_ttl = claim_ttl
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def buscar(self, fingerprint: FileFingerprint) -> Optional[dict]:
+        """Registro mais recente desta versão (ou deste conteúdo) do blob; None se nunca foi processado."""
+        return _mais_recente(self.entradas([fingerprint.blob_name]).get(fingerprint.blob_name, []), fingerprint)
+
+    def reservar(self, fingerprint: FileFingerprint, force: bool = False) -> Optional[str]:
+        """Reserva esta geração do blob para carga; devolve o id da reserva ou None se outro já a tem."""
+        from .bigquery_client import QueryBuilder
+
+        self._garantir_tabela()
+        claim_id = uuid.uuid4().hex
+        builder = QueryBuilder()
+        blob = builder.param("blob_name", fingerprint.blob_name, "STRING")
+        claim = builder.param("claim_id", claim_id, "STRING")
+        in_progress = builder.param("in_progress", STATUS_EM_ANDAMENTO, "STRING")
+        rows = self.bigquery_client.executar_query(
+            f"""
+            MERGE `{self._ref()}` M
+            USING (SELECT {blob} AS blob_name, {builder.param("generation", fingerprint.generation, "INT64")} AS generation) N
+            ON M.blob_name = N.blob_name AND M.generation IS NOT DISTINCT FROM N.generation
+            WHEN MATCHED AND (
+                (M.status = {in_progress}
+                 AND M.processed_at < TIMESTAMP_SUB(CURRENT_TIMESTAMP(), INTERVAL {builder.param("claim_ttl", int(self.claim_ttl), "INT64")} SECOND))
+                OR ({builder.param("force", bool(force), "BOOL")} AND M.status = {builder.param("done", STATUS_CONCLUIDO, "STRING")})
+            ) THEN
+                UPDATE SET status = {in_progress}, claim_id = {claim}, processed_at = CURRENT_TIMESTAMP()
+            WHEN NOT MATCHED THEN
+                INSERT (blob_name, generation, crc32c, md5_hash, size, processed_at, status, claim_id)
+                VALUES (
+                    N.blob_name, N.generation, {builder.param("crc32c", fingerprint.crc32c, "STRING")},
+                    {builder.param("md5_hash", fingerprint.md5_hash, "STRING")}, {builder.param("size", fingerprint.size, "INT64")},
+                    CURRENT_TIMESTAMP(), {in_progress}, {claim}
+                );
+            SELECT COUNT(*) AS claimed FROM `{self._ref()}` WHERE blob_name = {blob} AND claim_id = {claim};
+            """,
+            builder,
+            use_cache=False,
+        )
+        return claim_id if rows and rows[0]["claimed"] else None
+
+    def registrar(self, fingerprint: FileFingerprint, result: dict, claim_id: Optional[str] = None) -> None:
+        """Conclui a reserva `claim_id` com o resultado (sem reserva, acrescenta o registro).
+
+        DML: visível na leitura seguinte, sem streaming buffer.
+        """
+        from .bigquery_client import QueryBuilder
+
+        row = _linha(fingerprint, result, claim_id)
+        self._garantir_tabela()
+        builder = QueryBuilder()
+        values = {
+            column: f"TIMESTAMP({builder.param(column, row[column], 'STRING')})"
+            if column == "processed_at"
+            else builder.param(column, row[column], _TIPOS[column])
+            for column in COLUMNS
+        }
+        if claim_id is None:
+            query = f"INSERT INTO `{self._ref()}` ({', '.join(COLUMNS)}) VALUES ({', '.join(values.values())})"
+        else:
+            assignments = ", ".join(f"{column} = {value}" for column, value in values.items())
+            query = (
+                f"UPDATE `{self._ref()}` SET {assignments} "
+                f"WHERE blob_name = {values['blob_name']} AND claim_id = {values['claim_id']}"
+            )
+        self.bigquery_client.executar_query(query, builder, use_cache=False)
+
+    def liberar(self, fingerprint: FileFingerprint, claim_id: str) -> None:
+        """Desfaz a reserva `claim_id` (a carga falhou): o arquivo volta a ficar pendente."""
+        from .bigquery_client import QueryBuilder
+
+        self._garantir_tabela()
+        builder = QueryBuilder()
+        self.bigquery_client.executar_query(
+            f"DELETE FROM `{self._ref()}` WHERE blob_name = {builder.param('blob_name', fingerprint.blob_name, 'STRING')} "
+            f"AND claim_id = {builder.param('claim_id', claim_id, 'STRING')} "
+            f"AND status = {builder.param('status', STATUS_EM_ANDAMENTO, 'STRING')}",
+            builder,
+            use_cache=False,
+        )
+
+    def entradas(self, blob_names: Iterable[str]) -> Dict[str, List[dict]]:
+        """Registros por nome de blob (só os nomes que aparecem no manifesto)."""
+        from .bigquery_client import QueryBuilder
+
+        names = list(dict.fromkeys(blob_names))
+        if not names:
+            return {}
+        self._garantir_tabela()
+        builder = QueryBuilder()
+        rows = self.bigquery_client.executar_query(
+            f"SELECT {', '.join(c for c in COLUMNS if c != 'processed_at')}, "
+            f"FORMAT_TIMESTAMP('%Y-%m-%dT%H:%M:%E6SZ', processed_at) AS processed_at "
+            f"FROM `{self._ref()}` WHERE blob_name IN UNNEST({builder.array_param('names', names, 'STRING')})",
+            builder,
+            use_cache=False,
+        )
+        entries: Dict[str, List[dict]] = {}
+        for row in rows:
+            entries.setdefault(row["blob_name"], []).append(dict(row))
+        return entries
+
+    def _ref(self) -> str:
+        return self.bigquery_client.table_ref(self.table_id)
+
+    def _garantir_tabela(self) -> None:
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            columns = ", ".join(f"{column} {_TIPOS[column]}" for column in COLUMNS)
+            self.bigquery_client.client.query(
+                f"CREATE TABLE IF NOT EXISTS `{self._ref()}` ({columns}) CLUSTER BY blob_name"
+            ).result()
+            self._ready = True
+
+
+_TIPOS = {
+    "blob_name": "STRING",
+    "generation": "INT64",
+    "crc32c": "STRING",
+    "md5_hash": "STRING",
+    "size": "INT64",
+    "staging_blob": "STRING",
+    "target_table": "STRING",
+    "rows_read": "INT64",
+    "rows_loaded": "INT64",
+    "load_strategy": "STRING",
+    "processed_at": "TIMESTAMP",
+    "status": "STRING",
+    "claim_id": "STRING",
+}
+
+
+def manifesto_padrao(bigquery_client):
+    """Manifesto escolhido por `ETL_MANIFEST` (padrão: sqlite com o backend DuckDB, senão BigQuery)."""
+    from .duckdb_backend import backend_local_ativo
+
+    mode = os.getenv("ETL_MANIFEST", "").strip().lower() or ("sqlite" if backend_local_ativo() else "bigquery")
+    if mode == "off":
+        return None
+    if mode == "sqlite":
+        return SqliteManifest(os.getenv("ETL_MANIFEST_PATH", DEFAULT_SQLITE_PATH))
+    if mode == "bigquery":
+        return BigQueryManifest(bigquery_client, os.getenv("ETL_MANIFEST_TABLE", DEFAULT_TABLE))
+    raise ValueError(f"ETL_MANIFEST inválido: {mode!r} (use bigquery, sqlite ou off)")
@@ -0,0 +1,226 @@
+"""Alocação de ids inteiros sequenciais para as tabelas com id numérico (unit, occurrence...).
+
+Em vez de ler a tabela e pegar `max(id) + 1` a cada criação, o alocador reserva
+um bloco de ids de uma vez (`block_size`) e entrega os próximos da memória. Só
+uma criação a cada bloco paga a ida ao backend, e como a reserva é atômica
+vários workers podem criar registros ao mesmo tempo sem repetir ids. Ids de um
+bloco não usado até o fim do processo viram buracos na sequência, não duplicatas.
+
+Backends disponíveis:
+- `BigQueryIdAllocator`: tabela de sequência no próprio dataset (padrão).
+- `SqliteIdAllocator`: arquivo sqlite local, para rodar offline ou em desenvolvimento.
+
+Na primeira reserva de uma tabela a sequência começa depois do maior id que já
+existe nela (`MAX(SAFE_CAST(id AS INT64))`). Essa leitura da tabela inteira roda
+só enquanto a sequência ainda não tem linha para a tabela; as reservas seguintes
+só tocam a tabela de sequência.
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Optional, Tuple
+
+DEFAULT_BLOCK_SIZE = 50
+SEQUENCE_TABLE = "id_sequence"
+
+# Erros de transações concorrentes no BigQuery que podem ser repetidos
+_RETRYABLE_ERRORS = ("concurrent update", "could not serialize access", "transaction is aborted")
+
+
+class IdAllocator(ABC):
+    """Entrega ids de blocos reservados; subclasses implementam `_reserve`."""
+
+    def __init__(self, block_size: int = DEFAULT_BLOCK_SIZE):
+        if block_size < 1:
+            raise ValueError("block_size deve ser maior que zero")
+        self.block_size = block_size
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._lock = threading.Lock()
+
+    def next_id(self, table_id: str) -> int:
+        """Próximo id livre da tabela."""
+        key = table_id.lower()
+        with self._lock:
+            start, end = self._blocks.get(key, (0, 0))
+            if start >= end:
+                start, end = self._reserve(key, self.block_size)
+            self._blocks[key] = (start + 1, end)
+            return start
+
+    @abstractmethod
+    def _reserve(self, table_id: str, size: int) -> Tuple[int, int]:
+        """Reserva `size` ids e retorna o intervalo `[inicio, fim)`."""
+
+
+class BigQueryIdAllocator(IdAllocator):
+    """Reserva blocos com um MERGE transacional na tabela de sequência do dataset.
+
+    A tabela guarda, por tabela de destino, o primeiro id ainda não reservado
+    (`next_id`). Semente, reserva e leitura do novo valor rodam numa única
+    transação: o MERGE avança a linha existente ou, na primeira reserva, cria a
+    linha a partir do maior id da tabela de destino (lido só nesse caso). Duas
+    transações concorrentes que mexem na sequência entram em conflito no
+    commit; a que perde é abortada pelo BigQuery e repetida (`_executar`), já
+    enxergando a linha gravada pela outra. Assim dois workers nunca recebem o
+    mesmo bloco, nem na primeira reserva.
+    """
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, bigquery_client, block_size: int = DEFAULT_BLOCK_SIZE, sequence_table: str = SEQUENCE_TABLE):
+        super().__init__(block_size)
+        self.bigquery_client = bigquery_client
+        self.sequence_table = sequence_table
+        self._sequence_ready = False
+
+    def _reserve(self, table_id: str, size: int) -> Tuple[int, int]:
+        from .bigquery_client import QueryBuilder, validar_identificador
+
+        validar_identificador(table_id)
+        sequence_ref = self.bigquery_client.table_ref(self.sequence_table)
+        builder = QueryBuilder()
+        table_param = builder.param("table_id", table_id)
+        size_param = builder.param("size", size)
+
+        create = "" if self._sequence_ready else f"""
+        CREATE TABLE IF NOT EXISTS `{sequence_ref}` (table_id STRING NOT NULL, next_id INT64 NOT NULL);
+        """
+        query = f"""
+        DECLARE reserved_end INT64;
+        DECLARE seed INT64;
+        {create}
+        BEGIN TRANSACTION;
+        SET reserved_end = (SELECT next_id FROM `{sequence_ref}` WHERE table_id = {table_param});
+        IF reserved_end IS NULL THEN
+            SET seed = (SELECT IFNULL(MAX(SAFE_CAST(id AS INT64)), 0) + 1 FROM `{self.bigquery_client.table_ref(table_id)}`);
+        END IF;
+        MERGE `{sequence_ref}` S
+        USING (SELECT {table_param} AS table_id, seed) N
+        ON S.table_id = N.table_id
+        WHEN MATCHED THEN UPDATE SET next_id = S.next_id + {size_param}
+        WHEN NOT MATCHED THEN INSERT (table_id, next_id) VALUES (N.table_id, N.seed + {size_param});
+        SET reserved_end = (SELECT next_id FROM `{sequence_ref}` WHERE table_id = {table_param});
+        COMMIT TRANSACTION;
+        SELECT reserved_end AS next_id;
+        """
+
+        rows = self._executar(query, builder)
+        self._sequence_ready = True
+        if not rows or rows[0]["next_id"] is None:
+            raise RuntimeError(f"A reserva de ids de {table_id!r} não devolveu o novo valor da sequência")
+        end = int(rows[0]["next_id"])
+        return end - size, end
+
+    def _executar(self, query: str, builder) -> list:
+        for attempt in range(1, self.MAX_ATTEMPTS + 1):
+            try:
+                return self.bigquery_client.executar_query(query, builder, use_cache=False)
+            except Exception as e:
+                if attempt == self.MAX_ATTEMPTS or not any(m in str(e).lower() for m in _RETRYABLE_ERRORS):
+                    raise
+                time.sleep(0.1 * 2 ** attempt)
+        return []
+
+
+class SqliteIdAllocator(IdAllocator):
+    """Sequência num arquivo sqlite local (compartilhado entre processos da máquina).
+
+    `seed(table_id)` informa o maior id já existente na primeira reserva de cada
+    tabela; sem ele a sequência começa em 1.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        seed: Optional[Callable[[str], int]] = None,
+    ):
+        super().__init__(block_size)
+        self.path = path
+        self.seed = seed
+        conn = self._connect()
+        try:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {SEQUENCE_TABLE} (table_id TEXT PRIMARY KEY, next_id INTEGER NOT NULL)"
+            )
+        finally:
+            conn.close()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def _reserve(self, table_id: str, size: int) -> Tuple[int, int]:
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                f"SELECT next_id FROM {SEQUENCE_TABLE} WHERE table_id = ?", (table_id,)
+            ).fetchone()
+            if row is None:
+                start = (self.seed(table_id) if self.seed else 0) + 1
+            else:
+                start = row[0]
+            conn.execute(
+                f"INSERT OR REPLACE INTO {SEQUENCE_TABLE} (table_id, next_id) VALUES (?, ?)",
+                (table_id, start + size),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return start, start + size
+
+
+def max_id(bigquery_client, table_id: str) -> int:
+    """Maior id numérico da tabela (0 se vazia)."""
+    rows = bigquery_client.executar_query(
+        f"SELECT IFNULL(MAX(SAFE_CAST(id AS INT64)), 0) AS max_id FROM `{bigquery_client.table_ref(table_id)}`",
+        use_cache=False,
+    )
+    return int(rows[0]["max_id"]) if rows else 0
+
+
+def build_id_allocator_from_env(bigquery_client) -> IdAllocator:
+    """Monta o alocador a partir de ID_ALLOCATOR_BACKEND (bigquery|sqlite) e ID_ALLOCATOR_*.
+
+    Com o backend local (BIGQUERY_BACKEND=duckdb) o padrão é sqlite: o DuckDB não
+    roda os scripts transacionais do `BigQueryIdAllocator`.
+    """
+    default_backend = "sqlite" if os.getenv("BIGQUERY_BACKEND", "bigquery").lower() == "duckdb" else "bigquery"
+    backend_name = os.getenv("ID_ALLOCATOR_BACKEND", default_backend).lower()
+    block_size = int(os.getenv("ID_ALLOCATOR_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+
+    if backend_name == "sqlite":
+        from .query_cache import default_cache_dir, diretorio_privado
+
+        # diretório privado do usuário: o temp compartilhado deixaria outro usuário ler ou pré-criar o arquivo
+        path = os.getenv("ID_ALLOCATOR_PATH") or os.path.join(
+            diretorio_privado(default_cache_dir()), "agro_id_sequence.sqlite3"
+        )
+        return SqliteIdAllocator(path, block_size, seed=lambda table_id: max_id(bigquery_client, table_id))
+
+    return BigQueryIdAllocator(
+        bigquery_client,
+        block_size,
+        os.getenv("ID_ALLOCATOR_SEQUENCE_TABLE", SEQUENCE_TABLE),
+    )
+
+
+_shared_allocator: Optional[IdAllocator] = None
+_shared_allocator_lock = threading.Lock()
+
+
+def get_id_allocator(bigquery_client) -> IdAllocator:
+    """Alocador compartilhado pelo processo (criado com o primeiro client recebido)."""
+    global _shared_allocator
+    with _shared_allocator_lock:
+        if _shared_allocator is None:
+            _shared_allocator = build_id_allocator_from_env(bigquery_client)
+        return _shared_allocator
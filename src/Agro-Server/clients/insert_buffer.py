@@ -0,0 +1,164 @@
+"""Buffer write-behind para inserções de uma linha no BigQuery.
+
+`inserir` faz um `insert_rows_json` por registro; com criações em rajada isso vira
+centenas de chamadas HTTP minúsculas. O `InsertBuffer` junta as linhas por tabela
+(vindas de qualquer thread/request) e envia um único streaming insert quando a
+fila chega em `max_rows` ou quando a linha mais antiga espera `max_delay`
+segundos. Cada linha recebe um `Future`, então quem inseriu ainda vê o erro da
+sua própria linha; o `id` da linha vai como `insertId` para o BigQuery descartar
+reenvios duplicados.
+
+O envio tem prazo (quem monta o buffer passa o timeout para `send`). Um lote cujo
+envio estoura o prazo (exceções em `retry_on`) volta para o início da fila da
+tabela e é reenviado depois de `max_delay`, até `max_attempts` tentativas; o
+`insertId` garante que um envio que chegou mas não respondeu não duplica linhas.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_MAX_ROWS = 500
+DEFAULT_MAX_DELAY = 0.2
+DEFAULT_MAX_ATTEMPTS = 3
+
+# (table_id, rows, row_ids) -> erros no formato de `insert_rows_json`
+SendFn = Callable[[str, List[dict], List[Optional[str]]], List[dict]]
+
+
+class InsertBuffer:
+    """Filas por tabela esvaziadas por uma thread em segundo plano."""
+
+    def __init__(
+        self,
+        send: SendFn,
+        max_rows: int = DEFAULT_MAX_ROWS,
+        max_delay: float = DEFAULT_MAX_DELAY,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        retry_on: Tuple[type, ...] = (TimeoutError,),
+    ):
+        self.send = send
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.retry_on = retry_on
+        self._queues: Dict[str, List[Tuple[dict, Future]]] = {}
+        self._attempts: Dict[Future, int] = {}
+        self._deadlines: Dict[str, float] = {}
+        self._pending = 0
+        self._force = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, table_id: str, row: dict) -> Future:
+        """Enfileira a linha; o Future resolve com a linha quando o lote for gravado."""
+        future: Future = Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("InsertBuffer já foi fechado")
+            queue = self._queues.setdefault(table_id, [])
+            if not queue:
+                self._deadlines[table_id] = time.monotonic() + self.max_delay
+            queue.append((row, future))
+            self._pending += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="bigquery-insert-buffer", daemon=True)
+                self._thread.start()
+            if len(queue) >= self.max_rows:
+                self._cond.notify_all()
+        return future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Envia tudo o que está na fila e espera; retorna False se estourar o timeout."""
+        with self._cond:
+            self._force = True
+            self._cond.notify_all()
+            done = self._cond.wait_for(lambda: self._pending == 0, timeout)
+            self._force = False
+            return done
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """Esvazia as filas e encerra a thread de envio."""
+        self.flush(timeout)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {"pending": self._pending, "tables": {t: len(q) for t, q in self._queues.items() if q}}
+
+    def _ready_tables(self, now: float) -> List[str]:
+        return [
+            table_id
+            for table_id, queue in self._queues.items()
+            if queue and (self._force or self._closed or len(queue) >= self.max_rows or now >= self._deadlines[table_id])
+        ]
+
+    def _run(self) -> None:
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready = self._ready_tables(now)
+                if not ready:
+                    if self._closed:
+                        return
+                    deadlines = [self._deadlines[t] for t, q in self._queues.items() if q]
+                    self._cond.wait(max(min(deadlines) - now, 0) if deadlines else None)
+                    continue
+
+                batches = []
+                for table_id in ready:
+                    queue = self._queues[table_id]
+                    batches.append((table_id, queue[: self.max_rows]))
+                    self._queues[table_id] = rest = queue[self.max_rows:]
+                    if rest:
+                        self._deadlines[table_id] = now + self.max_delay
+
+                retries = []
+                self._cond.release()
+                try:
+                    for table_id, batch in batches:
+                        if not self._send_batch(table_id, batch):
+                            retries.append((table_id, batch))
+                finally:
+                    self._cond.acquire()
+                now = time.monotonic()
+                for table_id, batch in retries:
+                    # volta para a frente da fila: a ordem de envio da tabela se mantém
+                    self._queues[table_id] = batch + self._queues.get(table_id, [])
+                    self._deadlines[table_id] = now + self.max_delay
+                self._pending -= sum(len(batch) for _, batch in batches) - sum(len(batch) for _, batch in retries)
+                self._cond.notify_all()
+
+    def _send_batch(self, table_id: str, batch: List[Tuple[dict, Future]]) -> bool:
+        """Envia o lote e resolve os Futures; False se o lote deve voltar para a fila."""
+        rows = [row for row, _ in batch]
+        try:
+            row_ids = [str(row["id"]) if row.get("id") is not None else None for row in rows]
+            errors = self.send(table_id, rows, row_ids) or []
+        except Exception as e:
+            # só a thread de envio mexe em `_attempts`
+            attempts = 1 + max(self._attempts.get(future, 0) for _, future in batch)
+            if isinstance(e, self.retry_on) and attempts < self.max_attempts:
+                for _, future in batch:
+                    self._attempts[future] = attempts
+                return False
+            for _, future in batch:
+                self._attempts.pop(future, None)
+                future.set_exception(e)
+            return True
+
+        errors_by_index = {error.get("index"): error for error in errors}
+        for index, (row, future) in enumerate(batch):
+            self._attempts.pop(future, None)
+            if index in errors_by_index:
+                future.set_exception(Exception(f"Erro ao inserir: {[errors_by_index[index]]}"))
+            else:
+                future.set_result(row)
+        return True
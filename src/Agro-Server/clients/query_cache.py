@@ -0,0 +1,513 @@
+"""Cache de resultados de queries do BigQuery com TTL por tabela.
+
+As chaves combinam o SQL normalizado com os parâmetros da query, então só
+funcionam bem com SQL de texto estável (ver `QueryBuilder`). Cada entrada guarda
+as tabelas lidas pela query, o que permite invalidar tudo que depende de uma
+tabela quando ela recebe escrita (`inserir`, `atualizar`, `remover`, ETL).
+
+Backends disponíveis:
+- `MemoryQueryCache`: LRU em memória do processo (padrão).
+- `SqliteQueryCache`: arquivo sqlite local, compartilhado entre processos da mesma máquina.
+  Os valores são gravados em JSON (linhas) ou Arrow IPC (tabelas), nunca em
+  pickle: o arquivo pode ser lido sem executar código. O caminho padrão fica num
+  diretório privado do usuário (0700).
+
+Cada tabela tem uma geração de invalidação. `get_or_compute` anota as gerações
+antes de executar a query e não guarda o resultado se alguma tabela foi
+invalidada no meio do caminho (o resultado pode ser anterior à escrita).
+"""
+from __future__ import annotations
+
+import base64
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import stat
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+from datetime import date, datetime, time as dtime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, Optional, Set, Tuple
+
+_TABLE_REF_RE = re.compile(r"`([^`]+)`")
+_WHITESPACE_RE = re.compile(r"\s+")
+_CACHEABLE_RE = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """Colapsa espaços para que indentação diferente gere a mesma chave."""
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+def tables_in_query(sql: str) -> Set[str]:
+    """Extrai os nomes (sem projeto/dataset) das tabelas referenciadas com crases."""
+    return {ref.split(".")[-1].lower() for ref in _TABLE_REF_RE.findall(sql)}
+
+
+def is_cacheable(sql: str) -> bool:
+    """Somente leituras (SELECT/WITH) entram no cache; DML e DDL nunca."""
+    return bool(_CACHEABLE_RE.match(sql))
+
+
+def cache_key(kind: str, sql: str, params: Iterable[Any] = ()) -> str:
+    """Gera a chave do cache a partir do tipo de resultado, SQL normalizado e parâmetros."""
+    serialized_params = [
+        p.to_api_repr() if hasattr(p, "to_api_repr") else repr(p) for p in params
+    ]
+    payload = json.dumps([kind, normalize_sql(sql), serialized_params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueryCache(ABC):
+    """Interface dos backends de cache."""
+
+    @abstractmethod
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """(True, valor) se a chave está no cache e não expirou; senão (False, None)."""
+
+    @abstractmethod
+    def set(
+        self, key: str, value: Any, ttl: float, tables: Set[str], generations: Optional[Dict[str, int]] = None
+    ) -> bool:
+        """Guarda o valor; com `generations`, só se nenhuma das tabelas foi invalidada desde então."""
+
+    @abstractmethod
+    def generations(self, tables: Set[str]) -> Dict[str, int]:
+        """Geração de invalidação atual de cada tabela."""
+
+    @abstractmethod
+    def invalidate_tables(self, tables: Set[str]) -> int:
+        """Descarta as entradas que leem alguma das tabelas; devolve quantas saíram."""
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Esvazia o cache."""
+
+    @abstractmethod
+    def __len__(self) -> int:
+        """Número de entradas guardadas."""
+
+
+class MemoryQueryCache(QueryCache):
+    """LRU em memória, seguro para uso entre threads."""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Set[str], Any]]" = OrderedDict()
+        self._by_table: Dict[str, Set[str]] = defaultdict(set)
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._discard(key)
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(
+        self, key: str, value: Any, ttl: float, tables: Set[str], generations: Optional[Dict[str, int]] = None
+    ) -> bool:
+        with self._lock:
+            if generations is not None and any(
+                self._generations.get(table, 0) != generation for table, generation in generations.items()
+            ):
+                return False
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, set(tables), value)
+            for table in tables:
+                self._by_table[table].add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._discard(oldest)
+            return True
+
+    def generations(self, tables: Set[str]) -> Dict[str, int]:
+        with self._lock:
+            return {table: self._generations.get(table, 0) for table in tables}
+
+    def invalidate_tables(self, tables: Set[str]) -> int:
+        with self._lock:
+            keys = set()
+            for table in tables:
+                self._generations[table] = self._generations.get(table, 0) + 1
+                keys |= self._by_table.pop(table, set())
+            for key in keys:
+                self._discard(key)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[1]:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
+
+
+class SqliteQueryCache(QueryCache):
+    """Cache em arquivo sqlite; processos da mesma máquina enxergam as mesmas entradas."""
+
+    def __init__(self, path: str, max_entries: int = 5000):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS cache_entries (
+                key TEXT PRIMARY KEY,
+                expires_at REAL NOT NULL,
+                value BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS cache_tables (
+                key TEXT NOT NULL,
+                table_name TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_cache_tables_name ON cache_tables (table_name);
+            CREATE INDEX IF NOT EXISTS idx_cache_tables_key ON cache_tables (key);
+            CREATE TABLE IF NOT EXISTS cache_generations (
+                table_name TEXT PRIMARY KEY,
+                generation INTEGER NOT NULL
+            );
+            """
+        )
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM cache_entries WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[0] <= time.time():
+            return False, None
+        try:
+            return True, _desserializar(row[1])
+        except ValueError:
+            # entrada num formato antigo/desconhecido: conta como ausente
+            return False, None
+
+    def set(
+        self, key: str, value: Any, ttl: float, tables: Set[str], generations: Optional[Dict[str, int]] = None
+    ) -> bool:
+        try:
+            payload = _serializar(value)
+        except TypeError:
+            return False
+        with self._lock, self._conn:
+            if generations is not None and self._generations(set(generations)) != generations:
+                return False
+            self._conn.execute("DELETE FROM cache_tables WHERE key = ?", (key,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cache_entries (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, time.time() + ttl, payload),
+            )
+            self._conn.executemany(
+                "INSERT INTO cache_tables (key, table_name) VALUES (?, ?)",
+                [(key, table) for table in tables],
+            )
+            self._prune()
+        return True
+
+    def generations(self, tables: Set[str]) -> Dict[str, int]:
+        with self._lock:
+            return self._generations(tables)
+
+    def _generations(self, tables: Set[str]) -> Dict[str, int]:
+        found = {table: 0 for table in tables}
+        if tables:
+            placeholders = ", ".join("?" for _ in tables)
+            found.update(self._conn.execute(
+                f"SELECT table_name, generation FROM cache_generations WHERE table_name IN ({placeholders})",
+                tuple(tables),
+            ))
+        return found
+
+    def invalidate_tables(self, tables: Set[str]) -> int:
+        if not tables:
+            return 0
+        placeholders = ", ".join("?" for _ in tables)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO cache_generations (table_name, generation) VALUES (?, 1) "
+                "ON CONFLICT (table_name) DO UPDATE SET generation = generation + 1",
+                [(table,) for table in tables],
+            )
+            keys = [
+                row[0]
+                for row in self._conn.execute(
+                    f"SELECT DISTINCT key FROM cache_tables WHERE table_name IN ({placeholders})",
+                    tuple(tables),
+                )
+            ]
+            self._conn.executemany("DELETE FROM cache_entries WHERE key = ?", [(k,) for k in keys])
+            self._conn.executemany("DELETE FROM cache_tables WHERE key = ?", [(k,) for k in keys])
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM cache_entries")
+            self._conn.execute("DELETE FROM cache_tables")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0]
+
+    def _prune(self) -> None:
+        now = time.time()
+        self._conn.execute(
+            "DELETE FROM cache_tables WHERE key IN (SELECT key FROM cache_entries WHERE expires_at <= ?)",
+            (now,),
+        )
+        self._conn.execute("DELETE FROM cache_entries WHERE expires_at <= ?", (now,))
+        excess = self._conn.execute("SELECT COUNT(*) FROM cache_entries").fetchone()[0] - self.max_entries
+        if excess > 0:
+            oldest = "SELECT key FROM cache_entries ORDER BY expires_at LIMIT ?"
+            self._conn.execute(f"DELETE FROM cache_tables WHERE key IN ({oldest})", (excess,))
+            self._conn.execute(f"DELETE FROM cache_entries WHERE key IN ({oldest})", (excess,))
+
+
+class ResultCache:
+    """Aplica TTLs por tabela sobre um backend e contabiliza hits/misses.
+
+    O TTL de uma query é o menor TTL entre as tabelas que ela lê; tabelas sem
+    configuração própria usam `default_ttl`. TTL 0 desliga o cache da query.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[QueryCache] = None,
+        default_ttl: float = 60,
+        table_ttls: Optional[Dict[str, float]] = None,
+    ):
+        self.backend = backend if backend is not None else MemoryQueryCache()
+        self.default_ttl = default_ttl
+        self.table_ttls = {k.lower(): v for k, v in (table_ttls or {}).items()}
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+        self._table_hits: Dict[str, int] = defaultdict(int)
+        self._table_misses: Dict[str, int] = defaultdict(int)
+
+    def ttl_for(self, tables: Set[str]) -> float:
+        if not tables:
+            return self.default_ttl
+        return min(self.table_ttls.get(table, self.default_ttl) for table in tables)
+
+    def get_or_compute(self, kind: str, sql: str, params: Iterable[Any], compute: Callable[[], Any]) -> Any:
+        """Devolve o resultado em cache ou executa `compute` e guarda o retorno."""
+        if not is_cacheable(sql):
+            return compute()
+
+        tables = tables_in_query(sql)
+        ttl = self.ttl_for(tables)
+        if ttl <= 0:
+            return compute()
+
+        key = cache_key(kind, sql, params)
+        found, value = self.backend.get(key)
+        self._record(found, tables)
+        if found:
+            return value
+
+        # uma invalidação durante o compute() torna o resultado suspeito: não guarda
+        generations = self.backend.generations(tables)
+        value = compute()
+        self.backend.set(key, value, ttl, tables, generations)
+        return value
+
+    def invalidate(self, *table_ids: str) -> int:
+        """Remove as entradas que leem qualquer uma das tabelas informadas."""
+        tables = {table_id.split(".")[-1].lower() for table_id in table_ids if table_id}
+        removed = self.backend.invalidate_tables(tables)
+        with self._lock:
+            self._invalidations += removed
+        return removed
+
+    def clear(self) -> None:
+        self.backend.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "backend": type(self.backend).__name__,
+                "entries": len(self.backend),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_ratio": self._hits / lookups if lookups else 0.0,
+                "invalidations": self._invalidations,
+                "default_ttl": self.default_ttl,
+                "table_ttls": dict(self.table_ttls),
+                "tables": {
+                    table: {
+                        "hits": self._table_hits.get(table, 0),
+                        "misses": self._table_misses.get(table, 0),
+                    }
+                    for table in sorted(set(self._table_hits) | set(self._table_misses))
+                },
+            }
+
+    def _record(self, hit: bool, tables: Set[str]) -> None:
+        with self._lock:
+            if hit:
+                self._hits += 1
+            else:
+                self._misses += 1
+            counters = self._table_hits if hit else self._table_misses
+            for table in tables:
+                counters[table] += 1
+
+
+def default_cache_dir() -> str:
+    """Diretório do cache do usuário (XDG_CACHE_HOME, ~/.cache ou, sem home, o temp com o uid)."""
+    base = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    if not os.path.isabs(base):
+        uid = os.getuid() if hasattr(os, "getuid") else "user"
+        return os.path.join(tempfile.gettempdir(), f"agro-server-{uid}")
+    return os.path.join(base, "agro-server")
+
+
+def diretorio_privado(path: str) -> str:
+    """Cria (0700) ou confere o diretório: precisa ser nosso e inacessível a outros usuários."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"O caminho do cache não é um diretório: {path}")
+    if hasattr(os, "getuid"):
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"O diretório do cache pertence a outro usuário: {path}")
+        if info.st_mode & 0o077:
+            os.chmod(path, 0o700)
+    return path
+
+
+# Valores guardados no sqlite: b"J" + JSON (linhas) ou b"A" + Arrow IPC (tabelas)
+_JSON = b"J"
+_ARROW = b"A"
+_TIPO = "$bq"
+
+
+def _serializar(value: Any) -> bytes:
+    """Valor -> bytes sem pickle; TypeError para o que não tem formato seguro."""
+    if type(value).__name__ == "Table" and hasattr(value, "schema"):
+        import pyarrow as pa
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, value.schema) as writer:
+            writer.write_table(value)
+        return _ARROW + sink.getvalue().to_pybytes()
+    return _JSON + json.dumps(value, default=_json_tipado, separators=(",", ":")).encode("utf-8")
+
+
+def _desserializar(payload: bytes) -> Any:
+    tag, body = payload[:1], payload[1:]
+    if tag == _JSON:
+        return json.loads(body, object_hook=_json_destipado)
+    if tag == _ARROW:
+        import pyarrow as pa
+
+        return pa.ipc.open_stream(body).read_all()
+    raise ValueError("formato de entrada do cache desconhecido")
+
+
+def _json_tipado(value: Any) -> dict:
+    # tipos que as linhas do BigQuery trazem e o JSON não tem
+    if isinstance(value, datetime):
+        return {_TIPO: "datetime", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {_TIPO: "date", "v": value.isoformat()}
+    if isinstance(value, dtime):
+        return {_TIPO: "time", "v": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {_TIPO: "decimal", "v": str(value)}
+    if isinstance(value, bytes):
+        return {_TIPO: "bytes", "v": base64.b64encode(value).decode("ascii")}
+    raise TypeError(f"tipo sem formato seguro no cache: {type(value).__name__}")
+
+
+def _json_destipado(obj: dict) -> Any:
+    kind = obj.get(_TIPO)
+    if kind is None or len(obj) != 2:
+        return obj
+    value = obj["v"]
+    if kind == "datetime":
+        return datetime.fromisoformat(value)
+    if kind == "date":
+        return date.fromisoformat(value)
+    if kind == "time":
+        return dtime.fromisoformat(value)
+    if kind == "decimal":
+        return Decimal(value)
+    if kind == "bytes":
+        return base64.b64decode(value)
+    return obj
+
+
+def parse_table_ttls(value: Optional[str]) -> Dict[str, float]:
+    """Converte 'travel=300,bill=120' em {'travel': 300.0, 'bill': 120.0}."""
+    ttls: Dict[str, float] = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        table, ttl = item.split("=", 1)
+        ttls[table.strip().lower()] = float(ttl)
+    return ttls
+
+
+def build_result_cache_from_env() -> Optional[ResultCache]:
+    """Monta o cache a partir das variáveis BIGQUERY_CACHE_*; 'none' desliga o cache."""
+    backend_name = os.getenv("BIGQUERY_CACHE_BACKEND", "memory").lower()
+    if backend_name in ("none", "off", "false", ""):
+        return None
+
+    if backend_name == "sqlite":
+        path = os.getenv("BIGQUERY_CACHE_PATH") or os.path.join(
+            diretorio_privado(default_cache_dir()), "agro_bigquery_cache.sqlite3"
+        )
+        backend: QueryCache = SqliteQueryCache(path)
+    else:
+        backend = MemoryQueryCache(int(os.getenv("BIGQUERY_CACHE_MAX_ENTRIES", "512")))
+
+    return ResultCache(
+        backend,
+        default_ttl=float(os.getenv("BIGQUERY_CACHE_TTL", "60")),
+        table_ttls=parse_table_ttls(os.getenv("BIGQUERY_CACHE_TTLS")),
+    )
+
+
+_shared_cache: Optional[ResultCache] = None
+_shared_cache_loaded = False
+_shared_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> Optional[ResultCache]:
+    """Cache compartilhado por todos os `BigQueryClient` do processo."""
+    global _shared_cache, _shared_cache_loaded
+    with _shared_cache_lock:
+        if not _shared_cache_loaded:
+            _shared_cache = build_result_cache_from_env()
+            _shared_cache_loaded = True
+        return _shared_cache
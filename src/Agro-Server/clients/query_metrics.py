@@ -0,0 +1,170 @@
+"""Instrumentação dos jobs emitidos pelo `BigQueryClient`.
+
+Cada job vira um `QueryRecord` com tempo de parede, tempo de fila, bytes
+processados/faturados, slot-ms, cache hit do BigQuery, a view que disparou a
+query e uma impressão digital do SQL. Os registros vão para um buffer circular
+em memória (exposto em `/api/_metrics/queries/`) e para o logger `clients` como
+JSON estruturado.
+
+A view atual é propagada por `contextvars` (ver `contexto_view` e o
+`QueryContextMiddleware`), então chega também às queries de `run_many`.
+"""
+from __future__ import annotations
+
+import contextvars
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
+
+from .query_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RECORDS = 2000
+
+_STRING_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+
+view_atual: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("bigquery_view", default=None)
+
+
+@contextmanager
+def contexto_view(name: Optional[str]):
+    """Marca as queries feitas dentro do bloco como originadas da view `name`."""
+    token = view_atual.set(name)
+    try:
+        yield
+    finally:
+        view_atual.reset(token)
+
+
+def sql_fingerprint(sql: str) -> str:
+    """Hash curto do SQL sem literais: queries iguais a menos de valores agrupam juntas."""
+    shape = _NUMBER_LITERAL_RE.sub("?", _STRING_LITERAL_RE.sub("?", normalize_sql(sql)))
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()[:12]
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Percentil por vizinho mais próximo (None para lista vazia)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered), max(1, math.ceil(pct / 100 * len(ordered)))) - 1
+    return ordered[index]
+
+
+def _millis_between(start, end) -> Optional[float]:
+    if start is None or end is None:
+        return None
+    return round((end - start).total_seconds() * 1000, 3)
+
+
+@dataclass(slots=True)
+class QueryRecord:
+    """Métricas de um job do BigQuery."""
+
+    fingerprint: str
+    sql: str
+    view: Optional[str]
+    wall_ms: float
+    queue_ms: Optional[float] = None
+    bytes_processed: Optional[int] = None
+    bytes_billed: Optional[int] = None
+    slot_ms: Optional[int] = None
+    cache_hit: Optional[bool] = None
+    job_id: Optional[str] = None
+    error: Optional[str] = None
+    timestamp: float = 0.0
+
+    @classmethod
+    def from_job(cls, sql: str, query_job, wall_ms: float, error: Optional[Exception] = None) -> "QueryRecord":
+        """Monta o registro a partir das estatísticas do `QueryJob` (campos ausentes viram None)."""
+        return cls(
+            fingerprint=sql_fingerprint(sql),
+            sql=normalize_sql(sql)[:500],
+            view=view_atual.get(),
+            wall_ms=round(wall_ms, 3),
+            queue_ms=_millis_between(getattr(query_job, "created", None), getattr(query_job, "started", None)),
+            bytes_processed=getattr(query_job, "total_bytes_processed", None),
+            bytes_billed=getattr(query_job, "total_bytes_billed", None),
+            slot_ms=getattr(query_job, "slot_millis", None),
+            cache_hit=getattr(query_job, "cache_hit", None),
+            job_id=getattr(query_job, "job_id", None),
+            error=str(error) if error is not None else None,
+            timestamp=time.time(),
+        )
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class QueryRecorder:
+    """Buffer circular de `QueryRecord` com resumo por impressão digital."""
+
+    def __init__(self, max_records: int = DEFAULT_MAX_RECORDS):
+        self._records: "deque[QueryRecord]" = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+
+    def record(self, record: QueryRecord) -> None:
+        with self._lock:
+            self._records.append(record)
+        logger.info("bigquery_job %s", json.dumps(record.as_dict(), default=str))
+
+    def records(self, limit: Optional[int] = None) -> List[QueryRecord]:
+        with self._lock:
+            records = list(self._records)
+        return records[-limit:] if limit else records
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Agrega por impressão digital: p50/p95/p99 de wall_ms, bytes e slot-ms somados."""
+        groups: Dict[str, List[QueryRecord]] = {}
+        for record in self.records():
+            groups.setdefault(record.fingerprint, []).append(record)
+
+        summary = []
+        for fingerprint, records in groups.items():
+            wall = [r.wall_ms for r in records]
+            summary.append({
+                "fingerprint": fingerprint,
+                "sql": records[-1].sql,
+                "views": sorted({r.view for r in records if r.view}),
+                "count": len(records),
+                "errors": sum(1 for r in records if r.error),
+                "cache_hits": sum(1 for r in records if r.cache_hit),
+                "p50_ms": percentile(wall, 50),
+                "p95_ms": percentile(wall, 95),
+                "p99_ms": percentile(wall, 99),
+                "bytes_processed": sum(r.bytes_processed or 0 for r in records),
+                "bytes_billed": sum(r.bytes_billed or 0 for r in records),
+                "slot_ms": sum(r.slot_ms or 0 for r in records),
+            })
+        summary.sort(key=lambda item: item["slot_ms"], reverse=True)
+        return summary
+
+
+_shared_recorder: Optional[QueryRecorder] = None
+_shared_recorder_lock = threading.Lock()
+
+
+def get_query_recorder() -> QueryRecorder:
+    """Recorder compartilhado por todos os `BigQueryClient` do processo."""
+    global _shared_recorder
+    with _shared_recorder_lock:
+        if _shared_recorder is None:
+            _shared_recorder = QueryRecorder(
+                int(os.getenv("BIGQUERY_METRICS_MAX_RECORDS", DEFAULT_MAX_RECORDS))
+            )
+        return _shared_recorder
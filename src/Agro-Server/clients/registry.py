@@ -0,0 +1,180 @@
+"""Registro de clients compartilhados (BigQuery, Cloud Storage) do processo.
+
+Os clients são criados sob demanda, uma única vez por processo e de forma
+thread-safe: importar uma view, rodar um comando do `manage.py` ou os testes não
+lê credenciais nem importa `google.cloud` enquanto ninguém usa o client. As
+views guardam um `LazyClient`, que só resolve a instância no primeiro acesso.
+
+O pool de conexões HTTP de cada client é dimensionado pelo número de threads do
+servidor (`SERVER_THREADS`/`GUNICORN_THREADS`), somado às threads internas do
+`BigQueryClient` (`run_many`), para que requests concorrentes não fiquem
+esperando conexão livre no pool padrão de 10 do `requests`.
+
+Com `BIGQUERY_BACKEND=duckdb` o client do BigQuery é o `DuckDBBigQueryClient`
+(ver `clients.duckdb_backend`), para rodar a API offline.
+"""
+from __future__ import annotations
+
+import importlib
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_THREADS = 8
+
+BIGQUERY = "bigquery"
+STORAGE = "storage"
+
+
+class LazyModule:
+    """Importa o módulo só no primeiro acesso a um atributo."""
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr: str):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+def server_threads() -> int:
+    """Threads que atendem requests neste processo (SERVER_THREADS ou GUNICORN_THREADS)."""
+    value = os.getenv("SERVER_THREADS") or os.getenv("GUNICORN_THREADS")
+    return int(value) if value else DEFAULT_SERVER_THREADS
+
+
+def http_pool_size(extra_threads: int = 0) -> int:
+    """Tamanho do pool HTTP: HTTP_POOL_SIZE, ou threads do servidor + threads internas do client."""
+    value = os.getenv("HTTP_POOL_SIZE")
+    return int(value) if value else server_threads() + extra_threads
+
+
+def configurar_pool_http(google_client, size: int) -> None:
+    """Remonta o adapter HTTPS da sessão autenticada do client com `size` conexões."""
+    from requests.adapters import HTTPAdapter
+
+    google_client._http.mount("https://", HTTPAdapter(pool_connections=size, pool_maxsize=size))
+
+
+class ClientRegistry:
+    """Instâncias únicas por nome, criadas pela factory registrada no primeiro `get`."""
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._init_ms: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        with self._lock:
+            self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+
+        with self._lock:
+            if name not in self._instances:
+                if name not in self._factories:
+                    raise KeyError(f"Client não registrado: {name!r}")
+                started = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._init_ms[name] = round((time.perf_counter() - started) * 1000, 3)
+                logger.info("client '%s' inicializado em %.1f ms", name, self._init_ms[name])
+            return self._instances[name]
+
+    def set(self, name: str, instance: Any) -> None:
+        """Substitui a instância (testes e scripts)."""
+        with self._lock:
+            self._instances[name] = instance
+
+    def reset(self, name: Optional[str] = None) -> None:
+        with self._lock:
+            if name is None:
+                self._instances.clear()
+                self._init_ms.clear()
+            else:
+                self._instances.pop(name, None)
+                self._init_ms.pop(name, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "registered": sorted(self._factories),
+                "initialized": sorted(self._instances),
+                "init_ms": dict(self._init_ms),
+            }
+
+
+class LazyClient:
+    """Proxy para um client do registro; a instância só é criada no primeiro uso."""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, name: str, registry: Optional[ClientRegistry] = None):
+        object.__setattr__(self, "_registry", registry or default_registry)
+        object.__setattr__(self, "_name", name)
+
+    def _resolve(self):
+        return self._registry.get(self._name)
+
+    def __getattr__(self, attr: str):
+        return getattr(self._resolve(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._resolve(), attr, value)
+
+    def __repr__(self) -> str:
+        return f"<LazyClient {self._name!r}>"
+
+
+def _criar_bigquery_client():
+    from .duckdb_backend import DuckDBBigQueryClient, backend_local_ativo
+
+    if backend_local_ativo():
+        # BIGQUERY_BACKEND=duckdb: mesma interface, sobre um arquivo local (sem HTTP)
+        client = DuckDBBigQueryClient()
+    else:
+        from .bigquery_client import BigQueryClient
+
+        client = BigQueryClient()
+        # threads do servidor + pool do run_many + thread do buffer write-behind
+        configurar_pool_http(client.client, http_pool_size(client.max_concurrent_queries + 1))
+    # registro de tabelas carregado em segundo plano: nenhum request espera por ele
+    client.tabelas.aquecer()
+    return client
+
+
+def _criar_storage_client():
+    from .storage_client import CloudStorageClient
+
+    client = CloudStorageClient()
+    configurar_pool_http(client.client, http_pool_size())
+    return client
+
+
+default_registry = ClientRegistry()
+default_registry.register(BIGQUERY, _criar_bigquery_client)
+default_registry.register(STORAGE, _criar_storage_client)
+
+
+def get_bigquery_client():
+    """`BigQueryClient` compartilhado pelo processo."""
+    return default_registry.get(BIGQUERY)
+
+
+def get_storage_client():
+    """`CloudStorageClient` compartilhado pelo processo."""
+    return default_registry.get(STORAGE)
+
+
+def lazy_client(name: str) -> LazyClient:
+    """Proxy preguiçoso para guardar em variáveis de módulo (ex: `client` das views)."""
+    return LazyClient(name)
@@ -0,0 +1,114 @@
+"""Coalescência (single-flight) de queries idênticas em andamento no processo.
+
+Quando várias threads (requests do gunicorn, `run_many`) pedem o mesmo job ao
+mesmo tempo, só a primeira o submete; as demais esperam esse job terminar e
+leem o resultado dele, sem gerar um segundo job no BigQuery. A chave é o SQL
+normalizado mais os parâmetros (ver `cache_key`), então queries com valores
+diferentes nunca se misturam. A coalescência vale dentro de um processo; workers
+diferentes do gunicorn continuam independentes (o cache sqlite cobre esse caso).
+
+Quem espera não herda o prazo do primeiro: com `timeout`, cada chamada espera no
+máximo o seu próprio tempo e sai com `EsperaExpirada`, sem afetar o job, que
+continua servindo o primeiro e os demais.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class EsperaExpirada(TimeoutError):
+    """O resultado compartilhado não ficou pronto dentro do `timeout` de quem esperava."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        super().__init__(f"A execução compartilhada não terminou em {timeout:.0f}s.")
+
+
+class _Chamada:
+    __slots__ = ("done", "value", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Executa `fn` uma vez por chave entre as chamadas concorrentes."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Chamada] = {}
+        self._lock = threading.Lock()
+        self._leaders = 0
+        self._coalesced = 0
+        self._errors = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """Retorna `(valor, compartilhado)`; `compartilhado` é True para quem só esperou.
+
+        `timeout` limita só a espera de quem chega depois (ver `EsperaExpirada`);
+        quem executa `fn` controla o próprio prazo.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self._coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Chamada()
+                self._leaders += 1
+                leader = True
+
+        if not leader:
+            if not call.done.wait(timeout):
+                with self._lock:
+                    call.waiters -= 1
+                raise EsperaExpirada(timeout)
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                self._errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.value, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._leaders + self._coalesced
+            return {
+                "in_flight": len(self._calls),
+                "waiting": sum(call.waiters for call in self._calls.values()),
+                "executed": self._leaders,
+                "coalesced": self._coalesced,
+                "errors": self._errors,
+                "coalesced_ratio": self._coalesced / total if total else 0.0,
+            }
+
+
+_shared_single_flight: Optional[SingleFlight] = None
+_shared_single_flight_loaded = False
+_shared_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> Optional[SingleFlight]:
+    """Instância compartilhada pelo processo (None com BIGQUERY_SINGLE_FLIGHT=false)."""
+    global _shared_single_flight, _shared_single_flight_loaded
+    with _shared_single_flight_lock:
+        if not _shared_single_flight_loaded:
+            if os.getenv("BIGQUERY_SINGLE_FLIGHT", "true").lower() == "true":
+                _shared_single_flight = SingleFlight()
+            _shared_single_flight_loaded = True
+        return _shared_single_flight
@@ -2,14 +2,16 @@
 import io
 import json
 import os
-
-from google.cloud import storage  # type: ignore
+from typing import List, Optional
 
 
 class CloudStorageClient:
     """Cliente do Google Cloud Storage com suporte a buffers em memória."""
 
     def __init__(self):
+        # import tardio: só quem usa o client paga o import do google.cloud
+        from google.cloud import storage  # type: ignore
+
         key_json_str = os.getenv("BIGQUERY_KEY_JSON")
         if key_json_str:
             key_info = json.loads(key_json_str)
@@ -59,6 +61,51 @@ class CloudStorageClient:
         buffer.seek(0)  # volta o ponteiro ao início
         return buffer.read()
 
+    def open_reader(self, blob_name: str, chunk_size: Optional[int] = None, generation: Optional[int] = None):
+        """
+        Abre o blob para leitura sequencial, baixando `chunk_size` bytes por requisição.
+        A leitura fica presa a uma geração do blob: a indicada em `generation` (ex: a que
+        `stat` devolveu) ou a atual. Uma sobrescrita no meio falha em vez de misturar versões.
+        :param blob_name: Caminho do arquivo no bucket
+        :return: Objeto file-like (binário)
+        """
+        if generation is not None:
+            return self.bucket.blob(blob_name, generation=generation).open("rb", chunk_size=chunk_size)
+        blob = self.bucket.get_blob(blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"O arquivo '{blob_name}' não existe no bucket '{self.bucket_name}'.")
+        return blob.open("rb", chunk_size=chunk_size, if_generation_match=blob.generation)
+
+    def stat(self, blob_name: str) -> dict:
+        """
+        Metadados do blob, sem baixar o conteúdo: nome, geração, CRC32C, MD5 e tamanho.
+        :param blob_name: Caminho do arquivo no bucket
+        """
+        blob = self.bucket.get_blob(blob_name)
+        if blob is None:
+            raise FileNotFoundError(f"O arquivo '{blob_name}' não existe no bucket '{self.bucket_name}'.")
+        return _metadados(blob)
+
+    def blob_size(self, blob_name: str) -> Optional[int]:
+        """Tamanho do blob em bytes (None se não existir)."""
+        blob = self.bucket.get_blob(blob_name)
+        return blob.size if blob is not None else None
+
+    def list_blobs(self, prefix: str) -> List[str]:
+        """
+        Lista os nomes dos blobs sob um prefixo.
+        :param prefix: Prefixo no bucket (ex: 'raw/')
+        """
+        return [blob.name for blob in self.client.list_blobs(self.bucket, prefix=prefix)]
+
+    def list_stats(self, prefix: str) -> List[dict]:
+        """Metadados (como em `stat`) dos blobs sob um prefixo, numa única listagem."""
+        return [_metadados(blob) for blob in self.client.list_blobs(self.bucket, prefix=prefix)]
+
+    def gcs_uri(self, blob_name: str) -> str:
+        """URI `gs://` de um blob do bucket (usada pelos jobs de carga do BigQuery)."""
+        return f"gs://{self.bucket_name}/{blob_name}"
+
     def upload_file(self, source_path: str, destination_blob: str):
         """
         Faz upload de um arquivo local para o bucket.
@@ -67,4 +114,15 @@ class CloudStorageClient:
         """
         blob = self.bucket.blob(destination_blob)
         blob.upload_from_filename(source_path)
-        return f"gs://{self.bucket_name}/{destination_blob}"
+        return self.gcs_uri(destination_blob)
+
+
+def _metadados(blob) -> dict:
+    # checksums em base64, como o Cloud Storage devolve (objetos compostos não têm MD5)
+    return {
+        "name": blob.name,
+        "generation": blob.generation,
+        "crc32c": blob.crc32c,
+        "md5_hash": blob.md5_hash,
+        "size": blob.size,
+    }
@@ -0,0 +1,254 @@
+"""Layout físico (particionamento e clustering) das tabelas grandes do BigQuery.
+
+Os dashboards e listagens filtram `t.datetime`/`t.unit_id` e juntam `bill` por
+`travel_id`. Sem particionamento, toda consulta lê a tabela inteira. Aqui ficam
+o layout desejado de `travel`, `bill` e `occurrence` (partição diária por
+`datetime`, clustering por `unit_id`/`travel_id`), o diagnóstico do layout
+atual, a criação/migração e a medição de bytes (dry-run) de cada query com e
+sem filtro para confirmar a poda de partições.
+
+A migração não altera a tabela no lugar (o BigQuery não muda o particionamento
+de uma tabela existente): cria `<tabela>__layout` com `CREATE OR REPLACE TABLE
+... AS SELECT`, copia as linhas (por `id`) que entraram na original depois da
+cópia, renomeia a original para `<tabela>__backup_<timestamp>` e a nova para o
+nome original. O backup fica para conferência; tabelas com streaming buffer
+ativo só podem ser renomeadas depois que ele esvaziar.
+
+Pause as escritas na tabela (ETL, inserções e DML) durante a migração: só as
+linhas novas são copiadas antes da troca; atualizações e remoções feitas depois
+do `CREATE ... AS SELECT` ficam apenas no backup.
+
+Os passos não são atômicos, então a migração pode ser rodada de novo depois de
+uma falha: se a cópia já existia, o `CREATE OR REPLACE` a refaz a partir da
+original; se a original já foi renomeada e só falta trazer a cópia para o nome
+original, `inspecionar` devolve `retomar` e só esse último passo é executado.
+"""
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .bigquery_client import PRIORIDADE_BATCH
+
+PARTITION_FIELD = "datetime"
+
+OK = "ok"
+CRIAR = "criar"
+MIGRAR = "migrar"
+RETOMAR = "retomar"
+
+# sufixo da cópia com o layout novo durante a migração
+STAGING_SUFFIX = "__layout"
+
+
+@dataclass(frozen=True)
+class TableLayout:
+    """Layout desejado de uma tabela: colunas, partição diária e clustering."""
+
+    table_id: str
+    columns: Tuple[Tuple[str, str], ...]
+    clustering_fields: Tuple[str, ...]
+    partition_field: str = PARTITION_FIELD
+
+    def partition_clause(self) -> str:
+        # DATE() aceita TIMESTAMP, DATETIME e DATE
+        return f"PARTITION BY DATE({self.partition_field})"
+
+    def cluster_clause(self) -> str:
+        return f"CLUSTER BY {', '.join(self.clustering_fields)}"
+
+
+LAYOUTS: Dict[str, TableLayout] = {
+    layout.table_id: layout
+    for layout in (
+        TableLayout(
+            "travel",
+            (
+                ("id", "STRING"),
+                ("datetime", "TIMESTAMP"),
+                ("asset_description", "STRING"),
+                ("register_number", "STRING"),
+                ("garage_name", "STRING"),
+                ("full_distance", "FLOAT64"),
+                ("unit_id", "STRING"),
+            ),
+            ("unit_id",),
+        ),
+        TableLayout(
+            "bill",
+            (
+                ("id", "STRING"),
+                ("travel_id", "STRING"),
+                ("datetime", "TIMESTAMP"),
+                ("fix_cost", "NUMERIC"),
+                ("variable_km", "NUMERIC"),
+            ),
+            ("travel_id",),
+        ),
+        TableLayout(
+            "occurrence",
+            (
+                ("id", "STRING"),
+                ("travel_id", "STRING"),
+                ("unit_id", "STRING"),
+                ("category_id", "STRING"),
+                ("datetime", "TIMESTAMP"),
+                ("carrier_name", "STRING"),
+                ("root_cause", "STRING"),
+                ("description", "STRING"),
+            ),
+            ("unit_id", "travel_id"),
+        ),
+    )
+}
+
+
+@dataclass
+class LayoutStatus:
+    """Diagnóstico de uma tabela frente ao layout desejado."""
+
+    table_id: str
+    action: str
+    partition_field: Optional[str] = None
+    partition_type: Optional[str] = None
+    clustering_fields: Tuple[str, ...] = ()
+    partition_column_type: Optional[str] = None
+    num_bytes: Optional[int] = None
+
+    def as_dict(self) -> dict:
+        return {
+            "table_id": self.table_id,
+            "action": self.action,
+            "partition": f"{self.partition_type}({self.partition_field})" if self.partition_field else None,
+            "clustering_fields": list(self.clustering_fields),
+            "num_bytes": self.num_bytes,
+        }
+
+
+class TableLayoutManager:
+    """Diagnostica, cria e migra as tabelas de `LAYOUTS` usando um `BigQueryClient`."""
+
+    def __init__(self, bigquery_client, layouts: Optional[Dict[str, TableLayout]] = None):
+        self.bigquery = bigquery_client
+        self.layouts = layouts if layouts is not None else LAYOUTS
+
+    def layout(self, table_id: str) -> TableLayout:
+        if table_id not in self.layouts:
+            raise ValueError(f"Tabela sem layout definido: {table_id!r} (opções: {', '.join(self.layouts)})")
+        return self.layouts[table_id]
+
+    def inspecionar(self, table_id: str) -> LayoutStatus:
+        """Lê o particionamento/clustering atual e decide a ação (ok, criar, migrar ou retomar)."""
+        layout = self.layout(table_id)
+        if not hasattr(self.bigquery.client, "get_table"):
+            raise ValueError("Layout de tabelas só se aplica ao BigQuery (backend atual não tem partições)")
+
+        table = self._buscar_tabela(table_id)
+        if table is None:
+            # migração interrompida entre os dois RENAME: a cópia existe, a original não
+            staging = self._buscar_tabela(f"{table_id}{STAGING_SUFFIX}")
+            if staging is None:
+                return LayoutStatus(table_id, CRIAR)
+            return self._status(layout, staging, RETOMAR)
+        return self._status(layout, table)
+
+    def _buscar_tabela(self, table_id: str):
+        from google.api_core import exceptions as gcloud_exceptions
+
+        try:
+            return self.bigquery.client.get_table(self.bigquery.table_ref(table_id))
+        except gcloud_exceptions.NotFound:
+            return None
+
+    def _status(self, layout: TableLayout, table, action: Optional[str] = None) -> LayoutStatus:
+        partitioning = getattr(table, "time_partitioning", None)
+        partition_field = getattr(partitioning, "field", None) if partitioning else None
+        partition_type = getattr(partitioning, "type_", None) if partitioning else None
+        clustering = tuple(getattr(table, "clustering_fields", None) or ())
+        column_types = {field.name: field.field_type for field in getattr(table, "schema", None) or []}
+
+        matches = (
+            partition_field == layout.partition_field
+            and partition_type == "DAY"
+            and clustering == layout.clustering_fields
+        )
+        return LayoutStatus(
+            layout.table_id,
+            action or (OK if matches else MIGRAR),
+            partition_field,
+            partition_type,
+            clustering,
+            column_types.get(layout.partition_field),
+            getattr(table, "num_bytes", None),
+        )
+
+    def plano(self, table_ids: Optional[Iterable[str]] = None) -> List[LayoutStatus]:
+        return [self.inspecionar(table_id) for table_id in (table_ids or self.layouts)]
+
+    def statements(self, status: LayoutStatus, suffix: Optional[str] = None) -> List[str]:
+        """DDL que leva a tabela ao layout desejado (vazio se já estiver ok)."""
+        layout = self.layout(status.table_id)
+        ref = self.bigquery.table_ref(status.table_id)
+        options = f"{layout.partition_clause()}\n{layout.cluster_clause()}"
+
+        staging_ref = f"{ref}{STAGING_SUFFIX}"
+        rename_staging = f"ALTER TABLE `{staging_ref}` RENAME TO `{status.table_id}`"
+
+        if status.action == CRIAR:
+            columns = ",\n  ".join(f"{name} {type_}" for name, type_ in layout.columns)
+            return [f"CREATE TABLE IF NOT EXISTS `{ref}` (\n  {columns}\n)\n{options}"]
+        if status.action == RETOMAR:
+            return [rename_staging]
+        if status.action != MIGRAR:
+            return []
+
+        # CSV com autodetect pode ter trazido a data como STRING: converte na cópia
+        select = "SELECT *"
+        if status.partition_column_type == "STRING":
+            select = f"SELECT * REPLACE (TIMESTAMP({layout.partition_field}) AS {layout.partition_field})"
+        suffix = suffix or time.strftime("%Y%m%d%H%M%S")
+        return [
+            # OR REPLACE: uma cópia deixada por uma tentativa anterior é refeita
+            f"CREATE OR REPLACE TABLE `{staging_ref}`\n{options}\nAS {select} FROM `{ref}`",
+            # linhas gravadas na original enquanto a cópia rodava
+            f"INSERT INTO `{staging_ref}`\n{select} FROM `{ref}` AS t\n"
+            f"WHERE NOT EXISTS (SELECT 1 FROM `{staging_ref}` AS s WHERE s.id = t.id)",
+            f"ALTER TABLE `{ref}` RENAME TO `{status.table_id}__backup_{suffix}`",
+            rename_staging,
+        ]
+
+    def aplicar(self, table_ids: Optional[Iterable[str]] = None, dry_run: bool = False) -> List[Dict[str, Any]]:
+        """Cria/migra as tabelas fora do layout; com `dry_run` só devolve o DDL."""
+        results = []
+        for status in self.plano(table_ids):
+            statements = self.statements(status)
+            if not dry_run:
+                for statement in statements:
+                    # BATCH: prazo de BIGQUERY_BATCH_TIMEOUT; o interativo cancelaria a cópia de tabelas grandes
+                    self.bigquery.execute_query(statement, priority=PRIORIDADE_BATCH)
+                if statements:
+                    self.bigquery.invalidar_cache(status.table_id)
+            results.append({**status.as_dict(), "statements": statements, "applied": bool(statements) and not dry_run})
+        return results
+
+
+def medir_poda(bigquery_client, queries: Sequence[Tuple[str, str, Any, str, Any]]) -> List[Dict[str, Any]]:
+    """Dry-run de cada query com e sem os filtros das views.
+
+    `queries` traz `(nome, sql_filtrado, params, sql_sem_filtro, params_sem_filtro)`.
+    `pruned` indica que o filtro reduziu os bytes lidos, isto é, houve poda de
+    partições (o clustering não aparece no dry-run, que é uma estimativa máxima).
+    """
+    report = []
+    for name, filtered_sql, filtered_params, full_sql, full_params in queries:
+        filtered = bigquery_client.estimar_bytes(filtered_sql, filtered_params)
+        full = bigquery_client.estimar_bytes(full_sql, full_params)
+        report.append({
+            "query": name,
+            "bytes_filtered": filtered,
+            "bytes_full_scan": full,
+            "ratio": round(filtered / full, 4) if full else None,
+            "pruned": filtered < full,
+        })
+    return report
@@ -0,0 +1,142 @@
+"""Registro em memória das tabelas (e colunas) que existem no dataset.
+
+As views que juntam tabelas opcionais (ex: `bill`) escolhiam a query tentando a
+versão completa e, no `NotFound`, rodando uma segunda. Com a tabela ausente,
+todo request pagava um job com erro mais a repetição. O `TableRegistry` guarda
+`{tabela: {colunas}}` (uma query em `INFORMATION_SCHEMA.COLUMNS`) e deixa a
+view decidir antes de montar o SQL.
+
+Nenhum request espera pelo carregamento: o primeiro acontece numa thread em
+segundo plano, disparada por `aquecer` na criação do client (ou pela primeira
+leitura), e enquanto isso `existe` responde None ("não sei"). Depois, uma
+leitura com o registro vencido (`ttl`) devolve o valor atual e dispara a
+atualização em segundo plano. Com None (registro ainda vazio ou metadado
+ilegível) a view segue pelo caminho otimista, com o `NotFound` como rede de
+segurança (`marcar_ausente`).
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+# () -> {tabela: {colunas}}
+LoaderFn = Callable[[], Dict[str, Set[str]]]
+
+
+class TableRegistry:
+    """Tabelas/colunas do dataset com atualização em segundo plano (stale-while-revalidate)."""
+
+    def __init__(self, loader: LoaderFn, ttl: float = DEFAULT_TTL):
+        self.loader = loader
+        self.ttl = ttl
+        self._tables: Optional[Dict[str, Set[str]]] = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+        self._refreshes = 0
+        self._failures = 0
+        self._last_error: Optional[str] = None
+
+    def existe(self, table_id: str) -> Optional[bool]:
+        """True/False se a tabela existe; None se o registro não pôde ser carregado."""
+        tables = self._snapshot()
+        if tables is None:
+            return None
+        return _nome(table_id) in tables
+
+    def tem_coluna(self, table_id: str, column: str) -> Optional[bool]:
+        tables = self._snapshot()
+        if tables is None:
+            return None
+        columns = tables.get(_nome(table_id))
+        if columns is None:
+            return False
+        # tabela marcada como existente sem colunas conhecidas (ex: logo após uma carga)
+        return column.lower() in columns if columns else None
+
+    def colunas(self, table_id: str) -> Optional[Set[str]]:
+        tables = self._snapshot()
+        return None if tables is None else tables.get(_nome(table_id))
+
+    def marcar_ausente(self, table_id: str) -> None:
+        """Rede de segurança: um job deu `NotFound`; registra e reconfere em segundo plano."""
+        with self._lock:
+            if self._tables is not None:
+                self._tables.pop(_nome(table_id), None)
+        self.atualizar_async()
+
+    def marcar_existente(self, table_id: str) -> None:
+        """A tabela acabou de ser criada/carregada; as colunas chegam na próxima atualização."""
+        with self._lock:
+            if self._tables is not None:
+                self._tables.setdefault(_nome(table_id), set())
+        self.atualizar_async()
+
+    def atualizar(self) -> bool:
+        """Recarrega agora; retorna False (mantendo o valor anterior) se o loader falhar."""
+        try:
+            tables = {_nome(name): {c.lower() for c in columns} for name, columns in self.loader().items()}
+        except Exception as e:
+            logger.warning("falha ao carregar o registro de tabelas: %s", e)
+            with self._lock:
+                self._failures += 1
+                self._last_error = str(e)
+                # tenta de novo só depois do ttl, em vez de a cada request
+                self._loaded_at = time.monotonic()
+                self._refreshing = False
+            return False
+
+        with self._lock:
+            self._tables = tables
+            self._loaded_at = time.monotonic()
+            self._refreshes += 1
+            self._last_error = None
+            self._refreshing = False
+        return True
+
+    def aquecer(self) -> None:
+        """Dispara a primeira carga em segundo plano (sem efeito se já carregou ou tentou)."""
+        with self._lock:
+            never_tried = self._loaded_at == 0.0
+        if never_tried:
+            self.atualizar_async()
+
+    def atualizar_async(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.atualizar, name="bigquery-table-registry", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "loaded": self._tables is not None,
+                "tables": sorted(self._tables or ()),
+                "age_s": round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+                "ttl_s": self.ttl,
+                "refreshes": self._refreshes,
+                "failures": self._failures,
+                "last_error": self._last_error,
+            }
+
+    def _snapshot(self) -> Optional[Dict[str, Set[str]]]:
+        with self._lock:
+            never_tried = self._loaded_at == 0.0
+            stale = never_tried or time.monotonic() - self._loaded_at >= self.ttl
+            tables = self._tables
+
+        if stale:
+            # sem registro ainda, responde "não sei" (None) em vez de esperar a carga
+            self.atualizar_async()
+        return tables
+
+
+def _nome(table_id: str) -> str:
+    return table_id.split(".")[-1].lower()